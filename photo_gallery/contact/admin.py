@@ -1,16 +1,52 @@
 from django.contrib import admin
-from .models import ContactMessage
+from django.utils import timezone
+from .models import ContactMessage, EmailNotification
+
+
+class EmailNotificationInline(admin.StackedInline):
+    model = EmailNotification
+    fields = ['status', 'attempts', 'next_attempt_at', 'sent_at', 'last_error']
+    readonly_fields = fields
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
 
 
 class ContactMessageAdmin(admin.ModelAdmin):
     readonly_fields = ['first_name', 'last_name', 'email_address', 'subject', 'message',
                        'contact_time']
+    inlines = [EmailNotificationInline]
 
-    list_display = ['subject', 'contact_time', 'responded_to', 'resolved']
-    list_filter = ['responded_to', 'resolved']
+    list_display = ['subject', 'contact_time', 'responded_to', 'resolved', 'email_status']
+    list_filter = ['responded_to', 'resolved', 'email_notification__status']
+    list_select_related = ['email_notification']
+    actions = ['retry_email_alerts']
 
     search_fields = ['email_address', 'subject', 'message']
     search_help_text = "Search email addresses, subjects, and messages."
 
+    @admin.display(description='Email alert', ordering='email_notification__status')
+    def email_status(self, obj):
+        try:
+            return obj.email_notification.get_status_display()
+        except EmailNotification.DoesNotExist:
+            return "-"
+
+    @admin.action(description="Retry email alerts for selected contact messages")
+    def retry_email_alerts(self, request, queryset):
+        """Queue failed (or pending) email alerts to be sent by the next outbox run.
+
+        Alerts being sent (whose lease hasn't expired) are skipped, so they aren't sent twice.
+        """
+        now = timezone.now()
+        num = EmailNotification.objects.filter(contact_message__in=queryset) \
+                                       .exclude(status=EmailNotification.SENT) \
+                                       .exclude(status=EmailNotification.SENDING,
+                                                next_attempt_at__gt=now) \
+                                       .update(status=EmailNotification.PENDING, attempts=0,
+                                               next_attempt_at=now)
+        self.message_user(request, "{} email alert(s) queued.".format(num))
+
 
 admin.site.register(ContactMessage, ContactMessageAdmin)
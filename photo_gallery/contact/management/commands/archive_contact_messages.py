@@ -0,0 +1,98 @@
+import datetime
+import gzip
+import json
+import os
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from contact.models import ContactMessage
+
+
+class Command(BaseCommand):
+    """Archive (as gzipped JSON Lines files) and then delete old resolved ContactMessages.
+
+    Messages are streamed in primary key order, so memory usage is independent of the number
+    of messages. Each archive file is completely written before its messages are deleted.
+    https://jsonlines.org/
+    """
+    help = "Archive and delete resolved contact messages older than the retention period."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int,
+                            default=getattr(settings, 'CONTACT_MESSAGE_RETENTION_DAYS', 365),
+                            help="Archive messages older than this number of days "
+                                 "(default: the CONTACT_MESSAGE_RETENTION_DAYS setting).")
+        parser.add_argument('--output-dir', default=None,
+                            help="The archive directory (default: the CONTACT_ARCHIVE_DIR "
+                                 "setting).")
+        parser.add_argument('--chunk-size', type=int, default=10000,
+                            help="The maximum number of messages per archive file "
+                                 "(default: 10000).")
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help="The number of messages fetched/deleted per query "
+                                 "(default: 500).")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Report the number of messages without archiving them.")
+
+    def handle(self, *args, **options):
+        if options['days'] < 0:
+            raise CommandError("--days must be zero or more.")
+
+        cutoff = timezone.now() - datetime.timedelta(days=options['days'])
+        queryset = ContactMessage.objects.filter(resolved=True, contact_time__lt=cutoff)
+        if options['dry_run']:
+            self.stdout.write("{} messages would be archived.".format(queryset.count()))
+            return
+
+        output_dir = Path(options['output_dir'] or settings.CONTACT_ARCHIVE_DIR)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        timestamp = timezone.now().strftime('%Y%m%dT%H%M%S')
+
+        total, last_pk, file_num = 0, 0, 1
+        while True:
+            path = output_dir / "contact-messages-{}-{:04}.jsonl.gz".format(timestamp, file_num)
+            pks, last_pk = self.write_archive(queryset, path, last_pk, options)
+            if not pks:
+                break
+
+            for i in range(0, len(pks), options['batch_size']):
+                ContactMessage.objects.filter(pk__in=pks[i:i + options['batch_size']]).delete()
+
+            total += len(pks)
+            file_num += 1
+            self.stdout.write("Archived {} messages to {}.".format(len(pks), path))
+
+        self.stdout.write(self.style.SUCCESS("{} messages archived and deleted.".format(total)))
+
+    def write_archive(self, queryset, path, last_pk, options):
+        """Write up to `--chunk-size` messages (with a primary key above `last_pk`) to `path`.
+
+        Returns a tuple of the archived primary keys and the last primary key.
+        """
+        pks = []
+        tmp_path = path.with_name(path.name + '.tmp')
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            while len(pks) < options['chunk_size']:
+                limit = min(options['batch_size'], options['chunk_size'] - len(pks))
+                rows = list(queryset.filter(pk__gt=last_pk).order_by('pk').values()[:limit])
+                if not rows:
+                    break
+
+                for row in rows:
+                    f.write(json.dumps(row, cls=DjangoJSONEncoder) + '\n')
+                pks.extend(row['id'] for row in rows)
+                last_pk = rows[-1]['id']
+
+        if not pks:
+            tmp_path.unlink()
+            return pks, last_pk
+
+        # Ensure the archive is on disk before deleting the messages
+        with open(tmp_path, 'rb') as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        return pks, last_pk
@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from contact.outbox import send_due_notifications
+
+
+class Command(BaseCommand):
+    """Send queued contact message email alerts, e.g. every minute via cron or with `--loop`.
+    https://docs.djangoproject.com/en/5.2/howto/custom-management-commands/
+    """
+    help = "Send queued (and due) contact message email alerts in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50,
+                            help="The maximum number of emails per connection (default: 50).")
+        parser.add_argument('--loop', action='store_true',
+                            help="Keep running, checking for due emails every `--interval`.")
+        parser.add_argument('--interval', type=float, default=10,
+                            help="The number of seconds between checks with `--loop` "
+                                 "(default: 10).")
+
+    def handle(self, *args, **options):
+        while True:
+            total_sent = total_failed = 0
+            while True:
+                sent, failed = send_due_notifications(options['batch_size'])
+                total_sent += sent
+                total_failed += failed
+                if sent + failed < options['batch_size']:
+                    break
+
+            if total_sent or total_failed or not options['loop']:
+                self.stdout.write("{} emails sent; {} failed.".format(total_sent, total_failed))
+
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
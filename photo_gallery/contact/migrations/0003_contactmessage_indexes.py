@@ -0,0 +1,25 @@
+# Generated by Django 5.2.13 on 2026-10-19 15:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contact', '0002_emailnotification'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='contactmessage',
+            index=models.Index(fields=['-contact_time'], name='contact_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contactmessage',
+            index=models.Index(fields=['resolved', '-contact_time'], name='contact_resolved_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contactmessage',
+            index=models.Index(fields=['responded_to', '-contact_time'], name='contact_responded_time_idx'),
+        ),
+    ]
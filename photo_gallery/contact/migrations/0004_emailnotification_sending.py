@@ -0,0 +1,18 @@
+# Generated by Django 5.2.13 on 2026-10-19 16:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contact', '0003_contactmessage_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='emailnotification',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('sending', 'Sending'), ('sent', 'Sent'), ('failed', 'Failed')], default='pending', max_length=10),
+        ),
+    ]
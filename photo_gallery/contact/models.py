@@ -1,5 +1,6 @@
 from django.core.validators import MinLengthValidator
 from django.db import models
+from django.utils import timezone
 
 
 class ContactMessage(models.Model):
@@ -18,3 +19,36 @@ class ContactMessage(models.Model):
     class Meta:
         # Recent messages first
         ordering = ['-contact_time']
+        # Support the admin site's default ordering and filters (and `archive_contact_messages`)
+        indexes = [
+            models.Index(fields=['-contact_time'], name='contact_time_idx'),
+            models.Index(fields=['resolved', '-contact_time'], name='contact_resolved_time_idx'),
+            models.Index(fields=['responded_to', '-contact_time'],
+                         name='contact_responded_time_idx'),
+        ]
+
+
+class EmailNotification(models.Model):
+    """A queued email alert about a ContactMessage (sent by `manage.py send_contact_emails`)."""
+    PENDING = 'pending'
+    SENDING = 'sending'  # Claimed by a worker until `next_attempt_at` (see `outbox.py`)
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (SENDING, 'Sending'), (SENT, 'Sent'),
+                      (FAILED, 'Failed')]
+
+    contact_message = models.OneToOneField(ContactMessage, on_delete=models.CASCADE,
+                                           related_name='email_notification')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now,
+                                           help_text="Failed attempts are retried with "
+                                                     "exponential backoff.")
+    last_error = models.TextField(blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return "Email alert: {}".format(self.contact_message)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'next_attempt_at'])]
@@ -0,0 +1,139 @@
+import datetime
+import traceback
+
+from django.conf import settings
+from django.core.mail import BadHeaderError, EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from photo_gallery import metrics
+from .models import EmailNotification
+
+
+# A database-backed outbox for contact message email alerts, so contact form submissions
+# don't wait for (or fail because of) the mail server. Notifications are sent in batches over
+# a single connection by `manage.py send_contact_emails`; failures are retried with
+# exponential backoff until `CONTACT_EMAIL_MAX_ATTEMPTS` is reached.
+#
+# Each batch is claimed in a short transaction (marked as sending, with `next_attempt_at` as the
+# lease expiry), so the emails are sent without holding a transaction or row locks open (which
+# would block other writers, e.g. contact form submissions on SQLite). Each result is then saved
+# separately. Notifications whose lease expires (e.g. if the worker was killed) are reclaimed.
+# https://docs.djangoproject.com/en/5.2/topics/email/#sending-multiple-emails
+
+
+def queue_notification(contact_message):
+    """Queue an email alert about a ContactMessage (if there are any `ADMINS` to email)."""
+    if not settings.ADMINS:
+        return None
+    return EmailNotification.objects.create(contact_message=contact_message)
+
+
+def build_email(contact_message, connection=None):
+    """Return an email (to the site admins) with the ContactMessage's contents."""
+    first_name = contact_message.first_name.capitalize()
+    last_name = contact_message.last_name.capitalize()
+    if last_name != "":
+        name = first_name + " " + last_name
+    else:
+        name = first_name
+
+    recipients = [a[1] for a in settings.ADMINS]
+    email_subject = "Contact Message: " + contact_message.subject
+    body = "Contact message received from {} ({}).\n\nSubject: {}\nMessage:\n\n{}" \
+           "".format(name, contact_message.email_address, contact_message.subject,
+                     contact_message.message)
+
+    email = EmailMessage(email_subject, body, settings.DEFAULT_FROM_EMAIL, recipients,
+                         connection=connection)
+    try:
+        email.message()
+    except BadHeaderError:
+        body = "BadHeaderError raised; view the message via the admin site."
+        email = EmailMessage("Contact Message Received", body, settings.DEFAULT_FROM_EMAIL,
+                             recipients, connection=connection)
+    return email
+
+
+def get_retry_delay(attempts):
+    """Return the delay before the next attempt, which doubles after each failed attempt."""
+    base = getattr(settings, 'CONTACT_EMAIL_RETRY_DELAY', 60)
+    max_delay = getattr(settings, 'CONTACT_EMAIL_MAX_RETRY_DELAY', 6 * 60 * 60)
+    return datetime.timedelta(seconds=min(base * 2 ** (attempts - 1), max_delay))
+
+
+def claim_due_notifications(batch_size):
+    """Claim (and return) up to `batch_size` due notifications, counting an attempt for each."""
+    now = timezone.now()
+    lease = datetime.timedelta(seconds=getattr(settings, 'CONTACT_EMAIL_SEND_LEASE', 10 * 60))
+    with transaction.atomic():
+        # Skip notifications locked by another worker (if supported by the database)
+        pks = list(EmailNotification.objects.select_for_update(skip_locked=True)
+                                            .filter(status__in=[EmailNotification.PENDING,
+                                                                EmailNotification.SENDING],
+                                                    next_attempt_at__lte=now)
+                                            .order_by('next_attempt_at')
+                                            .values_list('pk', flat=True)[:batch_size])
+        EmailNotification.objects.filter(pk__in=pks).update(status=EmailNotification.SENDING,
+                                                            attempts=F('attempts') + 1,
+                                                            next_attempt_at=now + lease)
+
+    return list(EmailNotification.objects.select_related('contact_message')
+                                         .filter(pk__in=pks).order_by('pk'))
+
+
+def send_due_notifications(batch_size=50):
+    """Send up to `batch_size` due notifications using a single connection.
+
+    Returns a tuple of the numbers of notifications sent and failed.
+    """
+    max_attempts = getattr(settings, 'CONTACT_EMAIL_MAX_ATTEMPTS', 8)
+    sent = failed = 0
+    notifications = claim_due_notifications(batch_size)
+    if not notifications:
+        return sent, failed
+
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as e:
+        # E.g. the mail server is unreachable; record an attempt for each notification
+        connection = None
+        open_error = e
+
+    for notification in notifications:
+        try:
+            if connection is None:
+                raise open_error
+            build_email(notification.contact_message, connection).send()
+        except Exception as e:
+            failed += 1
+            metrics.CONTACT_EMAIL_FAILURES.inc()
+            notification.last_error = "".join(traceback.format_exception(e)).strip()
+            if notification.attempts >= max_attempts:
+                notification.status = EmailNotification.FAILED
+            else:
+                notification.status = EmailNotification.PENDING
+                notification.next_attempt_at = timezone.now() + \
+                                               get_retry_delay(notification.attempts)
+            if connection is not None:
+                # The connection may be broken, so reconnect for the remaining messages
+                connection.close()
+                try:
+                    connection.open()
+                except Exception as e:
+                    connection, open_error = None, e
+        else:
+            sent += 1
+            metrics.CONTACT_EMAILS_SENT.inc()
+            notification.status = EmailNotification.SENT
+            notification.sent_at = timezone.now()
+            notification.last_error = ""
+
+        notification.save(update_fields=['status', 'next_attempt_at', 'last_error', 'sent_at'])
+
+    if connection is not None:
+        connection.close()
+
+    return sent, failed
@@ -1,8 +1,24 @@
+import datetime
+import gzip
+import json
+import shutil
+import tempfile
+from io import StringIO
+from pathlib import Path
+from unittest.mock import patch
+
+from django.contrib import admin
 from django.core import mail
-from django.test import override_settings, tag, TestCase
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings, RequestFactory, tag, TestCase
 from django.urls import reverse
+from django.utils import timezone
 
-from .models import ContactMessage
+from photo_gallery import metrics
+from .admin import ContactMessageAdmin
+from .models import ContactMessage, EmailNotification
+from .outbox import send_due_notifications
 
 
 @tag('contact', 'views')
@@ -30,13 +46,189 @@ class TestContactMessageCreateView(TestCase):
         self.assertEqual(messages[0].message, "This is the message.")
 
     def test_send_email(self):
-        """Test that the form submission results in an email being sent via send_email()."""
+        """Test that the form submission results in a queued email alert, which is sent by
+        `manage.py send_contact_emails`."""
         self.client.post(reverse("contact"), self.contact_data)
+        self.assertEqual(len(mail.outbox), 0)
+        notification = EmailNotification.objects.get()
+        self.assertEqual(notification.status, EmailNotification.PENDING)
+
+        call_command('send_contact_emails', stdout=StringIO())
         self.assertEqual(len(mail.outbox), 1)
         expected_body = "Contact message received from John Smith (email@example.com).\n\n" \
                         "Subject: Message Subject\nMessage:\n\nThis is the message."
         self.assertEqual(mail.outbox[0].body, expected_body)
 
+    @override_settings(METRICS_DIR=None)
+    def test_submission_metrics(self):
+        """Test that the form submission increments the submissions metric."""
+        def submissions():
+            return metrics.collect().get('gallery_contact_submissions_total', {}).get('{}', 0)
+
+        before = submissions()
+        self.client.post(reverse("contact"), self.contact_data)
+        self.assertEqual(submissions(), before + 1)
+
+    @override_settings(ADMINS=[])
+    def test_no_admins_no_email(self):
+        """Test that an email alert isn't queued if there are no `ADMINS`."""
+        self.client.post(reverse("contact"), self.contact_data)
+        self.assertEqual(ContactMessage.objects.count(), 1)
+        self.assertFalse(EmailNotification.objects.exists())
+
+
+@tag('contact', 'outbox')
+@override_settings(CONTACT_EMAIL_MAX_ATTEMPTS=3, CONTACT_EMAIL_RETRY_DELAY=60)
+class TestEmailOutbox(TestCase):
+    def setUp(self):
+        self.notifications = [
+            EmailNotification.objects.create(contact_message=ContactMessage.objects.create(
+                first_name='john', email_address='email@example.com',
+                subject='Subject {}'.format(i), message='This is the message.'))
+            for i in range(3)
+        ]
+
+    def test_batch_single_connection(self):
+        """Test that due notifications are sent in batches using a single connection."""
+        with patch('contact.outbox.get_connection', wraps=mail.get_connection) as get_conn:
+            self.assertEqual(send_due_notifications(batch_size=2), (2, 0))
+            self.assertEqual(get_conn.call_count, 1)
+
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(EmailNotification.objects.filter(status=EmailNotification.SENT)
+                                                  .count(), 2)
+        self.assertEqual(send_due_notifications(batch_size=2), (1, 0))
+        self.assertEqual(send_due_notifications(batch_size=2), (0, 0))
+
+    def test_bad_header(self):
+        """Test that a generic email is sent if the subject contains a newline."""
+        ContactMessage.objects.filter(pk=self.notifications[0].contact_message_id) \
+                              .update(subject='Subject\nBcc: other@example.com')
+        send_due_notifications()
+        self.assertIn("Contact Message Received", [m.subject for m in mail.outbox])
+
+    def test_not_due(self):
+        """Test that notifications aren't sent before their next attempt time."""
+        EmailNotification.objects.update(next_attempt_at=timezone.now()
+                                         + datetime.timedelta(minutes=1))
+        self.assertEqual(send_due_notifications(), (0, 0))
+
+    def test_failure_backoff(self):
+        """Test that failed notifications are retried with exponential backoff and then
+        marked as failed after `CONTACT_EMAIL_MAX_ATTEMPTS`."""
+        notification = self.notifications[0]
+        EmailNotification.objects.exclude(pk=notification.pk).delete()
+        delays = []
+        with patch('django.core.mail.EmailMessage.send', side_effect=OSError("Unreachable")):
+            for _ in range(3):
+                start = timezone.now()
+                self.assertEqual(send_due_notifications(), (0, 1))
+                notification.refresh_from_db()
+                delays.append(round((notification.next_attempt_at - start).total_seconds()))
+                EmailNotification.objects.update(next_attempt_at=timezone.now())
+
+        notification.refresh_from_db()
+        self.assertEqual(delays[:2], [60, 120])
+        self.assertEqual(notification.attempts, 3)
+        self.assertEqual(notification.status, EmailNotification.FAILED)
+        self.assertIn("Unreachable", notification.last_error)
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_open_failure(self):
+        """Test that an attempt is recorded for each notification if the connection fails."""
+        with patch('django.core.mail.backends.locmem.EmailBackend.open',
+                   side_effect=OSError("Unreachable"), create=True):
+            self.assertEqual(send_due_notifications(), (0, 3))
+        self.assertEqual(set(EmailNotification.objects.values_list('attempts', flat=True)), {1})
+
+    def test_sent_outside_transaction(self):
+        """Test that emails are sent after the batch is claimed, outside of a transaction."""
+        states = []
+
+        def send(email):
+            states.append((len(connection.atomic_blocks),
+                           set(EmailNotification.objects.values_list('status', flat=True))))
+            return 1
+
+        depth = len(connection.atomic_blocks)  # TestCase wraps each test in transactions
+        with patch('django.core.mail.EmailMessage.send', autospec=True, side_effect=send):
+            self.assertEqual(send_due_notifications(batch_size=2), (2, 0))
+        self.assertEqual(states[0], (depth, {EmailNotification.SENDING,
+                                             EmailNotification.PENDING}))
+
+    def test_expired_lease_reclaimed(self):
+        """Test that claimed notifications are only sent again once their lease expires."""
+        EmailNotification.objects.update(status=EmailNotification.SENDING, attempts=1,
+                                         next_attempt_at=timezone.now()
+                                         + datetime.timedelta(minutes=1))
+        self.assertEqual(send_due_notifications(), (0, 0))
+
+        EmailNotification.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(send_due_notifications(), (3, 0))
+        self.assertEqual(set(EmailNotification.objects.values_list('attempts', flat=True)), {2})
+
+    def test_retry_skips_leased(self):
+        """Test that the admin retry action doesn't requeue notifications being sent."""
+        now = timezone.now()
+        sending, expired, failed = self.notifications
+        EmailNotification.objects.filter(pk=sending.pk).update(
+            status=EmailNotification.SENDING, next_attempt_at=now + datetime.timedelta(minutes=1))
+        EmailNotification.objects.filter(pk=expired.pk).update(
+            status=EmailNotification.SENDING, next_attempt_at=now - datetime.timedelta(minutes=1))
+        EmailNotification.objects.filter(pk=failed.pk).update(status=EmailNotification.FAILED)
+
+        model_admin = ContactMessageAdmin(ContactMessage, admin.site)
+        with patch.object(model_admin, 'message_user') as message_user:
+            model_admin.retry_email_alerts(RequestFactory().post('/'),
+                                           ContactMessage.objects.all())
+        self.assertEqual(message_user.call_args.args[1], "2 email alert(s) queued.")
+        statuses = dict(EmailNotification.objects.values_list('pk', 'status'))
+        self.assertEqual(statuses, {sending.pk: EmailNotification.SENDING,
+                                    expired.pk: EmailNotification.PENDING,
+                                    failed.pk: EmailNotification.PENDING})
+
+
+@tag('contact', 'archive')
+class TestArchiveContactMessages(TestCase):
+    def setUp(self):
+        old = timezone.now() - datetime.timedelta(days=400)
+        for i in range(5):
+            ContactMessage.objects.create(first_name='john', email_address='email@example.com',
+                                          subject='Subject {}'.format(i),
+                                          message='This is the message.', resolved=i < 3)
+        # Messages 0-2 are resolved, and messages 0, 1, and 3 are old
+        ContactMessage.objects.filter(subject__in=['Subject 0', 'Subject 1', 'Subject 3']) \
+                              .update(contact_time=old)
+        self.output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.output_dir)
+
+    def archive(self, *args):
+        call_command('archive_contact_messages', '--output-dir', self.output_dir, *args,
+                     stdout=StringIO())
+        return sorted(Path(self.output_dir).glob('*.jsonl.gz'))
+
+    def test_archive_old_resolved(self):
+        """Test that only old resolved messages are archived and deleted."""
+        paths = self.archive('--days', '365')
+        self.assertEqual(len(paths), 1)
+        with gzip.open(paths[0], 'rt') as f:
+            rows = [json.loads(line) for line in f]
+
+        self.assertEqual([r['subject'] for r in rows], ['Subject 0', 'Subject 1'])
+        self.assertEqual(sorted(ContactMessage.objects.values_list('subject', flat=True)),
+                         ['Subject 2', 'Subject 3', 'Subject 4'])
+
+    def test_chunks(self):
+        """Test that messages are split into archive files of `--chunk-size` messages."""
+        paths = self.archive('--days', '0', '--chunk-size', '2', '--batch-size', '1')
+        self.assertEqual(len(paths), 2)
+        self.assertEqual(ContactMessage.objects.filter(resolved=True).count(), 0)
+
+    def test_dry_run(self):
+        """Test that messages aren't archived or deleted with `--dry-run`."""
+        self.assertEqual(self.archive('--dry-run'), [])
+        self.assertEqual(ContactMessage.objects.count(), 5)
+
 
 @tag('contact', 'views')
 @override_settings(SECURE_SSL_REDIRECT=False)
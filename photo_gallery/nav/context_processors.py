@@ -1,3 +1,4 @@
+from photo_gallery.instrumentation import timed
 from .models import NavSection
 
 
@@ -6,6 +7,10 @@ def navigation(request):
     https://docs.djangoproject.com/en/5.2/ref/templates/api/#writing-your-own-context-processors
     https://docs.djangoproject.com/en/5.2/ref/models/querysets/#prefetch-related
     """
+    # Evaluate the queryset here (rather than lazily in the template) so it can be timed
+    with timed('nav'):
+        nav_sections = list(NavSection.objects.prefetch_related('navlink_set').all())
+
     return {
-        "nav_sections": NavSection.objects.prefetch_related('navlink_set').all(),
+        "nav_sections": nav_sections,
     }
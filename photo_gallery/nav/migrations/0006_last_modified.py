@@ -0,0 +1,23 @@
+# Generated by Django 5.2.13 on 2026-10-19 16:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nav', '0005_alter_navlink_options_alter_navsection_options'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='navlink',
+            name='last_modified',
+            field=models.DateTimeField(auto_now=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='navsection',
+            name='last_modified',
+            field=models.DateTimeField(auto_now=True, null=True),
+        ),
+    ]
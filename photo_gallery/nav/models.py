@@ -24,6 +24,8 @@ class NavSection(models.Model):
     section_order = models.IntegerField(choices=ORDER_CHOICES, blank=False, unique=True,
                                         help_text=section_order_guidelines)
 
+    last_modified = models.DateTimeField(auto_now=True, null=True)
+
     def __str__(self):
         return "Navigation Section " + str(self.section_order)
 
@@ -61,6 +63,8 @@ class NavLink(models.Model):
 
     nav_section = models.ForeignKey(NavSection, on_delete=models.CASCADE, null=True)
 
+    last_modified = models.DateTimeField(auto_now=True, null=True)
+
     def __str__(self):
         return self.link_text
 
@@ -0,0 +1,288 @@
+import posixpath
+import re
+from pathlib import Path
+
+from django.apps import apps
+from django.conf import settings
+from django.template.loader import get_template
+
+
+# Front-end asset pipeline (`python manage.py build_assets`), which purges unused selectors from
+# the vendored Bootstrap and Bootstrap Icons stylesheets (in `global_static/vendor/`) and writes:
+# - The purged stylesheet (loaded asynchronously by base.html)
+# - The "critical" subset of the purged stylesheet which is required to render the base template
+#   (the header/navigation) and photo listings, as a template partial which is inlined into
+#   base.html's <head> (so pages can be rendered before the full stylesheet has loaded)
+# https://purgecss.com/
+# https://web.dev/articles/extract-critical-css
+#
+# A selector is kept if every class and ID within it (excluding any within `:not()` etc.) appears
+# as a token in a template or other content file, so class names must not be constructed
+# dynamically (e.g. `class="col-{{ width }}"`) unless they're added to the safelist.
+# Re-run the command after changing templates or updating the vendored files.
+
+SOURCE_STYLESHEETS = [
+    'vendor/bootstrap/css/bootstrap.min.css',  # Bootstrap v5.3.8
+    'vendor/bootstrap-icons/bootstrap-icons.min.css',  # Bootstrap Icons v1.13.1
+]
+OUTPUT_STYLESHEET = 'css/site.min.css'
+CRITICAL_CSS_TEMPLATE = 'includes/critical_css.html'
+CRITICAL_TEMPLATES = ['base.html', 'photos/photo_list.html', 'photos/photo_card.html']
+
+# Classes which are added by Bootstrap's JavaScript (rather than appearing in templates)
+SAFELIST = {
+    'active', 'collapse', 'collapsing', 'disabled', 'dropdown-menu-end', 'dropdown-menu-start',
+    'dropend', 'dropstart', 'dropup', 'fade', 'show',
+}
+
+# Third-party packages whose templates/code add classes to rendered HTML (e.g. form fields)
+CONTENT_PACKAGES = ['crispy_forms', 'crispy_bootstrap5']
+CONTENT_EXTENSIONS = ('.html', '.txt', '.py')
+
+TOKEN_PATTERN = re.compile(r'[\w-]+')
+SELECTOR_NAME_PATTERN = re.compile(r'[.#](-?[_a-zA-Z][\w-]*(?:\\.[\w-]*)*)')
+NEGATION_PATTERN = re.compile(r':(?:not|is|where|has)\(')
+GROUPING_AT_RULES = ('@media', '@supports', '@container', '@layer')
+KEYFRAMES_AT_RULES = ('@keyframes', '@-webkit-keyframes')
+URL_PATTERN = re.compile(r'url\((["\']?)([^"\')]+)\1\)')
+
+
+class Rule:
+    def __init__(self, prelude, body):
+        self.prelude = prelude  # Selector list, or at-rule name and parameters
+        self.body = body  # Declarations (str), child rules (list), or None (statements)
+
+    @property
+    def is_at_rule(self):
+        return self.prelude.startswith('@')
+
+    def __str__(self):
+        if self.body is None:
+            return self.prelude + ';'
+        if isinstance(self.body, list):
+            return self.prelude + '{' + ''.join(str(rule) for rule in self.body) + '}'
+        return self.prelude + '{' + self.body + '}'
+
+
+class Comment(str):
+    pass
+
+
+def _find(css, chars, start):
+    """Return the index of the first of `chars` at/after `start`, skipping strings/comments."""
+    i = start
+    while i < len(css):
+        char = css[i]
+        if char in chars:
+            return i
+        if char in '"\'':
+            i = css.index(char, i + 1)
+            while css[i - 1] == '\\':
+                i = css.index(char, i + 1)
+        elif css.startswith('/*', i):
+            i = css.index('*/', i) + 1
+        elif char == '(':
+            i = _find(css, ')', i + 1)
+        i += 1
+    raise ValueError("Unexpected end of CSS (expected one of {!r})".format(chars))
+
+
+def _find_block_end(css, start):
+    """Return the index of the `}` which closes the block starting at `start` (after `{`)."""
+    depth, i = 1, start
+    while True:
+        i = _find(css, '{}', i)
+        depth += 1 if css[i] == '{' else -1
+        if depth == 0:
+            return i
+        i += 1
+
+
+def parse_css(css):
+    """Return a list of rules (and license comments) parsed from a stylesheet."""
+    rules, i = [], 0
+    while i < len(css):
+        if css[i].isspace():
+            i += 1
+        elif css.startswith('/*', i):
+            end = css.index('*/', i) + 2
+            if css.startswith('/*!', i):
+                rules.append(Comment(css[i:end]))
+            i = end
+        else:
+            end = _find(css, '{;' if css[i] == '@' else '{', i)
+            prelude = css[i:end].strip()
+            if css[end] == ';':
+                rules.append(Rule(prelude, None))
+                i = end + 1
+                continue
+
+            block_end = _find_block_end(css, end + 1)
+            body = css[end + 1:block_end]
+            if prelude.startswith(GROUPING_AT_RULES):
+                body = parse_css(body)
+            rules.append(Rule(prelude, body))
+            i = block_end + 1
+    return rules
+
+
+def serialize_css(rules):
+    return '\n'.join(rule if isinstance(rule, Comment) else str(rule) for rule in rules)
+
+
+def split_selectors(selector_list):
+    """Split a selector list on commas (excluding commas within parentheses)."""
+    selectors, depth, start = [], 0, 0
+    for i, char in enumerate(selector_list):
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == ',' and depth == 0:
+            selectors.append(selector_list[start:i].strip())
+            start = i + 1
+    selectors.append(selector_list[start:].strip())
+    return selectors
+
+
+def _remove_negations(selector):
+    """Remove the arguments of `:not()`, `:is()` etc., which don't need to match anything."""
+    match = NEGATION_PATTERN.search(selector)
+    while match:
+        end = _find(selector, ')', match.end())
+        selector = selector[:match.end()] + selector[end:]
+        match = NEGATION_PATTERN.search(selector, match.end() + 1)
+    return selector
+
+
+def is_selector_used(selector, tokens):
+    names = SELECTOR_NAME_PATTERN.findall(_remove_negations(selector))
+    return all(name.replace('\\', '') in tokens for name in names)
+
+
+def purge_rules(rules, tokens):
+    """Return the rules with unused selectors (and then empty rules/at-rules) removed."""
+    purged = []
+    for rule in rules:
+        if isinstance(rule, Comment) or rule.body is None:
+            purged.append(rule)
+        elif isinstance(rule.body, list):
+            children = purge_rules(rule.body, tokens)
+            if any(not isinstance(child, Comment) for child in children):
+                purged.append(Rule(rule.prelude, children))
+        elif rule.is_at_rule:
+            purged.append(rule)  # E.g. @font-face and @keyframes
+        else:
+            selectors = [s for s in split_selectors(rule.prelude) if is_selector_used(s, tokens)]
+            if selectors:
+                purged.append(Rule(','.join(selectors), rule.body))
+
+    return purged
+
+
+def remove_unused_keyframes(rules):
+    """Remove @keyframes rules whose animation names aren't referenced by other rules."""
+    def is_keyframes(rule):
+        return isinstance(rule, Rule) and rule.prelude.startswith(KEYFRAMES_AT_RULES)
+
+    other_css = serialize_css([rule for rule in rules if not is_keyframes(rule)])
+    tokens = set(TOKEN_PATTERN.findall(other_css))
+    return [rule for rule in rules if not is_keyframes(rule) or rule.prelude.split()[-1] in tokens]
+
+
+def purge_css(css, tokens):
+    """Return the stylesheet with rules which don't match any of the tokens removed."""
+    return serialize_css(remove_unused_keyframes(purge_rules(parse_css(css), tokens)))
+
+
+def remove_at_rules(css, names):
+    """Return the stylesheet without (top-level) at-rules of the given names."""
+    return serialize_css([rule for rule in parse_css(css)
+                          if isinstance(rule, Comment) or rule.prelude.split()[0] not in names])
+
+
+def rewrite_urls(css, source_name, get_url):
+    """Rewrite relative `url()` references (relative to `source_name`) using `get_url(name)`."""
+    def replace(match):
+        url = match.group(2)
+        if url.startswith(('data:', '/', '#')) or '//' in url:
+            return match.group(0)
+        path = url.split('?')[0].split('#')[0]
+        name = posixpath.normpath(posixpath.join(posixpath.dirname(source_name), path))
+        return 'url("{}")'.format(get_url(name))
+
+    return URL_PATTERN.sub(replace, css)
+
+
+def get_tokens(text):
+    return set(TOKEN_PATTERN.findall(text))
+
+
+def get_content_paths():
+    """Return the template directories of this project (and CONTENT_PACKAGES)."""
+    base_dir = Path(settings.BASE_DIR)
+    paths = [Path(path) for engine in settings.TEMPLATES for path in engine.get('DIRS', [])]
+    for app_config in apps.get_app_configs():
+        app_path = Path(app_config.path)
+        if app_config.name in CONTENT_PACKAGES:
+            paths.append(app_path)
+        elif app_path.is_relative_to(base_dir):
+            paths.append(app_path / 'templates')
+    return [path for path in paths if path.is_dir()]
+
+
+def get_content_tokens(paths=None):
+    tokens = set(SAFELIST)
+    for path in paths or get_content_paths():
+        for file_path in sorted(path.rglob('*')):
+            if file_path.match(CRITICAL_CSS_TEMPLATE):
+                continue  # Generated from the stylesheets (so contains every used selector)
+            if file_path.suffix in CONTENT_EXTENSIONS and file_path.is_file():
+                tokens |= get_tokens(file_path.read_text(encoding='utf-8'))
+    return tokens
+
+
+def get_critical_tokens():
+    tokens = set(SAFELIST)
+    for name in CRITICAL_TEMPLATES:
+        path = Path(get_template(name).origin.name)
+        tokens |= get_tokens(path.read_text(encoding='utf-8'))
+    return tokens
+
+
+def render_assets(static_dir, templates_dir, content_tokens=None, critical_tokens=None):
+    """Return the purged stylesheet and critical CSS template contents, keyed by output path."""
+    static_dir, templates_dir = Path(static_dir), Path(templates_dir)
+    content_tokens = get_content_tokens() if content_tokens is None else content_tokens
+    critical_tokens = get_critical_tokens() if critical_tokens is None else critical_tokens
+
+    stylesheets = []
+    for name in SOURCE_STYLESHEETS:
+        css = (static_dir / name).read_text(encoding='utf-8')
+        # Make URLs (e.g. icon fonts) relative to the output stylesheet rather than the source
+        css = rewrite_urls(css, name, lambda url_name: posixpath.relpath(
+            url_name, posixpath.dirname(OUTPUT_STYLESHEET)))
+        stylesheets.append(purge_css(css, content_tokens))
+
+    site_css = '\n'.join(stylesheets) + '\n'
+    # The inlined CSS excludes web fonts, which are loaded with the full stylesheet
+    critical_css = remove_at_rules(purge_css(site_css, critical_tokens), ('@charset', '@font-face'))
+    if re.search(r'{[{%#]', critical_css):
+        raise ValueError("The critical CSS contains template syntax")
+
+    return {
+        static_dir / OUTPUT_STYLESHEET: site_css,
+        templates_dir / CRITICAL_CSS_TEMPLATE: (
+            '{# Generated by `python manage.py build_assets` (see photo_gallery/assets.py) #}\n'
+            '<style>' + critical_css + '</style>\n'),
+    }
+
+
+def build_assets(static_dir, templates_dir, **kwargs):
+    """Write the purged stylesheet and critical CSS template; return their sizes (bytes)."""
+    sizes = {}
+    for path, content in render_assets(static_dir, templates_dir, **kwargs).items():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content, encoding='utf-8')
+        sizes[path] = len(content.encode())
+    return sizes
@@ -0,0 +1,123 @@
+import gzip
+import hashlib
+import re
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
+
+from .instrumentation import record_cache_lookup, timed
+
+try:
+    import brotli
+except ImportError:  # Optional dependency (`pip install .[brotli]`)
+    brotli = None
+
+
+# Brotli/gzip response compression, negotiated via the `Accept-Encoding` request header
+# https://developer.mozilla.org/en-US/docs/Web/HTTP/Compression
+# https://docs.djangoproject.com/en/5.2/ref/middleware/#module-django.middleware.gzip
+#
+# Compressed bodies of cacheable responses are cached (keyed by the encoding and a hash of the
+# uncompressed body), so identical responses (e.g. the sitemap or listing pages) are only
+# compressed once. Responses which include a CSRF token are only gzipped, using Django's random
+# padding to mitigate the BREACH attack, and aren't cached.
+# https://docs.djangoproject.com/en/5.2/ref/csrf/#breach
+
+COMPRESSIBLE_TYPES = re.compile(
+    r'^(text/|application/(json|javascript|xml|[\w.+-]+\+(xml|json))|image/svg\+xml)')
+MIN_LENGTH = 200  # Bytes; smaller bodies aren't worth compressing
+
+
+def parse_accept_encoding(header):
+    """Return the set of encodings accepted by the client (excluding `q=0` encodings)."""
+    encodings = set()
+    for item in header.split(','):
+        encoding, _, params = item.strip().lower().partition(';')
+        quality = re.search(r'q=([\d.]+)', params)
+        if encoding and not (quality and float(quality.group(1) or 0) == 0):
+            encodings.add(encoding)
+    return encodings
+
+
+def compress(content, encoding):
+    """Return the content compressed using the encoding ('br' or 'gzip')."""
+    if encoding == 'br':
+        quality = getattr(settings, 'COMPRESSION_BROTLI_QUALITY', 5)
+        return brotli.compress(content, quality=quality)
+
+    level = getattr(settings, 'COMPRESSION_GZIP_LEVEL', 6)
+    return gzip.compress(content, compresslevel=level, mtime=0)
+
+
+class CompressionMiddleware:
+    """Compress responses using Brotli (if installed and accepted) or gzip.
+
+    Place near the top of `MIDDLEWARE` (like Django's `GZipMiddleware`), so other middleware
+    can access the uncompressed response body.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not self.is_compressible(response):
+            return response
+
+        # Vary on Accept-Encoding whether or not this client accepts compression
+        patch_vary_headers(response, ('Accept-Encoding',))
+        accepted = parse_accept_encoding(request.headers.get('Accept-Encoding', ''))
+        if brotli is not None and 'br' in accepted:
+            encoding = 'br'
+        elif 'gzip' in accepted:
+            encoding = 'gzip'
+        else:
+            return response
+
+        with timed('compression'):
+            if settings.CSRF_COOKIE_NAME in response.cookies:
+                # The response may include a CSRF token (the cookie is set when one is used)
+                encoding = 'gzip'
+                compressed = compress_string(response.content, max_random_bytes=100)
+            elif self.is_cacheable(request, response):
+                compressed = self.get_cached_compressed(response.content, encoding)
+            else:
+                compressed = compress(response.content, encoding)
+
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response.headers['Content-Length'] = str(len(compressed))
+        response.headers['Content-Encoding'] = encoding
+        # The compressed body differs from the uncompressed body, so a strong ETag is invalid
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        return response
+
+    def is_compressible(self, response):
+        return (not response.streaming
+                and not response.has_header('Content-Encoding')
+                and len(response.content) >= MIN_LENGTH
+                and COMPRESSIBLE_TYPES.match(response.get('Content-Type', '')) is not None)
+
+    def is_cacheable(self, request, response):
+        """Return True if the response may be shared between users (so is worth caching)."""
+        cache_control = response.get('Cache-Control', '')
+        return (request.method in ('GET', 'HEAD')
+                and response.status_code == 200
+                and not response.cookies
+                and 'private' not in cache_control
+                and 'no-store' not in cache_control)
+
+    def get_cached_compressed(self, content, encoding):
+        cache = caches[getattr(settings, 'COMPRESSION_CACHE', 'default')]
+        key = 'compressed:{}:{}'.format(encoding, hashlib.sha256(content).hexdigest())
+        compressed = cache.get(key)
+        record_cache_lookup(compressed is not None)
+        if compressed is None:
+            compressed = compress(content, encoding)
+            cache.set(key, compressed, getattr(settings, 'COMPRESSION_CACHE_TIMEOUT', 60 * 60))
+        return compressed
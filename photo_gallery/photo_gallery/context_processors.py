@@ -1,4 +1,7 @@
-from django.contrib.sites.models import Site
+from django.conf import settings
+from django.contrib.sites.models import Site, SITE_CACHE
+
+from .instrumentation import record_cache_lookup, timed
 
 
 def global_context(request):
@@ -6,8 +9,14 @@ def global_context(request):
     https://docs.djangoproject.com/en/5.2/ref/templates/api/#writing-your-own-context-processors
     https://docs.djangoproject.com/en/5.2/ref/contrib/sites/
     """
+    # `get_current()` caches the Site in memory (per process) after the first lookup
+    record_cache_lookup(settings.SITE_ID in SITE_CACHE)
+    with timed('site'):
+        current_site = Site.objects.get_current()
+
     # Used to construct absolute URLs, e.g. canonical links in the HTML head
-    absolute_root = "https://" + Site.objects.get_current().domain
+    absolute_root = "https://" + current_site.domain
     return {
         "absolute_root_url": absolute_root,  # E.g. `https://www.example.com`
+        "service_worker_enabled": getattr(settings, 'SERVICE_WORKER_ENABLED', False),
     }
@@ -1,5 +1,11 @@
+import os
+from dotenv import load_dotenv
 from pathlib import Path
 
+from .sqlite import get_sqlite_database
+
+
+load_dotenv()  # Load variables from .env in the project root dir
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -7,11 +13,22 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # https://docs.djangoproject.com/en/5.2/ref/settings/#database
 # These settings will be imported and used in the main settings file so
 # environment-specific settings can be defined outside of version control
-# Consider using `load_dotenv()` to retrieve values from env variables
-# The example settings below are suitable for local development
+# The example settings below are suitable for local development, or for production (with
+# `DJANGO_SQLITE_PRODUCTION=True`) on a single server; see sqlite.py for details
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': get_sqlite_database(
+        BASE_DIR / 'db.sqlite3',
+        production=os.environ.get('DJANGO_SQLITE_PRODUCTION', 'False').lower() == 'true'),
 }
+
+# Read replicas (optional) used by the public gallery views (see db_routers.py)
+# https://docs.djangoproject.com/en/5.2/topics/db/multi-db/
+# Replication itself must be configured in the database server. To try this locally with SQLite,
+# copy `db.sqlite3` to `db_replica.sqlite3` and uncomment the following (`MIRROR` makes tests
+# use the primary test database for the replica alias):
+# DATABASES['replica'] = {
+#     'ENGINE': 'django.db.backends.sqlite3',
+#     'NAME': BASE_DIR / 'db_replica.sqlite3',
+#     'TEST': {'MIRROR': 'default'},
+# }
+DATABASE_REPLICAS = []  # E.g. ['replica']
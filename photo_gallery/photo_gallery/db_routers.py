@@ -0,0 +1,88 @@
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+
+# Route the public gallery views' reads to read replicas (if any `DATABASE_REPLICAS` are defined)
+# https://docs.djangoproject.com/en/5.2/topics/db/multi-db/#automatic-database-routing
+#
+# Reads only use a replica while a public URL (see `REPLICA_URL_NAMES`) is being handled with a
+# safe method, so the admin site, contact form, and management commands always use the primary
+# ('default') database. After an unsafe (e.g. POST) request, the client's reads stay on the
+# primary for `REPLICA_STICKY_SECONDS`, so it sees its own changes despite replication lag.
+
+# Public URL names (and therefore context processors) which can read from a replica
+REPLICA_URL_NAMES = {
+    'homepage',
+    'collection',
+    'search',
+    'archive_year',
+    'archive_month',
+    'photo_detail',
+    'resized_image',
+    'photo_map_markers',
+    'service_worker_manifest',
+    'django.contrib.sitemaps.views.sitemap',
+}
+
+STICKY_COOKIE_NAME = 'use_primary_db'
+
+_replica_alias = ContextVar('replica_alias', default=None)
+
+
+def get_replicas():
+    """Return the `DATABASE_REPLICAS` aliases, excluding any which use the primary database.
+
+    E.g. replicas configured with `'TEST': {'MIRROR': 'default'}` during tests.
+    """
+    primary = connections['default'].settings_dict
+    return [alias for alias in getattr(settings, 'DATABASE_REPLICAS', [])
+            if any(connections[alias].settings_dict.get(key) != primary.get(key)
+                   for key in ('ENGINE', 'NAME', 'HOST', 'PORT'))]
+
+
+class ReplicaRouter:
+    """Read from the current request's replica (if selected by `ReplicaRoutingMiddleware`)."""
+    def db_for_read(self, model, **hints):
+        return _replica_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas contain the same data as the primary database
+        databases = {'default', *get_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """Select a replica for safe requests to `REPLICA_URL_NAMES` (unless the client is sticky)."""
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _replica_alias.set(None)
+        try:
+            response = self.get_response(request)
+        finally:
+            _replica_alias.reset(token)
+
+        if request.method not in ('GET', 'HEAD', 'OPTIONS', 'TRACE') and get_replicas():
+            sticky_seconds = getattr(settings, 'REPLICA_STICKY_SECONDS', 10)
+            response.set_cookie(STICKY_COOKIE_NAME, '1', max_age=sticky_seconds, httponly=True,
+                                samesite='Lax', secure=request.is_secure())
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        replicas = get_replicas()
+        url_names = getattr(settings, 'REPLICA_URL_NAMES', REPLICA_URL_NAMES)
+        if replicas and request.method in ('GET', 'HEAD') \
+                and request.resolver_match.url_name in url_names \
+                and STICKY_COOKIE_NAME not in request.COOKIES:
+            # Use one replica for the whole request (for consistent results)
+            _replica_alias.set(random.choice(replicas))
+        return None
@@ -0,0 +1,161 @@
+import json
+import logging
+import time
+from contextlib import contextmanager, ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+from . import metrics as prometheus_metrics
+
+
+# Per-request instrumentation: query counts/time, cache hits/misses, and named timings
+# (e.g. context processors, image rendition generation, template rendering)
+# https://docs.djangoproject.com/en/5.2/topics/http/middleware/
+# https://docs.djangoproject.com/en/5.2/topics/db/instrumentation/
+
+logger = logging.getLogger(__name__)
+
+_current_metrics = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.duration = None
+        self.query_count = 0
+        self.query_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.timings = {}  # Name: [total duration (seconds), count]
+
+    def record_query(self, execute, sql, params, many, context):
+        """Database execute wrapper which records the number and duration of queries."""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.query_time += time.perf_counter() - start
+            self.query_count += 1
+
+    def add_timing(self, name, duration):
+        total, count = self.timings.get(name, (0.0, 0))
+        self.timings[name] = (total + duration, count + 1)
+
+    def finish(self):
+        self.duration = time.perf_counter() - self.start
+
+    def as_dict(self):
+        return {
+            'duration_ms': round(self.duration * 1000, 2),
+            'queries': self.query_count,
+            'query_ms': round(self.query_time * 1000, 2),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'timings_ms': {name: round(total * 1000, 2) for name, (total, _) in self.timings.items()},
+        }
+
+    def server_timing(self):
+        """Return a `Server-Timing` header value.
+        https://developer.mozilla.org/en-US/docs/Web/HTTP/Headers/Server-Timing
+        """
+        metrics = [
+            'total;dur={:.2f}'.format(self.duration * 1000),
+            'db;dur={:.2f};desc="{} queries"'.format(self.query_time * 1000, self.query_count),
+            'cache;desc="{} hits, {} misses"'.format(self.cache_hits, self.cache_misses),
+        ]
+        for name, (total, count) in self.timings.items():
+            metrics.append('{};dur={:.2f};desc="{} calls"'.format(name, total * 1000, count))
+
+        return ', '.join(metrics)
+
+
+def get_current_metrics():
+    """Return the current request's `RequestMetrics` (or None outside of a request)."""
+    return _current_metrics.get()
+
+
+@contextmanager
+def timed(name):
+    """Record the duration of the enclosed code in the current request's metrics (if any)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics = _current_metrics.get()
+        if metrics is not None:
+            metrics.add_timing(name, time.perf_counter() - start)
+
+
+def record_cache_lookup(hit):
+    """Record a cache hit (`hit=True`) or miss in the current request's metrics (if any)."""
+    metrics = _current_metrics.get()
+    if metrics is None:
+        return
+
+    if hit:
+        metrics.cache_hits += 1
+    else:
+        metrics.cache_misses += 1
+
+
+class InstrumentationMiddleware:
+    """Record per-request metrics, exposed via `Server-Timing` headers, logs, and `/metrics`.
+
+    `Server-Timing` headers are added for staff users (or all users if `DEBUG` is True).
+    Each request is logged (at INFO level, or WARNING level if it exceeds the
+    `SLOW_REQUEST_THRESHOLD_MS` or `SLOW_REQUEST_QUERY_THRESHOLD` settings) as a JSON string.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = _current_metrics.set(metrics)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics.record_query))
+                response = self.get_response(request)
+        finally:
+            _current_metrics.reset(token)
+
+        metrics.finish()
+        self.record_metrics(request, metrics)
+        if settings.DEBUG or getattr(getattr(request, 'user', None), 'is_staff', False):
+            response.headers['Server-Timing'] = metrics.server_timing()
+
+        self.log(request, response, metrics)
+        return response
+
+    def process_template_response(self, request, response):
+        # Called immediately before the response is rendered
+        start = time.perf_counter()
+
+        def record_render_time(response):
+            metrics = _current_metrics.get()
+            if metrics is not None:
+                metrics.add_timing('template', time.perf_counter() - start)
+
+        response.add_post_render_callback(record_render_time)
+        return response
+
+    def record_metrics(self, request, metrics):
+        match = getattr(request, 'resolver_match', None)
+        view = match.url_name if match and match.url_name else 'other'
+        prometheus_metrics.REQUEST_DURATION.observe(metrics.duration, view=view)
+        prometheus_metrics.REQUEST_QUERIES.observe(metrics.query_count, view=view)
+
+    def log(self, request, response, metrics):
+        data = metrics.as_dict()
+        match = getattr(request, 'resolver_match', None)
+        data.update(method=request.method, path=request.path, status=response.status_code,
+                    view=match.view_name if match else None)
+
+        slow_ms = getattr(settings, 'SLOW_REQUEST_THRESHOLD_MS', None)
+        slow_queries = getattr(settings, 'SLOW_REQUEST_QUERY_THRESHOLD', None)
+        data['slow'] = (slow_ms is not None and data['duration_ms'] > slow_ms) or \
+                       (slow_queries is not None and data['queries'] > slow_queries)
+
+        logger.log(logging.WARNING if data['slow'] else logging.INFO, json.dumps(data))
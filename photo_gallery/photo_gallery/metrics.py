@@ -0,0 +1,235 @@
+import json
+import logging
+import math
+import os
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+
+
+# Prometheus metrics (counters and histograms) exposed via the `/metrics` endpoint
+# https://prometheus.io/docs/instrumenting/exposition_formats/
+#
+# Each process records metrics in memory. If the `METRICS_DIR` setting is defined, each process
+# also periodically writes its values to its own JSON file in the directory (atomically), and
+# `/metrics` responses aggregate the values from every file, so multiple worker processes can
+# be scraped via any one of them. Delete the directory contents when (re)deploying.
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_registry = {}  # Name: metric
+_values = {}  # Name: {labels (JSON string): value (counter) or [bucket counts, sum, count]}
+_process = {'pid': None, 'file': None, 'last_flush': 0.0}
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        _registry[name] = self
+
+    def inc(self, amount=1, **labels):
+        with _lock:
+            values = _process_values().setdefault(self.name, {})
+            key = _labels_key(labels)
+            values[key] = values.get(key, 0) + amount
+        _maybe_flush()
+
+
+class Histogram:
+    type = 'histogram'
+
+    def __init__(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        _registry[name] = self
+
+    def observe(self, value, **labels):
+        with _lock:
+            values = _process_values().setdefault(self.name, {})
+            key = _labels_key(labels)
+            if key not in values:
+                values[key] = [[0] * len(self.buckets), 0.0, 0]
+
+            bucket_counts, total, count = values[key]
+            for i, upper_bound in enumerate(self.buckets):
+                if value <= upper_bound:
+                    bucket_counts[i] += 1
+                    break
+            values[key][1:] = [total + value, count + 1]
+        _maybe_flush()
+
+
+REQUEST_DURATION = Histogram('gallery_request_duration_seconds',
+                             "Request duration (seconds) by URL name.")
+REQUEST_QUERIES = Histogram('gallery_request_db_queries',
+                            "Database queries per request by URL name.",
+                            buckets=(1, 2, 5, 10, 20, 50, 100, 200))
+RENDITION_GENERATIONS = Counter('gallery_rendition_generations_total',
+                                "Image renditions (ImageSpecField files) generated.")
+RENDITION_DURATION = Histogram('gallery_rendition_generation_seconds',
+                               "Image rendition generation duration (seconds).")
+RENDITION_LOCK_CONTENTION = Counter('gallery_rendition_lock_contention_total',
+                                    "Rendition generations which waited for another worker's "
+                                    "lock, by result (waited, generated, or timeout).")
+RENDITION_LOCK_WAIT = Histogram('gallery_rendition_lock_wait_seconds',
+                                "Time spent waiting for another worker's rendition lock.")
+IMAGE_CACHE_REQUESTS = Counter('gallery_image_cache_requests_total',
+                               "On-demand image rendition requests by cache result.")
+IMAGE_CACHE_EVICTIONS = Counter('gallery_image_cache_evictions_total',
+                                "On-demand image renditions evicted from the disk cache.")
+CONTACT_SUBMISSIONS = Counter('gallery_contact_submissions_total',
+                              "Valid contact form submissions.")
+CONTACT_EMAILS_SENT = Counter('gallery_contact_emails_sent_total',
+                              "Contact message email alerts sent (from the outbox).")
+CONTACT_EMAIL_FAILURES = Counter('gallery_contact_email_failures_total',
+                                 "Contact message email alert attempts which failed.")
+THROTTLE_REQUESTS = Counter('gallery_throttle_requests_total',
+                            "Throttle checks by scope and result (allowed or throttled).")
+
+
+def _labels_key(labels):
+    return json.dumps(labels, sort_keys=True)
+
+
+def _process_values():
+    """Return this process's values (reset if the process has been forked since recording)."""
+    if _process['pid'] != os.getpid():
+        _values.clear()
+        _process.update(pid=os.getpid(), file="{}-{}.json".format(os.getpid(), uuid.uuid4().hex))
+    return _values
+
+
+def _metrics_dir():
+    metrics_dir = getattr(settings, 'METRICS_DIR', None)
+    return Path(metrics_dir) if metrics_dir else None
+
+
+def _maybe_flush():
+    """Flush if the interval has passed (claimed under the lock, so one thread flushes)."""
+    interval = getattr(settings, 'METRICS_FLUSH_INTERVAL', 5)
+    with _lock:
+        if time.monotonic() - _process['last_flush'] < interval:
+            return
+        _process['last_flush'] = time.monotonic()
+    flush()
+
+
+def flush():
+    """Write this process's values to its file in `METRICS_DIR` (if defined).
+
+    Failures are logged rather than raised, so recording metrics never fails a request.
+    """
+    metrics_dir = _metrics_dir()
+    if metrics_dir is None:
+        return
+
+    with _lock:
+        data = json.dumps(_process_values())
+        path = metrics_dir / _process['file']
+        _process['last_flush'] = time.monotonic()
+
+    try:
+        metrics_dir.mkdir(parents=True, exist_ok=True)
+        # A unique temporary file, since other threads may be flushing at the same time
+        fd, tmp_path = tempfile.mkstemp(dir=metrics_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    except OSError:
+        logger.exception("Failed to write the metrics file %s", path)
+
+
+def collect():
+    """Return the values of every process (if `METRICS_DIR` is defined) or this process."""
+    metrics_dir = _metrics_dir()
+    if metrics_dir is None:
+        with _lock:
+            return json.loads(json.dumps(_process_values()))
+
+    flush()
+    aggregated = {}
+    for path in metrics_dir.glob('*.json'):
+        try:
+            process_values = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue  # E.g. deleted since listing the directory
+
+        for name, values in process_values.items():
+            metric_values = aggregated.setdefault(name, {})
+            for key, value in values.items():
+                if key not in metric_values:
+                    metric_values[key] = value
+                elif isinstance(value, list):
+                    existing = metric_values[key]
+                    existing[0] = [a + b for a, b in zip(existing[0], value[0])]
+                    existing[1] += value[1]
+                    existing[2] += value[2]
+                else:
+                    metric_values[key] += value
+
+    return aggregated
+
+
+def _format_labels(labels, **extra):
+    labels = dict(labels, **extra)
+    if not labels:
+        return ''
+
+    pairs = ['{}="{}"'.format(k, str(v).replace('\\', r'\\').replace('"', r'\"'))
+             for k, v in labels.items()]
+    return '{' + ','.join(pairs) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) and not math.isinf(value) else str(value)
+
+
+def render_metrics():
+    """Return all metrics in the Prometheus text exposition format."""
+    values = collect()
+    lines = []
+    for name, metric in _registry.items():
+        lines.append('# HELP {} {}'.format(name, metric.documentation))
+        lines.append('# TYPE {} {}'.format(name, metric.type))
+        for key, value in sorted(values.get(name, {}).items()):
+            labels = json.loads(key)
+            if metric.type == 'counter':
+                lines.append('{}{} {}'.format(name, _format_labels(labels), _format_value(value)))
+                continue
+
+            bucket_counts, total, count = value
+            cumulative = 0
+            for upper_bound, bucket_count in zip(metric.buckets, bucket_counts):
+                cumulative += bucket_count
+                lines.append('{}_bucket{} {}'.format(
+                    name, _format_labels(labels, le=upper_bound), cumulative))
+            lines.append('{}_bucket{} {}'.format(name, _format_labels(labels, le='+Inf'), count))
+            lines.append('{}_sum{} {}'.format(name, _format_labels(labels), _format_value(total)))
+            lines.append('{}_count{} {}'.format(name, _format_labels(labels), count))
+
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """Return the metrics to staff users and `METRICS_ALLOWED_IPS` (otherwise a 404 response)."""
+    allowed_ips = getattr(settings, 'METRICS_ALLOWED_IPS', [])
+    if request.META.get('REMOTE_ADDR') not in allowed_ips and not request.user.is_staff:
+        raise Http404()
+
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,34 @@
+import copy
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponseNotFound
+from django.template.loader import render_to_string
+from django.utils.html import escape
+
+
+# A 404 handler which renders the 404 page once and caches the output
+# https://docs.djangoproject.com/en/5.2/topics/http/views/#customizing-error-views
+#
+# Unknown URLs are frequently requested by bots (e.g. `/wp-login` or `/.env`), so the page (and
+# its context processors' queries) isn't rendered for every request. The page is rendered with a
+# placeholder (as the path of a copy of the request, so e.g. the navigation's active link doesn't
+# depend on the first request), which is replaced by each request's (escaped) path. It's cached
+# for `NOT_FOUND_CACHE_TIMEOUT` seconds, after which changes to e.g. the navigation are displayed.
+
+CACHE_KEY = 'not_found_page'
+PATH_PLACEHOLDER = '__not_found_path__'
+
+
+def page_not_found(request, exception=None):
+    """Return the (cached) 404 page, including the requested path."""
+    content = cache.get(CACHE_KEY)
+    if content is None:
+        neutral_request = copy.copy(request)
+        neutral_request.path = neutral_request.path_info = PATH_PLACEHOLDER
+        content = render_to_string('404.html', {'request_path': PATH_PLACEHOLDER},
+                                   neutral_request)
+        cache.set(CACHE_KEY, content, getattr(settings, 'NOT_FOUND_CACHE_TIMEOUT', 5 * 60))
+
+    return HttpResponseNotFound(content.replace(PATH_PLACEHOLDER,
+                                                escape(request.get_full_path())))
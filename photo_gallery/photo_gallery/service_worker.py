@@ -0,0 +1,82 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count, Max
+from django.http import Http404, HttpResponse, JsonResponse
+from django.template.loader import render_to_string
+from django.urls import get_script_prefix, reverse
+
+from nav.models import NavLink, NavSection
+from photos.models import Collection, Photo
+
+
+# An opt-in service worker (enabled via the `SERVICE_WORKER_ENABLED` setting), served from the
+# site root so that its scope includes every page
+# https://developer.mozilla.org/en-US/docs/Web/API/Service_Worker_API
+#
+# The worker (templates/service_worker.js) serves uploaded/generated images (`MEDIA_URL`)
+# cache-first and on-demand renditions stale-while-revalidate (since their URLs aren't versioned,
+# see `photos.views.resized_image`), keeping a bounded number of them, and serves gallery pages
+# stale-while-revalidate. Periodically (after responding), it fetches the version manifest
+# (`/sw-manifest.json`), whose version is derived from the counts and `last_modified` values of
+# the Photos, Collections, and navigation sections/links (which are displayed on every page), and
+# deletes its cached pages if the version has changed (i.e. any of them were added, changed, or
+# deleted). Cached images don't need to be invalidated since an image's URL changes if its
+# content does.
+#
+# If the setting is disabled after being enabled, the worker which is served instead deletes
+# its caches and unregisters itself.
+
+CACHE_VERSION = 1  # Increment to discard every client's cached responses (e.g. after a redesign)
+VERSION_CACHE_KEY = 'service_worker_gallery_version'
+VERSION_CACHE_TIMEOUT = 60  # Seconds
+
+
+def get_gallery_version():
+    """Return a version string which changes whenever a Photo, Collection, or navigation
+    section/link is added, changed, or deleted."""
+    def get_version():
+        values = [model.objects.aggregate(count=Count('pk'), last_modified=Max('last_modified'))
+                  for model in (Photo, Collection, NavSection, NavLink)]
+        data = json.dumps(values, cls=DjangoJSONEncoder).encode()
+        return hashlib.sha256(data).hexdigest()[:16]
+
+    return cache.get_or_set(VERSION_CACHE_KEY, get_version, VERSION_CACHE_TIMEOUT)
+
+
+def service_worker(request):
+    """Return the service worker script (or one which unregisters itself, if disabled)."""
+    config = {
+        'cacheVersion': CACHE_VERSION,
+        # Paths of images (whose URLs change if their content does) and on-demand renditions
+        # (`/img/<slug>/<width>.<extension>`, which are revalidated)
+        'imagePrefixes': [settings.MEDIA_URL],
+        'renditionPrefixes': [get_script_prefix() + 'img/'],
+        'excludedPaths': [reverse('admin:index'), reverse('contact'), reverse('contact_success'),
+                          reverse('search'), reverse('metrics')],
+        'maxImages': getattr(settings, 'SERVICE_WORKER_MAX_IMAGES', 300),
+        'manifestUrl': reverse('service_worker_manifest'),
+        'manifestMaxAge': getattr(settings, 'SERVICE_WORKER_MANIFEST_MAX_AGE', 300),
+    }
+    # Rendered without a request, since the context processors' variables aren't used
+    script = render_to_string('service_worker.js', {
+        'enabled': getattr(settings, 'SERVICE_WORKER_ENABLED', False),
+        'config': json.dumps(config, indent=2),
+    })
+    response = HttpResponse(script, content_type='text/javascript')
+    # Browsers check for an updated worker at least daily; revalidate on every check
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def service_worker_manifest(request):
+    """Return the gallery version used by the service worker to invalidate cached pages."""
+    if not getattr(settings, 'SERVICE_WORKER_ENABLED', False):
+        raise Http404()
+
+    response = JsonResponse({'version': get_gallery_version()})
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
@@ -81,6 +81,7 @@ INSTALLED_APPS = [
     'contact.apps.ContactConfig',
     'nav.apps.NavConfig',
     'photos.apps.PhotosConfig',
+    'profiling.apps.ProfilingConfig',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -96,17 +97,29 @@ CRISPY_TEMPLATE_PACK = "bootstrap5"
 SITE_ID = 1
 
 MIDDLEWARE = [
+    # Outermost, so the recorded request duration includes the other middleware
+    'photo_gallery.instrumentation.InstrumentationMiddleware',
+    # Before other middleware which may read or modify the response body
+    'photo_gallery.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'profiling.middleware.ProfilerMiddleware',
+    'photo_gallery.db_routers.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
 ROOT_URLCONF = 'photo_gallery.urls'
 
+# Read replicas are optional; see database_settings_example.py and db_routers.py
+# https://docs.djangoproject.com/en/5.2/topics/db/multi-db/
+DATABASE_ROUTERS = ['photo_gallery.db_routers.ReplicaRouter']
+DATABASE_REPLICAS = globals().get('DATABASE_REPLICAS', [])  # Set in database_settings.py
+REPLICA_STICKY_SECONDS = 10
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -158,11 +171,128 @@ STATIC_URL = 'static/'
 STATIC_ROOT = BASE_DIR / 'static'
 STATICFILES_DIRS = [BASE_DIR / 'global_static']
 
+# https://docs.djangoproject.com/en/5.2/ref/settings/#storages
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    # Writes hashed (fingerprinted) and precompressed copies of static files during
+    # `collectstatic` (see storage.py)
+    'staticfiles': {
+        'BACKEND': 'photo_gallery.storage.PrecompressedManifestStaticFilesStorage',
+    },
+}
+
+# Use unhashed static file names if `collectstatic` hasn't been run, in debug mode only (otherwise
+# a missing manifest raises an error, rather than serving unhashed files which would be cached
+# "forever"). Enabled for tests by the test runner (see `test_runner.py`).
+STATIC_MANIFEST_FALLBACK = get_bool_from_env('DJANGO_DEBUG_MODE', 'False')
+
+# https://docs.djangoproject.com/en/5.2/topics/testing/advanced/#defining-a-test-runner
+TEST_RUNNER = 'photo_gallery.test_runner.GalleryTestRunner'
+
 # Uploaded & generated files
 # https://docs.djangoproject.com/en/5.2/topics/files/
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media/'
 
+# Image renditions (ImageSpecField) generation/caching
+# https://django-imagekit.readthedocs.io/en/latest/configuration.html
+IMAGEKIT_DEFAULT_CACHEFILE_BACKEND = 'photos.cachefiles.InstrumentedBackend'
+# Generation is locked (across processes) so concurrent requests don't generate the same file
+RENDITION_LOCK_DIR = BASE_DIR / 'locks/'
+RENDITION_LOCK_TIMEOUT = 10  # Seconds to wait for another worker (then use the source image)
+
+# On-demand image renditions (`/img/<slug>/<width>.<extension>`, see photos/renditions.py)
+IMAGE_RENDITION_WIDTHS = [150, 320, 640, 800, 1080, 1200, 1600, 2000]
+IMAGE_RENDITION_FORMATS = {'jpg': 'JPEG', 'webp': 'WEBP'}  # Extension: Pillow format
+IMAGE_RENDITION_QUALITY = 80
+IMAGE_RENDITION_LOCK_TIMEOUT = 30  # Seconds to wait for another request's generation
+IMAGE_CACHE_DIR = BASE_DIR / 'image_cache/'
+IMAGE_CACHE_MAX_BYTES = 1024 ** 3  # Least recently used renditions are deleted beyond this
+IMAGE_CACHE_EVICTION_INTERVAL = 60  # Seconds between checks of the cache size
+IMAGE_RENDITION_MAX_AGE = 60 * 60  # Seconds browsers cache a rendition before revalidating
+
+# Similar photos (see photos/similarity.py), shown if the optional `numpy` package is installed
+# Rebuild the index periodically using `python manage.py build_similarity_index`
+SIMILARITY_INDEX_PATH = BASE_DIR / 'indexes/similarity.npy'
+SIMILARITY_MAX_UNINDEXED = 1000  # Most recently updated vectors searched outside the index
+SIMILAR_PHOTOS_COUNT = 4
+
+# Request instrumentation (see instrumentation.py)
+# Requests which exceed either threshold are logged as warnings (`None` to disable)
+SLOW_REQUEST_THRESHOLD_MS = 500
+SLOW_REQUEST_QUERY_THRESHOLD = 30
+
+# Prometheus metrics (see metrics.py)
+# Set a directory to aggregate metrics across multiple worker processes
+METRICS_DIR = os.environ.get('DJANGO_METRICS_DIR') or None
+METRICS_ALLOWED_IPS = get_list_from_env('DJANGO_METRICS_ALLOWED_IPS')
+
+# Response compression (see compression.py)
+# Brotli is used if the optional `brotli` package is installed
+COMPRESSION_BROTLI_QUALITY = 5  # 0-11
+COMPRESSION_GZIP_LEVEL = 6  # 1-9
+COMPRESSION_CACHE_TIMEOUT = 60 * 60  # Seconds
+
+# Photo search (see photos/search.py)
+SEARCH_LOG_FLUSH_INTERVAL = 10  # Seconds between writing each process's query counts to the DB
+SEARCH_CACHE_QUERIES = 100  # Number of most frequent queries whose results are cached
+SEARCH_CACHE_MAX_RESULTS = 1000  # Queries with more results aren't cached
+SEARCH_CACHE_TIMEOUT = 60 * 60 * 24  # Seconds
+SEARCH_CACHE_BACKGROUND_REFRESH = True  # Recompute cached results after Photos change
+
+# Opt-in service worker caching images and pages in visitors' browsers (see service_worker.py)
+SERVICE_WORKER_ENABLED = get_bool_from_env('DJANGO_SERVICE_WORKER_ENABLED', 'False')
+SERVICE_WORKER_MAX_IMAGES = 300  # Oldest cached images are deleted beyond this
+SERVICE_WORKER_MANIFEST_MAX_AGE = 300  # Seconds between checks for gallery changes
+
+# Rendered photo list and card fragments (see photos/templates/photos/photo_list.html), whose
+# cache keys include each Photo's `last_modified` value (so changes are displayed immediately)
+FRAGMENT_CACHE_TIMEOUT = 60 * 60 * 24  # Seconds
+
+# Rendered 404 page (see not_found.py); navigation changes are displayed after the timeout
+NOT_FOUND_CACHE_TIMEOUT = 60 * 5  # Seconds
+
+# Caching (e.g. throttle buckets, compressed responses, and template fragments)
+# Use a shared cache (e.g. 'django.core.cache.backends.redis.RedisCache') with multiple processes
+# https://docs.djangoproject.com/en/5.2/ref/settings/#caches
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('DJANGO_CACHE_BACKEND',
+                                  'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('DJANGO_CACHE_LOCATION', ''),
+    }
+}
+
+# Request throttling (see throttling.py)
+# Rates are '<burst size>/<period>', where the period is one of s/m/h/d
+THROTTLES = {
+    'contact': {'per_ip': '10/m', 'global': '100/m', 'methods': ['POST']},
+    'search': {'per_ip': '60/m', 'global': '1200/m'},
+}
+THROTTLE_CLIENT_IP_HEADER = os.environ.get('DJANGO_THROTTLE_CLIENT_IP_HEADER') or None
+# The number of trusted proxies which append to the header (earlier entries are client-controlled)
+THROTTLE_TRUSTED_PROXY_COUNT = int(os.environ.get('DJANGO_THROTTLE_TRUSTED_PROXY_COUNT') or 1)
+
+# Contact message email alert outbox (see contact/outbox.py)
+# Failed attempts are retried after CONTACT_EMAIL_RETRY_DELAY seconds, doubling after each attempt
+CONTACT_EMAIL_MAX_ATTEMPTS = 8
+CONTACT_EMAIL_RETRY_DELAY = 60
+CONTACT_EMAIL_MAX_RETRY_DELAY = 6 * 60 * 60
+# Seconds a claimed batch is reserved for a worker (reclaimed afterwards, e.g. if it was killed)
+CONTACT_EMAIL_SEND_LEASE = 10 * 60
+
+# Contact message retention (see contact/management/commands/archive_contact_messages.py)
+# Resolved messages older than the retention period are archived as gzipped JSON Lines files
+CONTACT_MESSAGE_RETENTION_DAYS = 365
+CONTACT_ARCHIVE_DIR = BASE_DIR / 'contact_archive/'
+
+# Staff request profiling (see profiling/middleware.py)
+# Profiles are stored outside of `MEDIA_ROOT` (they're downloadable via the admin site)
+PROFILES_ROOT = BASE_DIR / 'profiles/'
+PROFILER_MIN_INTERVAL = 60  # Seconds
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -0,0 +1,64 @@
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, StaticFilesStorage
+from django.core.files.base import ContentFile
+
+from .compression import brotli, compress
+
+
+# Static files storage which writes precompressed (.gz and, if Brotli is installed, .br)
+# copies of each compressible file during `collectstatic`, so the web server can serve them
+# directly (e.g. via nginx's `gzip_static` and `brotli_static` directives)
+# https://docs.djangoproject.com/en/5.2/ref/contrib/staticfiles/#custom-static-file-storage
+# https://nginx.org/en/docs/http/ngx_http_gzip_static_module.html
+
+PRECOMPRESS_EXTENSIONS = ('.css', '.js', '.mjs', '.map', '.svg', '.html', '.txt', '.xml',
+                          '.json', '.ico', '.ttf', '.otf', '.eot')
+
+
+class PrecompressMixin:
+    def post_process(self, paths, dry_run=False, **options):
+        parent_post_process = getattr(super(), 'post_process', None)
+        processed_names = []
+        if parent_post_process is not None:
+            for name, hashed_name, processed in parent_post_process(paths, dry_run, **options):
+                if hashed_name and not isinstance(processed, Exception):
+                    processed_names.append(hashed_name)
+                yield name, hashed_name, processed
+
+        if dry_run:
+            return
+
+        encodings = [('gzip', '.gz')] + ([('br', '.br')] if brotli is not None else [])
+        for name in sorted(set(paths) | set(processed_names)):
+            if not name.endswith(PRECOMPRESS_EXTENSIONS):
+                continue
+
+            with self.open(name) as f:
+                content = f.read()
+            for encoding, extension in encodings:
+                compressed = compress(content, encoding)
+                if len(compressed) >= len(content):
+                    continue  # Not worth serving compressed
+
+                if self.exists(name + extension):
+                    self.delete(name + extension)
+                self._save(name + extension, ContentFile(compressed))
+                yield name, name + extension, True
+
+
+class PrecompressedStaticFilesStorage(PrecompressMixin, StaticFilesStorage):
+    pass
+
+
+class PrecompressedManifestStaticFilesStorage(PrecompressMixin, ManifestStaticFilesStorage):
+    """Store static files with content hashes in their names, so they can be cached "forever".
+    https://docs.djangoproject.com/en/5.2/ref/contrib/staticfiles/#manifeststaticfilesstorage
+
+    If `collectstatic` hasn't been run, unhashed names are used if `STATIC_MANIFEST_FALLBACK` is
+    set (in debug mode or when running tests), rather than raising an error for every static
+    file. Otherwise, the error is raised, since the unhashed files would be cached "forever".
+    """
+    def stored_name(self, name):
+        if not self.hashed_files and getattr(settings, 'STATIC_MANIFEST_FALLBACK', False):
+            return name
+        return super().stored_name(name)
@@ -0,0 +1,22 @@
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+
+# The test runner (`TEST_RUNNER` setting), which overrides settings for the whole test suite
+# https://docs.djangoproject.com/en/5.2/topics/testing/advanced/#defining-a-test-runner
+
+TEST_SETTINGS = {
+    # `collectstatic` isn't run for tests, so use unhashed static file names
+    'STATIC_MANIFEST_FALLBACK': True,
+}
+
+
+class GalleryTestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.settings_override = override_settings(**TEST_SETTINGS)
+        self.settings_override.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.settings_override.disable()
+        super().teardown_test_environment(**kwargs)
@@ -1,7 +1,33 @@
-from django.test import override_settings, tag, TestCase
+import datetime
+import gzip
+import json
+import tempfile
+import threading
+import time
+from io import StringIO
+from pathlib import Path
+
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections, router
+from django.http import HttpResponse
+from django.test import override_settings, RequestFactory, SimpleTestCase, tag, TestCase
+from django.urls import ResolverMatch, reverse
+from django.utils import timezone
+from unittest import skipUnless
 from unittest.mock import patch
 
+from . import assets, compression, metrics, throttling
+from .db_routers import (get_replicas, REPLICA_URL_NAMES, ReplicaRouter, ReplicaRoutingMiddleware,
+                         STICKY_COOKIE_NAME)
+from .instrumentation import get_current_metrics, RequestMetrics, timed
 from .settings import get_bool_from_env, get_list_from_env
+from .sqlite import get_sqlite_database
+from .storage import PrecompressedManifestStaticFilesStorage
+from nav.models import NavLink, NavSection
+from photos.models import Collection, Photo, SearchQuery
 
 
 @tag('settings')
@@ -61,3 +87,596 @@ class SettingsTests(TestCase):
         """Test that an exception is raised for an invalid env val."""
         with patch.dict('os.environ', {'INVALID_VAL': 'not a bool'}):
             self.assertRaises(AssertionError, get_bool_from_env, 'INVALID_VAL')
+
+
+    def test_sqlite_production_profile(self):
+        """Test that the SQLite production profile pragmas are applied to new connections."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            settings_dict = get_sqlite_database(Path(tmp_dir) / 'db.sqlite3', production=True)
+            self.assertEqual(settings_dict['OPTIONS']['transaction_mode'], 'IMMEDIATE')
+            self.assertTrue(settings_dict['CONN_HEALTH_CHECKS'])
+
+            connection = connections.create_connection('default').__class__(
+                dict(connections['default'].settings_dict, **settings_dict), alias='sqlite_test')
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute('PRAGMA journal_mode')
+                    self.assertEqual(cursor.fetchone()[0], 'wal')
+                    cursor.execute('PRAGMA synchronous')
+                    self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+                    cursor.execute('PRAGMA busy_timeout')
+                    self.assertEqual(cursor.fetchone()[0], 5000)
+            finally:
+                connection.close()
+
+    def test_sqlite_development_profile(self):
+        """Test that the SQLite development profile doesn't set options."""
+        settings_dict = get_sqlite_database('db.sqlite3')
+        self.assertNotIn('OPTIONS', settings_dict)
+
+
+@tag('instrumentation')
+@override_settings(SECURE_SSL_REDIRECT=False)
+class InstrumentationTests(TestCase):
+    def test_server_timing_staff(self):
+        """Test that staff responses include a `Server-Timing` header with DB and nav metrics."""
+        staff = User.objects.create_user('staff', 'staff@example.com', 'password', is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.get(reverse("homepage"))
+        self.assertRegex(response.headers['Server-Timing'], r'db;dur=[\d.]+;desc="\d+ queries"')
+        self.assertIn('nav;dur=', response.headers['Server-Timing'])
+        self.assertIn('template;dur=', response.headers['Server-Timing'])
+
+    def test_no_server_timing_anonymous(self):
+        """Test that responses to anonymous users don't include a `Server-Timing` header."""
+        response = self.client.get(reverse("homepage"))
+        self.assertNotIn('Server-Timing', response.headers)
+
+    @override_settings(SLOW_REQUEST_THRESHOLD_MS=None, SLOW_REQUEST_QUERY_THRESHOLD=0)
+    def test_slow_request_logged(self):
+        """Test that a request exceeding a threshold is logged as a warning (JSON)."""
+        with self.assertLogs('photo_gallery.instrumentation', level='WARNING') as logs:
+            self.client.get(reverse("homepage"))
+
+        data = json.loads(logs.records[0].getMessage())
+        self.assertTrue(data['slow'])
+        self.assertEqual(data['view'], 'homepage')
+        self.assertGreater(data['queries'], 0)
+
+    def test_timed_outside_request(self):
+        """Test that `timed()` can be used outside of a request (without recording anything)."""
+        self.assertIsNone(get_current_metrics())
+        with timed('test'):
+            pass
+
+    def test_server_timing_format(self):
+        """Test the `Server-Timing` header value format."""
+        metrics = RequestMetrics()
+        metrics.add_timing('nav', 0.0015)
+        metrics.add_timing('nav', 0.0005)
+        metrics.cache_hits = 1
+        metrics.finish()
+        self.assertIn('nav;dur=2.00;desc="2 calls"', metrics.server_timing())
+        self.assertIn('cache;desc="1 hits, 0 misses"', metrics.server_timing())
+
+
+@tag('metrics')
+@override_settings(SECURE_SSL_REDIRECT=False, METRICS_DIR=None)
+class MetricsTests(TestCase):
+    @override_settings(METRICS_ALLOWED_IPS=['127.0.0.1'])
+    def test_request_histograms(self):
+        """Test that the metrics include request duration and query histograms by URL name."""
+        self.client.get(reverse("homepage"))
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, 200)
+        content = response.content.decode()
+        self.assertIn('# TYPE gallery_request_duration_seconds histogram', content)
+        self.assertIn('gallery_request_duration_seconds_bucket{view="homepage",le="+Inf"}', content)
+        self.assertIn('gallery_request_db_queries_count{view="homepage"}', content)
+
+    def test_anonymous_404(self):
+        """Test that the metrics aren't available to anonymous users from other IP addresses."""
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, 404)
+
+    def test_staff_200(self):
+        """Test that the metrics are available to staff users."""
+        staff = User.objects.create_user('staff', 'staff@example.com', 'password', is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, 200)
+
+    def test_multiprocess_aggregation(self):
+        """Test that values written by other processes to `METRICS_DIR` are aggregated."""
+        metrics.CONTACT_SUBMISSIONS.inc()
+        metrics.RENDITION_DURATION.observe(0.02)
+        own = metrics.collect()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            other_process = {
+                'gallery_contact_submissions_total': {'{}': 5},
+                'gallery_rendition_generation_seconds': {'{}': [[1] + [0] * 10, 0.001, 1]},
+            }
+            (Path(tmp_dir) / 'other.json').write_text(json.dumps(other_process))
+            with override_settings(METRICS_DIR=tmp_dir):
+                aggregated = metrics.collect()
+                self.assertEqual(len(list(Path(tmp_dir).glob('*.json'))), 2)
+
+        self.assertEqual(aggregated['gallery_contact_submissions_total']['{}'],
+                         own['gallery_contact_submissions_total']['{}'] + 5)
+        self.assertEqual(aggregated['gallery_rendition_generation_seconds']['{}'][2],
+                         own['gallery_rendition_generation_seconds']['{}'][2] + 1)
+
+    def test_concurrent_flushes(self):
+        """Test that threads flushing at the same time each write a complete file."""
+        errors = []
+
+        def flush():
+            try:
+                for _ in range(20):
+                    metrics.flush()
+            except Exception as exc:
+                errors.append(exc)
+
+        metrics.CONTACT_SUBMISSIONS.inc()
+        with tempfile.TemporaryDirectory() as tmp_dir, override_settings(METRICS_DIR=tmp_dir):
+            threads = [threading.Thread(target=flush) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual([path.suffix for path in Path(tmp_dir).iterdir()], ['.json'])
+
+        self.assertEqual(errors, [])
+
+    def test_flush_error_logged(self):
+        """Test that a failure to write the metrics file is logged rather than raised."""
+        with tempfile.NamedTemporaryFile() as file, override_settings(METRICS_DIR=file.name):
+            with self.assertLogs('photo_gallery.metrics', 'ERROR'):
+                metrics.flush()
+
+    def test_interval_flush_claimed_once(self):
+        """Test that only one thread flushes per interval."""
+        with override_settings(METRICS_FLUSH_INTERVAL=60), \
+                patch.object(metrics, 'flush') as flush, \
+                patch.dict(metrics._process, last_flush=float('-inf')):
+            threads = [threading.Thread(target=metrics._maybe_flush) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(flush.call_count, 1)
+
+    def test_histogram_exposition(self):
+        """Test that histogram buckets are rendered cumulatively."""
+        histogram = metrics.Histogram('test_histogram_seconds', "Test.", buckets=(1, 2))
+        self.addCleanup(metrics._registry.pop, 'test_histogram_seconds')
+        histogram.observe(0.5, view="test")
+        histogram.observe(1.5, view="test")
+        histogram.observe(3, view="test")
+        content = metrics.render_metrics()
+        self.assertIn('test_histogram_seconds_bucket{view="test",le="1"} 1', content)
+        self.assertIn('test_histogram_seconds_bucket{view="test",le="2"} 2', content)
+        self.assertIn('test_histogram_seconds_bucket{view="test",le="+Inf"} 3', content)
+        self.assertIn('test_histogram_seconds_sum{view="test"} 5.0', content)
+
+
+@tag('throttling')
+@override_settings(SECURE_SSL_REDIRECT=False, METRICS_DIR=None, THROTTLE_CLIENT_IP_HEADER=None,
+                   THROTTLES={'search': {'per_ip': '2/m', 'global': '3/m'},
+                              'contact': {'per_ip': '1/m', 'methods': ['POST']}})
+class ThrottlingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('search') + '?query=test'
+
+    def test_per_ip_limit(self):
+        """Test that requests exceeding the per-IP burst receive a 429 response."""
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers['Retry-After'], '30')
+
+        response = self.client.get(self.url, REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(response.status_code, 200)
+
+    def test_global_limit(self):
+        """Test that requests exceeding the global burst receive a 429 response (for any IP)."""
+        for i in range(3):
+            response = self.client.get(self.url, REMOTE_ADDR='10.0.0.{}'.format(i))
+            self.assertEqual(response.status_code, 200)
+
+        response = self.client.get(self.url, REMOTE_ADDR='10.0.0.9')
+        self.assertEqual(response.status_code, 429)
+
+    def test_throttled_no_queries(self):
+        """Test that throttled requests don't query the database."""
+        self.client.get(self.url)
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url).status_code, 429)
+
+    def test_refill(self):
+        """Test that tokens are refilled over time."""
+        now = time.time()
+        with patch('photo_gallery.throttling.time.time', return_value=now):
+            self.client.get(self.url)
+            self.client.get(self.url)
+            self.assertEqual(self.client.get(self.url).status_code, 429)
+        with patch('photo_gallery.throttling.time.time', return_value=now + 30):
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+            self.assertEqual(self.client.get(self.url).status_code, 429)
+
+    def test_methods(self):
+        """Test that only the configured methods are throttled."""
+        for _ in range(3):
+            self.assertEqual(self.client.get(reverse('contact')).status_code, 200)
+
+        data = {'first_name': 'john', 'email_address': 'email@example.com',
+                'subject': 'Message Subject', 'message': 'This is the message.'}
+        self.assertEqual(self.client.post(reverse('contact'), data).status_code, 302)
+        self.assertEqual(self.client.post(reverse('contact'), data).status_code, 429)
+
+    @override_settings(THROTTLE_CLIENT_IP_HEADER='X-Forwarded-For')
+    def test_client_ip_header(self):
+        """Test that the client IP is read from `THROTTLE_CLIENT_IP_HEADER` if set."""
+        headers = {'X-Forwarded-For': '10.0.0.1'}
+        self.client.get(self.url, headers=headers)
+        self.client.get(self.url, headers=headers)
+        self.assertEqual(self.client.get(self.url, headers=headers).status_code, 429)
+        headers = {'X-Forwarded-For': '10.0.0.2'}
+        self.assertEqual(self.client.get(self.url, headers=headers).status_code, 200)
+
+    @override_settings(THROTTLE_CLIENT_IP_HEADER='X-Forwarded-For')
+    def test_spoofed_client_ip_header(self):
+        """Test that client-supplied `X-Forwarded-For` entries don't avoid the per-IP limit."""
+        for spoofed in ('1.1.1.1', '2.2.2.2', '3.3.3.3'):
+            headers = {'X-Forwarded-For': '{}, 10.0.0.1'.format(spoofed)}
+            response = self.client.get(self.url, headers=headers)
+        self.assertEqual(response.status_code, 429)
+
+    @override_settings(THROTTLE_CLIENT_IP_HEADER='X-Forwarded-For',
+                       THROTTLE_TRUSTED_PROXY_COUNT=2)
+    def test_trusted_proxy_count(self):
+        """Test that the client IP is read from the right using `THROTTLE_TRUSTED_PROXY_COUNT`."""
+        request = RequestFactory().get(self.url, headers={
+            'X-Forwarded-For': '1.1.1.1, 10.0.0.1, 192.168.0.1'})
+        self.assertEqual(throttling.get_client_ip(request), '10.0.0.1')
+
+    def test_metrics(self):
+        """Test that throttle checks are counted by scope and result."""
+        def count(result):
+            key = json.dumps({'result': result, 'scope': 'search'})
+            return metrics.collect().get('gallery_throttle_requests_total', {}).get(key, 0)
+
+        allowed, throttled = count('allowed'), count('throttled_ip')
+        for _ in range(3):
+            self.client.get(self.url)
+        self.assertEqual(count('allowed'), allowed + 2)
+        self.assertEqual(count('throttled_ip'), throttled + 1)
+
+
+@tag('db_routers')
+@override_settings(REPLICA_STICKY_SECONDS=10)
+@patch('photo_gallery.db_routers.get_replicas', return_value=['replica'])
+class ReplicaRoutingTests(SimpleTestCase):
+    def route(self, method, url_name, cookies=None):
+        """Return the read database and response of a request handled by the middleware."""
+        request = getattr(RequestFactory(), method.lower())('/')
+        request.resolver_match = ResolverMatch(lambda r: None, (), {}, url_name=url_name)
+        request.COOKIES.update(cookies or {})
+        databases = []
+
+        def get_response(request):
+            middleware.process_view(request, None, (), {})
+            databases.append(router.db_for_read(Photo))
+            self.assertEqual(router.db_for_write(Photo), 'default')
+            return HttpResponse()
+
+        middleware = ReplicaRoutingMiddleware(get_response)
+        response = middleware(request)
+        self.assertEqual(router.db_for_read(Photo), 'default')  # Reset after the request
+        return databases[0], response
+
+    def test_replica_url_names(self, mock_get_replicas):
+        """Test that every `REPLICA_URL_NAMES` view reads from a replica and writes to the
+        primary, for every model."""
+        for url_name in REPLICA_URL_NAMES:
+            for method in ('GET', 'HEAD'):
+                with self.subTest(url_name=url_name, method=method):
+                    self.assertEqual(self.route(method, url_name)[0], 'replica')
+                    for model in apps.get_models():
+                        self.assertEqual(router.db_for_write(model), 'default')
+
+    def test_public_reads_use_replica(self, mock_get_replicas):
+        """Test that GET requests to public views read from a replica."""
+        for url_name in ['homepage', 'collection', 'search', 'photo_detail']:
+            self.assertEqual(self.route('GET', url_name)[0], 'replica')
+
+    def test_other_reads_use_primary(self, mock_get_replicas):
+        """Test that other views (e.g. the contact form) and POST requests use the primary."""
+        self.assertEqual(self.route('GET', 'contact')[0], 'default')
+        self.assertEqual(self.route('POST', 'homepage')[0], 'default')
+        self.assertEqual(router.db_for_write(Photo), 'default')
+
+    def test_sticky_after_write(self, mock_get_replicas):
+        """Test that a POST request sets a cookie which keeps reads on the primary."""
+        _, response = self.route('POST', 'contact')
+        cookie = response.cookies[STICKY_COOKIE_NAME]
+        self.assertEqual(cookie['max-age'], 10)
+        database, _ = self.route('GET', 'homepage', cookies={STICKY_COOKIE_NAME: cookie.value})
+        self.assertEqual(database, 'default')
+
+    def test_no_replicas(self, mock_get_replicas):
+        """Test that the primary is used (without cookies) if there are no replicas."""
+        mock_get_replicas.return_value = []
+        database, response = self.route('POST', 'homepage')
+        self.assertEqual(database, 'default')
+        self.assertNotIn(STICKY_COOKIE_NAME, response.cookies)
+        self.assertEqual(self.route('GET', 'homepage')[0], 'default')
+
+    @override_settings(DATABASE_REPLICAS=['default'])
+    def test_mirror_replicas_excluded(self, mock_get_replicas):
+        """Test that replicas which use the primary database (e.g. test mirrors) are ignored."""
+        self.assertEqual(get_replicas(), [])
+
+
+
+@tag('db_routers')
+@override_settings(SECURE_SSL_REDIRECT=False, SEARCH_LOG_FLUSH_INTERVAL=0)
+@patch('photo_gallery.db_routers.get_replicas', return_value=['replica'])
+class ReplicaRoutingRequestTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_search_writes_use_primary(self, mock_get_replicas):
+        """Test that the search view (which logs queries) reads from the replica and writes to
+        the primary."""
+        routes = []
+        db_for_read, db_for_write = ReplicaRouter.db_for_read, ReplicaRouter.db_for_write
+
+        def record_read(router, model, **hints):
+            routes.append(('read', model, db_for_read(router, model, **hints)))
+            return None  # Read from the primary (the test database) instead
+
+        def record_write(router, model, **hints):
+            routes.append(('write', model, db_for_write(router, model, **hints)))
+            return routes[-1][2]
+
+        with patch.object(ReplicaRouter, 'db_for_read', record_read), \
+                patch.object(ReplicaRouter, 'db_for_write', record_write):
+            self.client.get(reverse('search'), {'query': "paris"})
+
+        self.assertIn(('read', Photo, 'replica'), routes)
+        self.assertIn(('write', SearchQuery, 'default'), routes)
+        self.assertEqual({alias for action, model, alias in routes if action == 'write'},
+                         {'default'})
+        self.assertEqual(SearchQuery.objects.get().query, "paris")
+
+@tag('compression')
+@override_settings(SECURE_SSL_REDIRECT=False)
+class CompressionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_gzip(self):
+        """Test that responses are gzipped if accepted (and vary on Accept-Encoding)."""
+        response = self.client.get('/sitemap.xml', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        self.assertIn(b'<urlset', gzip.decompress(response.content))
+
+    @skipUnless(compression.brotli, "Brotli isn't installed.")
+    def test_brotli_preferred(self):
+        """Test that Brotli is used if accepted."""
+        response = self.client.get(reverse('homepage'),
+                                   headers={'Accept-Encoding': 'gzip, deflate, br'})
+        self.assertEqual(response.headers['Content-Encoding'], 'br')
+        self.assertIn(b'<html', compression.brotli.decompress(response.content))
+
+    def test_not_accepted(self):
+        """Test that responses aren't compressed if compression isn't accepted."""
+        response = self.client.get(reverse('homepage'))
+        self.assertNotIn('Content-Encoding', response.headers)
+        response = self.client.get(reverse('homepage'), headers={'Accept-Encoding': 'gzip;q=0'})
+        self.assertNotIn('Content-Encoding', response.headers)
+
+    def test_cached(self):
+        """Test that identical cacheable responses are only compressed once."""
+        with patch('photo_gallery.compression.compress', wraps=compression.compress) as compress:
+            for _ in range(2):
+                response = self.client.get('/sitemap.xml', headers={'Accept-Encoding': 'gzip'})
+                self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(compress.call_count, 1)
+
+    def test_csrf_token_responses(self):
+        """Test that responses with a CSRF token are gzipped (with random padding) but not
+        cached."""
+        with patch('photo_gallery.compression.compress') as compress:
+            response = self.client.get(reverse('contact'),
+                                       headers={'Accept-Encoding': 'gzip, br'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        compress.assert_not_called()
+        self.assertIn(b'csrfmiddlewaretoken', gzip.decompress(response.content))
+
+    def test_parse_accept_encoding(self):
+        """Test that `q=0` encodings are excluded."""
+        self.assertEqual(compression.parse_accept_encoding('gzip;q=1.0, br;q=0, *;q=0.5'),
+                         {'gzip', '*'})
+
+
+@tag('compression')
+class PrecompressedStorageTests(SimpleTestCase):
+    def test_collectstatic_precompresses(self):
+        """Test that `collectstatic` writes compressed copies of compressible files."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            source_dir = Path(tmp_dir) / 'source'
+            source_dir.mkdir()
+            (source_dir / 'app.css').write_text('.gallery { display: block; }\n' * 50)
+            (source_dir / 'tiny.js').write_text('x')
+            static_root = Path(tmp_dir) / 'static'
+            with override_settings(STATIC_ROOT=static_root, STATICFILES_DIRS=[source_dir],
+                                   INSTALLED_APPS=['django.contrib.staticfiles']):
+                call_command('collectstatic', interactive=False, verbosity=0)
+
+            css = (static_root / 'app.css').read_bytes()
+            self.assertEqual(gzip.decompress((static_root / 'app.css.gz').read_bytes()), css)
+            if compression.brotli:
+                self.assertEqual(compression.brotli.decompress(
+                    (static_root / 'app.css.br').read_bytes()), css)
+            # Compressing a 1 byte file isn't worthwhile
+            self.assertFalse((static_root / 'tiny.js.gz').exists())
+
+    @override_settings(STATIC_MANIFEST_FALLBACK=True)
+    def test_manifest_storage_without_manifest(self):
+        """Test that unhashed names are used if `collectstatic` hasn't been run (if enabled)."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            storage = PrecompressedManifestStaticFilesStorage(location=tmp_dir)
+            self.assertEqual(storage.url('css/site.min.css'), '/static/css/site.min.css')
+
+    @override_settings(STATIC_MANIFEST_FALLBACK=False)
+    def test_manifest_storage_without_manifest_error(self):
+        """Test that a missing manifest raises an error unless the fallback is enabled."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            storage = PrecompressedManifestStaticFilesStorage(location=tmp_dir)
+            with self.assertRaisesMessage(ValueError, "Missing staticfiles manifest entry"):
+                storage.url('css/site.min.css')
+
+    def test_manifest_storage_hashed_names(self):
+        """Test that `collectstatic` writes hashed names which are referenced by other files."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            source_dir = Path(tmp_dir) / 'source'
+            (source_dir / 'fonts').mkdir(parents=True)
+            (source_dir / 'fonts' / 'icons.woff2').write_bytes(b'font')
+            (source_dir / 'app.css').write_text('@font-face{src:url("fonts/icons.woff2")}\n')
+            static_root = Path(tmp_dir) / 'static'
+            backend = 'photo_gallery.storage.PrecompressedManifestStaticFilesStorage'
+            with override_settings(STATIC_ROOT=static_root, STATICFILES_DIRS=[source_dir],
+                                   INSTALLED_APPS=['django.contrib.staticfiles'],
+                                   STORAGES={'staticfiles': {'BACKEND': backend}}):
+                call_command('collectstatic', interactive=False, verbosity=0)
+                storage = PrecompressedManifestStaticFilesStorage()
+                css_name = storage.stored_name('app.css')
+                font_name = storage.stored_name('fonts/icons.woff2')
+
+            self.assertRegex(css_name, r'^app\.[0-9a-f]{12}\.css$')
+            self.assertIn(font_name, (static_root / css_name).read_text())
+
+
+@tag('assets')
+@override_settings(SECURE_SSL_REDIRECT=False)
+class AssetsTests(TestCase):
+    def test_purge_css(self):
+        """Test that rules are removed unless all of their classes are used."""
+        css = ('/*! License */.a{color:red}.b,.a .c{margin:0}p{padding:0}'
+               '.d:not(.unused){top:0}@media (min-width:1px){.c{left:0}.a:hover{right:0}}'
+               '@keyframes spin{to{rotate:1turn}}@keyframes glow{to{opacity:1}}.a{animation:spin}')
+        self.assertEqual(
+            assets.purge_css(css, {'a', 'd'}),
+            '/*! License */\n.a{color:red}\np{padding:0}\n.d:not(.unused){top:0}\n'
+            '@media (min-width:1px){.a:hover{right:0}}\n@keyframes spin{to{rotate:1turn}}\n'
+            '.a{animation:spin}')
+
+    def test_rewrite_urls(self):
+        """Test that relative URLs are resolved relative to the source stylesheet."""
+        css = 'a{src:url("fonts/x.woff2?v=1") format("woff2"),url(data:x)}'
+        self.assertEqual(assets.rewrite_urls(css, 'vendor/icons/icons.css', lambda name: name),
+                         'a{src:url("vendor/icons/fonts/x.woff2") format("woff2"),url(data:x)}')
+
+    def test_built_assets_up_to_date(self):
+        """Test that the built stylesheet and critical CSS match the templates/vendored files."""
+        self.assertIsNone(call_command('build_assets', check=True, stdout=StringIO()))
+
+    def test_base_template_assets(self):
+        """Test that the critical CSS is inlined and the vendored assets are self-hosted."""
+        response = self.client.get(reverse('contact'))
+        self.assertContains(response, '<style>')
+        self.assertContains(response, 'href="/static/css/site.min.css"', count=2)
+        self.assertContains(response, 'src="/static/vendor/bootstrap/js/bootstrap.bundle.min.js"')
+        self.assertNotContains(response, 'cdn.jsdelivr.net')
+
+
+@tag('service_worker')
+@override_settings(SECURE_SSL_REDIRECT=False, SERVICE_WORKER_ENABLED=True)
+class ServiceWorkerTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_service_worker_script(self):
+        """Test that the worker is served from the root with its configuration."""
+        response = self.client.get('/sw.js')
+        self.assertEqual(response['Content-Type'], 'text/javascript')
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        self.assertContains(response, 'staleWhileRevalidate')
+        self.assertContains(response, '"manifestUrl": "/sw-manifest.json"')
+        self.assertContains(response, '"imagePrefixes": [\n    "/media/"\n  ]')
+        # Renditions aren't versioned, so they're revalidated rather than served cache-first
+        self.assertContains(response, '"renditionPrefixes": [\n    "/img/"\n  ]')
+
+    def test_registration(self):
+        """Test that pages register the worker only if it's enabled."""
+        self.assertContains(self.client.get(reverse('contact')), 'serviceWorker.register("/sw.js")')
+        with self.settings(SERVICE_WORKER_ENABLED=False):
+            response = self.client.get(reverse('contact'))
+            self.assertNotContains(response, 'serviceWorker.register')
+            self.assertContains(self.client.get('/sw.js'), 'registration.unregister()')
+            self.assertEqual(self.client.get('/sw-manifest.json').status_code, 404)
+
+    def test_manifest_version(self):
+        """Test that the manifest version changes when a Photo is modified."""
+        Photo.objects.bulk_create([Photo(slug='photo', title='Photo', date_taken='2022-01-01')])
+        version = self.client.get('/sw-manifest.json').json()['version']
+        self.assertEqual(self.client.get('/sw-manifest.json').json()['version'], version)
+
+        # As updated by `save()` and bulk changes (the version is cached briefly)
+        Photo.objects.update(last_modified=timezone.now() + datetime.timedelta(seconds=1))
+        cache.clear()
+        self.assertNotEqual(self.client.get('/sw-manifest.json').json()['version'], version)
+
+    def test_manifest_version_collections_and_nav(self):
+        """Test that the manifest version changes when a Collection or navigation link (which
+        are displayed on cached pages) is added or modified."""
+        versions = [self.client.get('/sw-manifest.json').json()['version']]
+        collection = Collection.objects.create(name='Collection', slug='collection')
+        section = NavSection.objects.create(section_order=1)
+        link = NavLink.objects.create(link_text='Link', link_url='/link', nav_section=section)
+        for obj in (collection, link):
+            cache.clear()
+            versions.append(self.client.get('/sw-manifest.json').json()['version'])
+            obj.__class__.objects.update(
+                last_modified=timezone.now() + datetime.timedelta(seconds=1))
+
+        cache.clear()
+        versions.append(self.client.get('/sw-manifest.json').json()['version'])
+        self.assertEqual(len(set(versions)), 4)
+
+
+@tag('not_found')
+@override_settings(SECURE_SSL_REDIRECT=False)
+class NotFoundPageTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_cached_page(self):
+        """Test that the 404 page is rendered once and includes each request's escaped path."""
+        response = self.client.get('/wp-login')
+        self.assertContains(response, "requested URL (/wp-login)", status_code=404)
+
+        with patch('photo_gallery.not_found.render_to_string') as render_to_string:
+            response = self.client.get('/missing/<b>?x=1')
+        render_to_string.assert_not_called()
+        self.assertContains(response, "requested URL (/missing/%3Cb%3E?x=1)", status_code=404)
+        self.assertNotContains(response, "/wp-login", status_code=404)
+
+    def test_cached_page_navigation(self):
+        """Test that the cached page's navigation doesn't depend on the first request's path."""
+        section = NavSection.objects.create(section_order=1)
+        NavLink.objects.create(link_text='Old page', link_url='/old-page', nav_section=section)
+        for path in ['/old-page', '/other']:
+            response = self.client.get(path)
+            self.assertContains(response, 'href="/old-page"', status_code=404)
+            self.assertNotContains(response, 'aria-current="page"', status_code=404)
@@ -0,0 +1,120 @@
+import functools
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+from . import metrics
+
+
+# Token-bucket request throttling, with per-IP and global buckets stored in the cache
+# https://en.wikipedia.org/wiki/Token_bucket
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+#
+# Each bucket holds up to N tokens (the allowed burst) and is refilled at N tokens per period.
+# Each request consumes a token from both buckets, or receives a 429 response if either is empty.
+# Use a cache which is shared between processes (e.g. Redis or Memcached) in production.
+# Bucket updates aren't atomic, so concurrent requests may occasionally exceed the limits slightly.
+
+PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60}
+
+
+def parse_rate(rate):
+    """Return a (capacity, tokens per second) tuple from a rate string, e.g. '10/m'."""
+    num, period = rate.split('/')
+    return int(num), int(num) / PERIODS[period[0]]
+
+
+def get_client_ip(request):
+    """Return the client IP address (using `THROTTLE_CLIENT_IP_HEADER` if set, e.g. behind
+    a reverse proxy which sets `X-Forwarded-For`).
+
+    Each proxy appends the address it received the request from, so the address appended by the
+    first of the `THROTTLE_TRUSTED_PROXY_COUNT` proxies is read from the right. Entries to its
+    left are sent by the client, so they can't be used (otherwise any client could avoid the
+    per-IP limits by sending a different address with each request).
+    """
+    header = getattr(settings, 'THROTTLE_CLIENT_IP_HEADER', None)
+    if header and request.headers.get(header):
+        entries = [entry.strip() for entry in request.headers[header].split(',')]
+        proxy_count = max(getattr(settings, 'THROTTLE_TRUSTED_PROXY_COUNT', 1), 1)
+        return entries[max(len(entries) - proxy_count, 0)]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+class TokenBucket:
+    def __init__(self, key, rate):
+        self.key = key
+        self.capacity, self.refill_rate = parse_rate(rate)
+
+    def get_tokens(self, cache, now):
+        """Return the bucket's current (refilled) number of tokens."""
+        state = cache.get(self.key)
+        if state is None:
+            return self.capacity
+
+        tokens, updated = state
+        return min(self.capacity, tokens + (now - updated) * self.refill_rate)
+
+    def retry_after(self, tokens):
+        """Return the number of seconds until the bucket has a whole token."""
+        return max(1, math.ceil((1 - tokens) / self.refill_rate))
+
+    def save(self, cache, tokens, now):
+        # Expire once the bucket would have refilled anyway
+        timeout = math.ceil((self.capacity - tokens) / self.refill_rate) + 1
+        cache.set(self.key, (tokens, now), timeout)
+
+
+def check_throttle(request, scope):
+    """Consume a token for the request, returning None if allowed or the seconds to wait."""
+    config = getattr(settings, 'THROTTLES', {}).get(scope)
+    if not config or request.method not in config.get('methods', ['GET', 'HEAD', 'POST']):
+        return None
+
+    cache = caches[getattr(settings, 'THROTTLE_CACHE', 'default')]
+    now = time.time()
+    buckets = []
+    if config.get('per_ip'):
+        key = 'throttle:{}:ip:{}'.format(scope, get_client_ip(request))
+        buckets.append(('ip', TokenBucket(key, config['per_ip'])))
+    if config.get('global'):
+        buckets.append(('global', TokenBucket('throttle:{}:global'.format(scope),
+                                              config['global'])))
+
+    tokens = {}
+    for name, bucket in buckets:
+        tokens[name] = bucket.get_tokens(cache, now)
+        if tokens[name] < 1:
+            metrics.THROTTLE_REQUESTS.inc(scope=scope, result='throttled_' + name)
+            return bucket.retry_after(tokens[name])
+
+    for name, bucket in buckets:
+        bucket.save(cache, tokens[name] - 1, now)
+
+    metrics.THROTTLE_REQUESTS.inc(scope=scope, result='allowed')
+    return None
+
+
+def throttle(scope):
+    """View decorator which returns a 429 response if the `THROTTLES[scope]` limits are exceeded.
+
+    The check happens before the view is called, so throttled requests are cheap.
+    """
+    def decorator(view_func):
+        @functools.wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            retry_after = check_throttle(request, scope)
+            if retry_after is not None:
+                response = HttpResponse("Too many requests; please try again later.",
+                                        status=429, content_type='text/plain')
+                response.headers['Retry-After'] = str(retry_after)
+                return response
+
+            return view_func(request, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
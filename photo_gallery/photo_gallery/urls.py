@@ -21,23 +21,31 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.contrib.sitemaps.views import sitemap
 from django.urls import path
-from django.views.defaults import page_not_found
 from django.views.generic import TemplateView
 
+from .metrics import metrics_view
+from .not_found import page_not_found
+from .service_worker import service_worker, service_worker_manifest
 from .sitemap_config import CollectionSitemap, PhotoSitemap, StaticViewSitemap
 from contact.views import ContactMessageCreateView, ContactSuccessView
-from photos.views import CollectionView, PhotoDetailView, PhotoListView, SearchView
+from photos.views import (ArchiveView, CollectionView, photo_map_markers, PhotoDetailView,
+                          PhotoListView, resized_image, SearchView)
 
 
 load_dotenv()  # Load variables from .env in the project root dir
 
 def custom_404_template(request):
-    return page_not_found(request, None)
+    return page_not_found(request)
+
+
+handler404 = page_not_found
 
 
 urlpatterns = [
     path('', PhotoListView.as_view(), name='homepage'),
     path('robots.txt', TemplateView.as_view(template_name='robots.txt', content_type='text/plain')),
+    path('sw.js', service_worker, name='service_worker'),
+    path('sw-manifest.json', service_worker_manifest, name='service_worker_manifest'),
     path('sitemap.xml', sitemap, {'sitemaps': {'static': StaticViewSitemap,
                                                'collections': CollectionSitemap,
                                                'photos': PhotoSitemap}},
@@ -46,8 +54,13 @@ urlpatterns = [
     path('contact', ContactMessageCreateView.as_view(), name='contact'),
     path('contact-success', ContactSuccessView.as_view(), name='contact_success'),
     path('search', SearchView.as_view(), name='search'),
+    path('archive/<int:year>', ArchiveView.as_view(), name='archive_year'),
+    path('archive/<int:year>/<int:month>', ArchiveView.as_view(), name='archive_month'),
     path('photos/<slug:slug>', PhotoDetailView.as_view(), name='photo_detail'),
+    path('img/<slug:slug>/<int:width>.<str:extension>', resized_image, name='resized_image'),
+    path('map/markers.json', photo_map_markers, name='photo_map_markers'),
     path('404', custom_404_template),
+    path('metrics', metrics_view, name='metrics'),
     path('<slug:collection_slug>', CollectionView.as_view(), name='collection'),
     path(os.environ.get('GSC_FILENAME'), TemplateView.as_view(
         template_name='gsc_verification',
@@ -1,34 +1,135 @@
 import copy
-from django.contrib import admin
-from .models import Collection, Country, Photo
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
+from .bulk import bulk_add_to_collection, bulk_remove_from_collection, bulk_update_photos
+from .models import Collection, Country, Photo, SearchQuery
+
+
+def estimate_row_count(model, using='default'):
+    """Return the database's estimate of the number of rows in a model's table (or None).
+
+    The estimate is retrieved from table statistics (PostgreSQL/MySQL) or the largest rowid
+    (SQLite), which avoids the full scan required by an exact `COUNT(*)`.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    if connection.vendor == 'postgresql':
+        sql, params = "SELECT reltuples::bigint FROM pg_class WHERE relname = %s", [table]
+    elif connection.vendor == 'mysql':
+        sql = "SELECT table_rows FROM information_schema.tables " \
+              "WHERE table_schema = DATABASE() AND table_name = %s"
+        params = [table]
+    elif connection.vendor == 'sqlite':
+        # Ignores deleted rows, but only requires a primary key index lookup
+        sql, params = "SELECT MAX(rowid) FROM {}".format(connection.ops.quote_name(table)), []
+    else:
+        return None
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        row = cursor.fetchone()
+
+    # PostgreSQL returns -1 for tables which haven't been analysed yet
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator which uses an estimated count for large, unfiltered querysets.
+    https://docs.djangoproject.com/en/5.2/ref/contrib/admin/#django.contrib.admin.ModelAdmin.paginator
+    """
+    # Exact counts are used below this (estimated) number of rows
+    estimate_threshold = 10000
+
+    @cached_property
+    def count(self):
+        qs = self.object_list
+        if isinstance(qs, QuerySet) and not qs.query.where:
+            estimate = estimate_row_count(qs.model, qs.db)
+            if estimate is not None and estimate >= self.estimate_threshold:
+                return estimate
+
+        return super().count
+
+
+class AutocompleteListFilter(admin.RelatedFieldListFilter):
+    """Related field filter which uses an autocomplete widget instead of listing every object.
+
+    Only the selected object (if any) is retrieved; other options are retrieved on demand via
+    the admin autocomplete view (the related model admin must define `search_fields`).
+    """
+    template = 'admin/photos/autocomplete_filter.html'
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        super().__init__(field, request, params, model, model_admin, field_path)
+        self.widget = AutocompleteSelect(field, model_admin.admin_site)
+        self.widget.choices = forms.ModelChoiceField(field.related_model.objects.all()).choices
+
+    def field_choices(self, field, request, model_admin):
+        if not self.lookup_val:
+            return []
+
+        objs = field.related_model.objects.filter(pk__in=self.lookup_val)
+        return [(obj.pk, str(obj)) for obj in objs]
+
+    def has_output(self):
+        return True
+
+    def widget_html(self):
+        value = self.lookup_val[-1] if self.lookup_val else None
+        return self.widget.render(self.lookup_kwarg, value)
+
+    @staticmethod
+    def get_media(field, admin_site):
+        """Return the widget (Select2) and filter JS/CSS to include in the changelist media."""
+        return AutocompleteSelect(field, admin_site).media + \
+               forms.Media(js=['photos/admin/autocomplete_filter.js'])
+
+
+class PhotoActionForm(ActionForm):
+    """Changelist action form with a Collection field for the collection actions.
+    https://docs.djangoproject.com/en/5.2/ref/contrib/admin/#django.contrib.admin.ModelAdmin.action_form
+    """
+    collection = forms.ModelChoiceField(
+        Collection.objects.all(), required=False,
+        widget=AutocompleteSelect(Photo._meta.get_field('collections'), admin.site),
+        help_text="Required for the collection actions.")
 
 
 class CollectionAdmin(admin.ModelAdmin):
-    fields = ['name', 'description', 'slug', 'photo_count', 'published']
-    readonly_fields = ['photo_count']
-    list_display = ('name', 'slug', 'photo_count', 'published')
+    fields = ['name', 'description', 'slug', 'photo_count', 'published_photo_count', 'published']
+    # Photo counters are maintained via signals (see `signals.py`)
+    readonly_fields = ['photo_count', 'published_photo_count']
+    list_display = ('name', 'slug', 'photo_count', 'published_photo_count', 'published')
 
     # Generate a suggested slug from the name in the "add" form
     prepopulated_fields = {"slug": ("name",)}
 
-    def photo_count(self, obj):
-        """Return the number of `Photo` objects associated with each `Collection`."""
-        return Photo.objects.filter(collections__in=[obj]).count()
+    # Required by the autocomplete widgets/filters in PhotoAdmin
+    search_fields = ['name']
 
 
 class CountryAdmin(admin.ModelAdmin):
-    fields = ['name', 'photo_count']
-    readonly_fields = ['photo_count']
-    list_display = ('name', 'photo_count')
+    fields = ['name', 'photo_count', 'published_photo_count']
+    # Photo counters are maintained via signals (see `signals.py`)
+    readonly_fields = ['photo_count', 'published_photo_count']
+    list_display = ('name', 'photo_count', 'published_photo_count')
 
-    def photo_count(self, obj):
-        """Return the number of `Photo` objects associated with each `Country`."""
-        return Photo.objects.filter(country=obj, country__isnull=False).count()
+    # Required by the autocomplete widgets/filters in PhotoAdmin
+    search_fields = ['name']
 
 
 class PhotoAdmin(admin.ModelAdmin):
     fields = ['large_image', 'thumbnail_img_tag', 'title', 'slug', 'description', 'location',
-              'country', 'date_taken', 'collections', 'featured', 'published']
+              'country', 'latitude', 'longitude', 'date_taken', 'collections', 'featured',
+              'published']
 
     # Generate a suggested slug from the title in the "add" form
     prepopulated_fields = {"slug": ("title",)}
@@ -39,12 +140,76 @@ class PhotoAdmin(admin.ModelAdmin):
     # Use JS filter interface for selecting collections
     filter_horizontal = ('collections',)
 
-    list_display = ('title', 'thumbnail_img_tag', 'slug', 'published')
+    # Use an autocomplete (search) widget rather than a dropdown of every country
+    autocomplete_fields = ['country']
+
+    # `thumbnail_img_tag` uses the stored `Photo.thumbnail_url` (lazily loaded)
+    list_display = ('title', 'thumbnail_img_tag', 'slug', 'country', 'published')
     list_display_links = ('title', 'thumbnail_img_tag')
-    list_filter = ['date_taken', 'featured', 'collections', 'country']
+    list_select_related = ['country']
+    list_filter = ['date_taken', 'featured',
+                   ('collections', AutocompleteListFilter),
+                   ('country', AutocompleteListFilter)]
     search_fields = ['title', 'description', 'location']
     search_help_text = "Search photo titles, descriptions, and locations."
 
+    # Avoid exact `COUNT(*)` queries on large (unfiltered) changelists
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    # Set-based actions (see `bulk.py`)
+    action_form = PhotoActionForm
+    actions = ['publish', 'unpublish', 'feature', 'unfeature',
+               'add_to_collection', 'remove_from_collection']
+
+    @property
+    def media(self):
+        country_field = Photo._meta.get_field('country')
+        return super().media + AutocompleteListFilter.get_media(country_field, self.admin_site)
+
+    def _update_action(self, request, queryset, message, **values):
+        photo_pks = list(queryset.values_list('pk', flat=True))
+        updated = bulk_update_photos(photo_pks, **values)
+        self.message_user(request, "{} photo(s) {}.".format(updated, message), messages.SUCCESS)
+
+    @admin.action(description="Publish selected photos")
+    def publish(self, request, queryset):
+        self._update_action(request, queryset, "published", published=True)
+
+    @admin.action(description="Unpublish selected photos")
+    def unpublish(self, request, queryset):
+        self._update_action(request, queryset, "unpublished", published=False)
+
+    @admin.action(description="Feature selected photos")
+    def feature(self, request, queryset):
+        self._update_action(request, queryset, "featured", featured=True)
+
+    @admin.action(description="Unfeature selected photos")
+    def unfeature(self, request, queryset):
+        self._update_action(request, queryset, "unfeatured", featured=False)
+
+    def _collection_action(self, request, queryset, bulk_func, message):
+        form = self.action_form(request.POST)
+        form.fields['action'].choices = self.get_action_choices(request)
+        collection = form.cleaned_data['collection'] if form.is_valid() else None
+        if collection is None:
+            self.message_user(request, "Select a collection to apply this action.",
+                              messages.WARNING)
+            return
+
+        photo_pks = list(queryset.values_list('pk', flat=True))
+        bulk_func(photo_pks, collection)
+        self.message_user(request, "{} photo(s) {} '{}'.".format(len(photo_pks), message,
+                                                                 collection), messages.SUCCESS)
+
+    @admin.action(description="Add selected photos to collection")
+    def add_to_collection(self, request, queryset):
+        self._collection_action(request, queryset, bulk_add_to_collection, "added to")
+
+    @admin.action(description="Remove selected photos from collection")
+    def remove_from_collection(self, request, queryset):
+        self._collection_action(request, queryset, bulk_remove_from_collection, "removed from")
+
     def get_fields(self, request, obj=None):
         """Return a list of fields (str) for the Photo add form (obj=None) or change form.
         https://docs.djangoproject.com/en/5.2/ref/contrib/admin/#django.contrib.admin.ModelAdmin.get_fields
@@ -59,6 +224,20 @@ class PhotoAdmin(admin.ModelAdmin):
         return super().get_fields(request, obj)
 
 
+class SearchQueryAdmin(admin.ModelAdmin):
+    """A read-only log of (normalised) search queries, most frequent first (see `search.py`)."""
+    list_display = ('query', 'count', 'last_searched')
+    ordering = ['-count']
+    search_fields = ['query']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 admin.site.register(Collection, CollectionAdmin)
 admin.site.register(Country, CountryAdmin)
 admin.site.register(Photo, PhotoAdmin)
+admin.site.register(SearchQuery, SearchQueryAdmin)
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class PhotosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'photos'
+
+    def ready(self):
+        # Connect signal receivers
+        # https://docs.djangoproject.com/en/5.2/topics/signals/#connecting-receiver-functions
+        from . import signals  # noqa: F401
@@ -0,0 +1,418 @@
+import hashlib
+import io
+import json
+import shutil
+import tarfile
+import tempfile
+import time
+from pathlib import Path
+
+from django.core.files import File
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, router, transaction
+
+from nav.models import NavLink, NavSection
+from .cachefiles import get_stored_url
+from .collection_slugs import invalidate_slugs
+from .counters import recount, recount_months
+from .geo import get_geohash
+from .models import Collection, Country, Photo, PhotoFeatures
+from .search import invalidate_results
+from .shuffle import create_shuffle_ranks
+from .similarity import get_packed_vector
+
+
+# A portable gallery archive (used by `manage.py export_gallery` and `manage.py import_gallery`)
+# https://docs.python.org/3/library/tarfile.html
+#
+# The archive is a (gzipped) tar file which is written and read as a stream, containing:
+# - manifest.json: the archive format and version
+# - data/<name>.jsonl: one JSON object per line for each object, referencing related objects
+#   via natural keys (Country name, Collection slug, and NavSection order)
+# - images/<storage name>: each (distinct) Photo image file
+# - data/photos.jsonl: the Photos (last, since each line includes its image's SHA-256 hash)
+
+ARCHIVE_FORMAT = 'photo_gallery'
+ARCHIVE_VERSION = 1
+CHUNK_SIZE = 1024 * 1024
+SPOOL_SIZE = 10 * 1024 * 1024  # Bytes of JSONL data held in memory before spooling to disk
+
+
+class ArchiveError(Exception):
+    pass
+
+
+class HashingReader:
+    """Wrap a file object, calculating the SHA-256 hash of the data read."""
+    def __init__(self, file):
+        self.file = file
+        self.hash = hashlib.sha256()
+
+    def read(self, size=-1):
+        data = self.file.read(size)
+        self.hash.update(data)
+        return data
+
+
+def file_sha256(file):
+    """Return the SHA-256 hex digest of a file object's (remaining) content."""
+    file_hash = hashlib.sha256()
+    for chunk in iter(lambda: file.read(CHUNK_SIZE), b''):
+        file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+def _add_bytes(tar, name, data):
+    info = tarfile.TarInfo(name)
+    info.size, info.mtime = len(data), time.time()
+    tar.addfile(info, io.BytesIO(data))
+
+
+def _add_jsonl(tar, name, rows):
+    """Add a JSONL member from an iterable of dicts (spooled to disk if large)."""
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE) as file:
+        for row in rows:
+            file.write(json.dumps(row, cls=DjangoJSONEncoder).encode() + b'\n')
+
+        info = tarfile.TarInfo('data/{}.jsonl'.format(name))
+        info.size, info.mtime = file.tell(), time.time()
+        file.seek(0)
+        tar.addfile(info, file)
+
+
+def export_gallery(fileobj, batch_size=1000):
+    """Write a gallery archive to a (writable, binary) file object.
+
+    Returns a dict of the number of objects exported by type.
+    """
+    counts = {}
+
+    def counted(name, rows):
+        counts[name] = 0
+        for row in rows:
+            counts[name] += 1
+            yield row
+
+    with tarfile.open(fileobj=fileobj, mode='w|gz') as tar:
+        manifest = {'format': ARCHIVE_FORMAT, 'version': ARCHIVE_VERSION}
+        _add_bytes(tar, 'manifest.json', json.dumps(manifest).encode())
+
+        _add_jsonl(tar, 'countries', counted('countries', (
+            {'name': c.name} for c in Country.objects.order_by('pk').iterator(batch_size))))
+        _add_jsonl(tar, 'collections', counted('collections', (
+            {'name': c.name, 'slug': c.slug, 'description': c.description,
+             'published': c.published}
+            for c in Collection.objects.order_by('pk').iterator(batch_size))))
+        _add_jsonl(tar, 'nav_sections', counted('nav_sections', (
+            {'section_order': s.section_order, 'dropdown_label': s.dropdown_label}
+            for s in NavSection.objects.order_by('pk').iterator(batch_size))))
+        _add_jsonl(tar, 'nav_links', counted('nav_links', (
+            {'link_text': link.link_text, 'link_url': link.link_url,
+             'vertical_order': link.vertical_order,
+             'nav_section': link.nav_section.section_order if link.nav_section else None}
+            for link in NavLink.objects.select_related('nav_section').order_by('pk')
+                                       .iterator(batch_size))))
+
+        image_hashes = {}  # Storage name: SHA-256 hash
+        storage = Photo._meta.get_field('large_image').storage
+
+        def photo_rows():
+            photos = Photo.objects.select_related('country').order_by('pk')
+            for photo in photos.iterator(batch_size):
+                name = photo.large_image.name
+                if name not in image_hashes:
+                    info = tarfile.TarInfo('images/' + name)
+                    info.size, info.mtime = storage.size(name), time.time()
+                    with storage.open(name, 'rb') as image_file:
+                        reader = HashingReader(image_file)
+                        tar.addfile(info, reader)
+                    image_hashes[name] = reader.hash.hexdigest()
+
+                yield {
+                    'title': photo.title,
+                    'slug': photo.slug,
+                    'description': photo.description,
+                    'location': photo.location,
+                    'country': photo.country.name if photo.country else None,
+                    'latitude': photo.latitude,
+                    'longitude': photo.longitude,
+                    'date_taken': photo.date_taken,
+                    'featured': photo.featured,
+                    'published': photo.published,
+                    'collections': [],
+                    'image': name,
+                    'image_sha256': image_hashes[name],
+                }
+
+        def with_collections(rows, batch):
+            """Add the collection slugs to each row using one query per batch."""
+            pending = []
+            for row in rows:
+                pending.append(row)
+                if len(pending) == batch:
+                    yield from _add_collection_slugs(pending)
+                    pending = []
+            yield from _add_collection_slugs(pending)
+
+        _add_jsonl(tar, 'photos', counted('photos', with_collections(photo_rows(), batch_size)))
+        counts['images'] = len(image_hashes)
+
+    return counts
+
+
+def _add_collection_slugs(rows):
+    memberships = Photo.collections.through.objects \
+                                   .filter(photo__slug__in=[row['slug'] for row in rows]) \
+                                   .values_list('photo__slug', 'collection__slug')
+    slugs = {}
+    for photo_slug, collection_slug in memberships:
+        slugs.setdefault(photo_slug, []).append(collection_slug)
+
+    for row in rows:
+        row['collections'] = sorted(slugs.get(row['slug'], []))
+    return rows
+
+
+def _read_jsonl(file):
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+def _batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _upsert(model, objs, unique_field, update_fields):
+    """Create objects, or update the existing objects with the same `unique_field` values.
+
+    Uses a single `INSERT ... ON CONFLICT` query if the database supports it (e.g. PostgreSQL
+    and SQLite); otherwise (e.g. MySQL and MariaDB) the existing objects are looked up and
+    updated via `bulk_update()`, and the others are created.
+    """
+    connection = connections[router.db_for_write(model)]
+    if connection.features.supports_update_conflicts_with_target:
+        model.objects.bulk_create(objs, update_conflicts=True, unique_fields=[unique_field],
+                                  update_fields=update_fields)
+        return
+
+    values = [getattr(obj, unique_field) for obj in objs]
+    existing = dict(model.objects.filter(**{unique_field + '__in': values})
+                                 .values_list(unique_field, 'pk'))
+    for obj in objs:
+        obj.pk = existing.get(getattr(obj, unique_field))
+        for field in model._meta.concrete_fields:
+            if getattr(field, 'auto_now', False):  # Not set by `bulk_update()`
+                field.pre_save(obj, add=obj.pk is None)
+
+    model.objects.bulk_update([obj for obj in objs if obj.pk is not None], update_fields)
+    model.objects.bulk_create([obj for obj in objs if obj.pk is None])
+
+
+class GalleryImporter:
+    """Import a gallery archive from a (readable, binary) file object.
+
+    Objects are matched with existing objects via their natural keys and created or updated
+    in batches (see `_upsert()`). Image files are only saved (and their renditions
+    generated) if an image with the same content doesn't already exist. Since `bulk_create()`
+    doesn't send signals, the feature vectors of Photos with new images are computed here
+    (once per image).
+    https://docs.djangoproject.com/en/5.2/ref/models/querysets/#bulk-create
+    """
+    def __init__(self, batch_size=1000):
+        self.batch_size = batch_size
+        self.counts = {}
+        self.storage = Photo._meta.get_field('large_image').storage
+        self.temp_dir = None
+        self.archive_images = {}  # Archive image name: temporary file path
+        self.saved_images = {}  # (Archive image name, SHA-256 hash): (storage name, thumbnail URL)
+        self.storage_hashes = {}  # Storage name: SHA-256 hash
+        self.image_vectors = {}  # Storage name: packed feature vector (or None if it failed)
+        self.cleared_sections = set()  # NavSection primary keys
+
+    def run(self, fileobj):
+        self.temp_dir = Path(tempfile.mkdtemp())
+        try:
+            with tarfile.open(fileobj=fileobj, mode='r|*') as tar, transaction.atomic():
+                for member in tar:
+                    if member.isfile():
+                        self.import_member(member, tar.extractfile(member))
+
+                if 'manifest' not in self.counts:
+                    raise ArchiveError("The archive doesn't contain a manifest.json file.")
+
+                recount(Collection)
+                recount(Country)
+                recount_months()
+                create_shuffle_ranks()
+                invalidate_results()
+                invalidate_slugs()
+        finally:
+            shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+        self.counts.pop('manifest')
+        return self.counts
+
+    def import_member(self, member, file):
+        if member.name == 'manifest.json':
+            manifest = json.load(file)
+            if manifest.get('format') != ARCHIVE_FORMAT or \
+                    manifest.get('version') != ARCHIVE_VERSION:
+                raise ArchiveError("Unsupported archive format: {}.".format(manifest))
+            self.counts['manifest'] = 1
+        elif 'manifest' not in self.counts:
+            raise ArchiveError("The archive doesn't start with a manifest.json file.")
+        elif member.name.startswith('images/'):
+            self.store_archive_image(member.name[len('images/'):], file)
+        elif member.name.startswith('data/') and member.name.endswith('.jsonl'):
+            name = member.name[len('data/'):-len('.jsonl')]
+            import_rows = getattr(self, 'import_' + name, None)
+            if import_rows is None:
+                raise ArchiveError("Unexpected archive file: {}.".format(member.name))
+
+            self.counts[name] = 0
+            for rows in _batches(_read_jsonl(file), self.batch_size):
+                import_rows(rows)
+                self.counts[name] += len(rows)
+
+    def store_archive_image(self, name, file):
+        """Copy an image to the temporary directory, until it's referenced by a Photo."""
+        path = self.temp_dir / str(len(self.archive_images))
+        with open(path, 'wb') as temp_file:
+            shutil.copyfileobj(file, temp_file, CHUNK_SIZE)
+        self.archive_images[name] = path
+
+    def import_countries(self, rows):
+        Country.objects.bulk_create([Country(**row) for row in rows], ignore_conflicts=True)
+
+    def import_collections(self, rows):
+        _upsert(Collection, [Collection(**row) for row in rows], 'slug',
+                ['name', 'description', 'published', 'last_modified'])
+
+    def import_nav_sections(self, rows):
+        _upsert(NavSection, [NavSection(**row) for row in rows], 'section_order',
+                ['dropdown_label', 'last_modified'])
+
+    def import_nav_links(self, rows):
+        """Replace the links of the imported NavSections (links don't have a natural key)."""
+        orders = {row['nav_section'] for row in rows}
+        sections = dict(NavSection.objects.filter(section_order__in=orders)
+                                          .values_list('section_order', 'pk'))
+        uncleared = set(sections.values()) - self.cleared_sections
+        NavLink.objects.filter(nav_section__in=uncleared).delete()
+        self.cleared_sections.update(uncleared)
+
+        NavLink.objects.bulk_create([
+            NavLink(link_text=row['link_text'], link_url=row['link_url'],
+                    vertical_order=row['vertical_order'],
+                    nav_section_id=sections.get(row['nav_section']))
+            for row in rows
+        ])
+
+    def import_photos(self, rows):
+        countries = dict(Country.objects.filter(name__in={row['country'] for row in rows})
+                                        .values_list('name', 'pk'))
+        existing = {p.slug: p for p in Photo.objects.filter(slug__in=[row['slug'] for row in rows])
+                                                    .only('slug', 'large_image', 'thumbnail_url')}
+        photos = []
+        for row in rows:
+            image_name, thumbnail_url = self.get_image(row, existing.get(row['slug']))
+            photos.append(Photo(
+                large_image=image_name, thumbnail_url=thumbnail_url, title=row['title'],
+                slug=row['slug'], description=row['description'], location=row['location'],
+                country_id=countries.get(row['country']), date_taken=row['date_taken'],
+                featured=row['featured'], published=row['published'],
+                latitude=row.get('latitude'), longitude=row.get('longitude'),
+                geohash=get_geohash(row.get('latitude'), row.get('longitude')),
+            ))
+
+        fields = ['large_image', 'thumbnail_url', 'title', 'description', 'location', 'country',
+                  'latitude', 'longitude', 'geohash', 'date_taken', 'featured', 'published',
+                  'last_modified']
+        _upsert(Photo, photos, 'slug', fields)
+
+        # Replace the Collection memberships of the imported Photos
+        photo_pks = dict(Photo.objects.filter(slug__in=[row['slug'] for row in rows])
+                                      .values_list('slug', 'pk'))
+        collection_slugs = {slug for row in rows for slug in row['collections']}
+        collections = dict(Collection.objects.filter(slug__in=collection_slugs)
+                                             .values_list('slug', 'pk'))
+        Membership = Photo.collections.through
+        Membership.objects.filter(photo_id__in=photo_pks.values()).delete()
+        Membership.objects.bulk_create([
+            Membership(photo_id=photo_pks[row['slug']], collection_id=collections[slug])
+            for row in rows
+            for slug in row['collections'] if slug in collections
+        ])
+
+        self.update_features(photos, photo_pks, existing)
+
+    def update_features(self, photos, photo_pks, existing):
+        """Store the feature vectors of imported Photos whose image is new or changed."""
+        with_features = set(PhotoFeatures.objects.filter(photo_id__in=photo_pks.values())
+                                                 .values_list('photo_id', flat=True))
+        changed = [photo for photo in photos
+                   if photo_pks[photo.slug] not in with_features or photo.slug not in existing
+                   or existing[photo.slug].large_image.name != photo.large_image.name]
+        for photo in changed:
+            if photo.large_image.name not in self.image_vectors:
+                self.image_vectors[photo.large_image.name] = get_packed_vector(
+                    Photo(large_image=photo.large_image.name))
+
+        PhotoFeatures.objects.filter(photo_id__in=[photo_pks[p.slug] for p in changed]).delete()
+        PhotoFeatures.objects.bulk_create([
+            PhotoFeatures(photo_id=photo_pks[photo.slug],
+                          vector=self.image_vectors[photo.large_image.name])
+            for photo in changed if self.image_vectors[photo.large_image.name] is not None
+        ])
+
+    def get_storage_hash(self, name):
+        if name not in self.storage_hashes:
+            try:
+                with self.storage.open(name, 'rb') as file:
+                    self.storage_hashes[name] = file_sha256(file)
+            except (FileNotFoundError, OSError):
+                self.storage_hashes[name] = None
+        return self.storage_hashes[name]
+
+    def get_image(self, row, existing_photo):
+        """Return the (storage name, thumbnail URL) of a Photo row's image.
+
+        Existing files with the same content (e.g. the Photo's current image) are reused;
+        otherwise the archive image is saved and its renditions are generated.
+        """
+        key = (row['image'], row['image_sha256'])
+        if key in self.saved_images:
+            return self.saved_images[key]
+
+        if existing_photo and existing_photo.large_image.name and \
+                self.get_storage_hash(existing_photo.large_image.name) == row['image_sha256']:
+            result = (existing_photo.large_image.name, existing_photo.thumbnail_url)
+        elif self.get_storage_hash(row['image']) == row['image_sha256']:
+            result = (row['image'], '')
+        elif row['image'] in self.archive_images:
+            with open(self.archive_images[row['image']], 'rb') as file:
+                if file_sha256(file) != row['image_sha256']:
+                    raise ArchiveError("The image hash of '{}' doesn't match.".format(row['slug']))
+                file.seek(0)
+                name = self.storage.save(row['image'], File(file))
+            result = (name, '')
+            self.counts['images'] = self.counts.get('images', 0) + 1
+        else:
+            raise ArchiveError("The image of '{}' isn't in the archive.".format(row['slug']))
+
+        if not result[1]:
+            # Generate the renditions (which may already exist for reused files)
+            photo = Photo(large_image=result[0])
+            photo.small_image.generate()
+            result = (result[0], get_stored_url(photo.thumbnail))
+
+        self.saved_images[key] = result
+        return result
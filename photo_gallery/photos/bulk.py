@@ -0,0 +1,49 @@
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Photo
+from .signals import photos_bulk_changed
+
+
+# Set-based Photo changes (e.g. used by PhotoAdmin actions), which avoid loading and saving
+# each Photo; `last_modified` is updated explicitly since `auto_now` only applies on `save()`
+# https://docs.djangoproject.com/en/5.2/ref/models/querysets/#update
+
+
+def bulk_update_photos(photo_pks, **values):
+    """Update the field values of the specified Photos using a single UPDATE query.
+
+    Returns the number of Photos updated.
+    """
+    with transaction.atomic():
+        updated = Photo.objects.filter(pk__in=photo_pks) \
+                               .update(last_modified=timezone.now(), **values)
+        photos_bulk_changed.send(sender=Photo, photo_pks=photo_pks, fields=set(values))
+
+    return updated
+
+
+def bulk_add_to_collection(photo_pks, collection):
+    """Add the specified Photos to a Collection using a single (bulk) INSERT query.
+
+    Photos which are already in the Collection are ignored.
+    """
+    Membership = Photo.collections.through
+    memberships = [Membership(photo_id=pk, collection_id=collection.pk) for pk in photo_pks]
+    with transaction.atomic():
+        Membership.objects.bulk_create(memberships, ignore_conflicts=True)
+        _touch_and_notify(photo_pks, collection)
+
+
+def bulk_remove_from_collection(photo_pks, collection):
+    """Remove the specified Photos from a Collection using a single DELETE query."""
+    Membership = Photo.collections.through
+    with transaction.atomic():
+        Membership.objects.filter(collection_id=collection.pk, photo_id__in=photo_pks).delete()
+        _touch_and_notify(photo_pks, collection)
+
+
+def _touch_and_notify(photo_pks, collection):
+    Photo.objects.filter(pk__in=photo_pks).update(last_modified=timezone.now())
+    photos_bulk_changed.send(sender=Photo, photo_pks=photo_pks, fields={'collections'},
+                             collection_pks=[collection.pk])
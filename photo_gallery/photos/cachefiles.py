@@ -0,0 +1,102 @@
+import contextvars
+import time
+
+from django.conf import settings
+from imagekit.cachefiles.backends import CacheFileState, Simple
+
+from photo_gallery import metrics
+from photo_gallery.instrumentation import timed
+from .locks import file_lock, get_lock_path, LockTimeout
+
+# Number of renditions which used their source image (in the current thread/context), so that
+# output containing the source URL isn't cached or stored (see `InstrumentedBackend.use_source()`)
+_source_fallbacks = contextvars.ContextVar('rendition_source_fallbacks', default=0)
+
+
+class InstrumentedBackend(Simple):
+    """Image cache file backend which records rendition existence checks and generation.
+
+    Accessing an `ImageSpecField` URL (e.g. `photo.small_image.url`) calls `generate()`,
+    which checks whether the file exists (via the cache or storage) and generates it if not.
+    https://django-imagekit.readthedocs.io/en/latest/caching.html
+
+    Generation holds a cross-process file lock (in `RENDITION_LOCK_DIR`), so when several
+    workers need the same new rendition at once (e.g. after a photo is published), only the
+    first generates it. The others wait for up to `RENDITION_LOCK_TIMEOUT` seconds; if it still
+    isn't ready, they return without generating it, using the source image instead (rather than
+    the URL of a file which doesn't exist yet). Contention is recorded by the
+    `gallery_rendition_lock_contention_total` metric.
+
+    Output containing the source image's URL mustn't be kept, since the rendition is used once
+    it's generated: `get_stored_url()` returns an empty URL, and the `rendition_cache` template
+    tag doesn't cache the fragment.
+    """
+    def generate(self, file, force=False):
+        with timed('imagekit'):
+            super().generate(file, force=force)
+
+    def generate_now(self, file, force=False):
+        if not force and self.get_state(file) == CacheFileState.EXISTS:
+            return
+
+        lock_path = get_lock_path(settings.RENDITION_LOCK_DIR, file.name)
+        try:
+            with file_lock(lock_path, timeout=0):
+                self.generate_locked(file, force=force)
+            return
+        except LockTimeout:
+            pass  # Another worker is generating this rendition (or one with the same lock)
+
+        start = time.perf_counter()
+        try:
+            with timed('rendition_lock_wait'), \
+                    file_lock(lock_path, timeout=getattr(settings, 'RENDITION_LOCK_TIMEOUT', 10)):
+                metrics.RENDITION_LOCK_WAIT.observe(time.perf_counter() - start)
+                generated = self.generate_locked(file, force=force)
+        except LockTimeout:
+            metrics.RENDITION_LOCK_WAIT.observe(time.perf_counter() - start)
+            metrics.RENDITION_LOCK_CONTENTION.inc(result='timeout')
+            self.use_source(file)
+            return
+
+        metrics.RENDITION_LOCK_CONTENTION.inc(result='generated' if generated else 'waited')
+
+    @staticmethod
+    def use_source(file):
+        """Point the cache file at its source image (e.g. so `file.url` is the source's URL).
+
+        A new cache file is created each time an `ImageSpecField` is accessed, so other accesses
+        use the rendition once it's generated. The fallback is recorded (as `file.uses_source`
+        and by `get_source_fallback_count()`) so that its URL isn't cached or stored.
+        """
+        source = file.generator.source
+        file.name, file.storage = source.name, source.storage
+        file.uses_source = True
+        _source_fallbacks.set(_source_fallbacks.get() + 1)
+
+    def generate_locked(self, file, force=False):
+        """Generate the file (while holding its lock); return False if it already exists."""
+        # Check the storage (not the cached state), since another worker may have just finished
+        if not force and self._exists(file):
+            self.set_state(file, CacheFileState.EXISTS)
+            return False
+
+        start = time.perf_counter()
+        with timed('rendition_generation'):
+            super().generate_now(file, force=True)
+
+        metrics.RENDITION_GENERATIONS.inc()
+        metrics.RENDITION_DURATION.observe(time.perf_counter() - start)
+        return True
+
+
+def get_source_fallback_count():
+    """Return the number of renditions which have used their source image (in this context)."""
+    return _source_fallbacks.get()
+
+
+def get_stored_url(file):
+    """Return the URL of an `ImageSpecField` file to store, or '' if its rendition wasn't ready
+    (so the source image's URL isn't stored in its place)."""
+    url = file.url
+    return '' if getattr(file, 'uses_source', False) else url
@@ -0,0 +1,49 @@
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Collection
+
+
+# An in-memory set of published Collection slugs, used to reject unknown paths matched by the
+# catch-all collection URL pattern (e.g. bots requesting `/wp-login`) without querying the database
+#
+# Each process loads the set once per version; the version (stored in the cache) changes whenever
+# a Collection is changed (see `signals.py`), so every process reloads the set on its next lookup.
+# Use a shared cache with multiple processes (otherwise other processes' sets aren't reloaded).
+
+VERSION_KEY = 'published_collection_slugs_version'
+
+_slugs = {'version': None, 'slugs': frozenset()}
+_slugs_lock = threading.Lock()
+
+
+def get_published_slugs():
+    """Return the (frozen) set of published Collection slugs."""
+    version = cache.get_or_set(VERSION_KEY, time.time_ns, None)
+    with _slugs_lock:
+        if _slugs['version'] != version:
+            slugs = Collection.objects.filter(published=True).values_list('slug', flat=True)
+            _slugs['slugs'] = frozenset(slugs)
+            _slugs['version'] = version
+        return _slugs['slugs']
+
+
+def is_published_slug(slug):
+    return slug in get_published_slugs()
+
+
+def invalidate_slugs():
+    """Reload the sets after a Collection change (again once the transaction commits).
+
+    Reloading immediately makes the change visible to this process (within the transaction);
+    reloading after the commit replaces any set loaded by other processes before the commit.
+    """
+    _set_version()
+    transaction.on_commit(_set_version)
+
+
+def _set_version():
+    cache.set(VERSION_KEY, time.time_ns(), None)
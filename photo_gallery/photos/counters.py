@@ -0,0 +1,146 @@
+import datetime
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce, ExtractMonth, ExtractYear
+
+from .models import Collection, MonthlyPhotoCount, Photo
+
+
+# Denormalised `photo_count` and `published_photo_count` fields on Collection and Country, and
+# the published Photo counts per month (MonthlyPhotoCount) used by the date archive
+# https://docs.djangoproject.com/en/5.2/ref/models/expressions/#f-expressions
+
+
+def adjust_counts(model, pks, total=0, published=0):
+    """Increment (or decrement, if negative) the photo counters of the specified objects.
+
+    Args:
+        model (Model): the model class (`Collection` or `Country`).
+        pks (iterable): the primary keys of the objects to update (`None` values are ignored).
+        total (int): the change to apply to `photo_count`.
+        published (int): the change to apply to `published_photo_count`.
+    """
+    pks = [pk for pk in pks if pk is not None]
+    if not pks or (total == 0 and published == 0):
+        return
+
+    model.objects.filter(pk__in=pks).update(
+        photo_count=F('photo_count') + total,
+        published_photo_count=F('published_photo_count') + published,
+    )
+
+
+def actual_counts(model):
+    """Return a dict of (correlated) subqueries that count the Photos of each `model` object.
+    https://docs.djangoproject.com/en/5.2/ref/models/expressions/#subquery-expressions
+    """
+    if model is Collection:
+        source = Photo.collections.through.objects.all()
+        group_field, published_lookup = 'collection', 'photo__published'
+    else:
+        source = Photo.objects.all()
+        group_field, published_lookup = 'country', 'published'
+
+    def count(qs):
+        counts = qs.filter(**{group_field: OuterRef('pk')}) \
+                   .values(group_field) \
+                   .annotate(num=Count('pk')) \
+                   .values('num')
+        return Coalesce(Subquery(counts), 0)
+
+    return {
+        'photo_count': count(source),
+        'published_photo_count': count(source.filter(**{published_lookup: True})),
+    }
+
+
+def recount(model, pks=None):
+    """Recalculate the counters of all (or the specified) `model` objects using one UPDATE query.
+
+    Returns the number of objects that were updated.
+    """
+    qs = model.objects.all() if pks is None else model.objects.filter(pk__in=pks)
+    return qs.update(**actual_counts(model))
+
+
+def find_drifted(model):
+    """Return a queryset of `model` objects whose stored counters differ from the actual counts."""
+    counts = actual_counts(model)
+    annotated = model.objects.annotate(actual_total=counts['photo_count'],
+                                       actual_published=counts['published_photo_count'])
+
+    return annotated.filter(~Q(photo_count=F('actual_total')) |
+                            ~Q(published_photo_count=F('actual_published')))
+
+
+def get_month_range(year, month):
+    """Return the first day of a month and of the following month."""
+    start = datetime.date(year, month, 1)
+    return start, (start + datetime.timedelta(days=31)).replace(day=1)
+
+
+def _months_filter(months, date_field=None):
+    """Return a Q object matching the specified (year, month) pairs."""
+    lookup = Q(pk__in=[])  # Matches nothing if there are no months
+    for year, month in months:
+        if date_field is None:
+            lookup |= Q(year=year, month=month)
+        else:
+            start, end = get_month_range(year, month)
+            lookup |= Q(**{date_field + '__gte': start, date_field + '__lt': end})
+    return lookup
+
+
+def adjust_month_count(date, published):
+    """Increment (or decrement, if negative) the published Photo count of a date's month."""
+    if date is None or published == 0:
+        return
+
+    with transaction.atomic():
+        # Create the month's row if it doesn't exist, then update it (avoiding lost updates)
+        MonthlyPhotoCount.objects.bulk_create([MonthlyPhotoCount(year=date.year, month=date.month)],
+                                              ignore_conflicts=True)
+        MonthlyPhotoCount.objects.filter(year=date.year, month=date.month).update(
+            published_photo_count=F('published_photo_count') + published)
+
+
+def actual_month_counts(months=None):
+    """Return a dict of the actual published Photo counts of all (or the specified) months.
+
+    Args:
+        months (iterable): (year, month) pairs; months without published Photos are omitted.
+    """
+    photos = Photo.objects.filter(published=True)
+    if months is not None:
+        photos = photos.filter(_months_filter(months, 'date_taken'))
+
+    rows = photos.annotate(year=ExtractYear('date_taken'), month=ExtractMonth('date_taken')) \
+                 .values('year', 'month') \
+                 .annotate(num=Count('pk')) \
+                 .order_by()
+    return {(row['year'], row['month']): row['num'] for row in rows}
+
+
+def recount_months(months=None, dry_run=False):
+    """Recalculate the MonthlyPhotoCount rows of all (or the specified) months.
+
+    Returns the (year, month) pairs whose stored counts were incorrect.
+    """
+    with transaction.atomic():
+        actual = actual_month_counts(months)
+        stored = MonthlyPhotoCount.objects.all()
+        if months is not None:
+            stored = stored.filter(_months_filter(months))
+        stored = {(row.year, row.month): row.published_photo_count for row in stored}
+
+        drifted = sorted(month for month in set(actual) | set(stored)
+                         if actual.get(month, 0) != stored.get(month, 0))
+        if drifted and not dry_run:
+            MonthlyPhotoCount.objects.filter(_months_filter(drifted)).delete()
+            MonthlyPhotoCount.objects.bulk_create([
+                MonthlyPhotoCount(year=year, month=month, published_photo_count=actual[year, month])
+                for year, month in drifted if (year, month) in actual
+            ])
+
+    return drifted
@@ -0,0 +1,157 @@
+import math
+
+from django.db.models import Avg, Count, Min, Q
+from django.db.models.functions import Substr
+from PIL import Image
+
+
+# Photo coordinates: reading EXIF GPS data, geohash encoding, and map marker clustering
+# https://en.wikipedia.org/wiki/Geohash
+#
+# Each geotagged Photo stores the geohash of its coordinates, which is indexed (with
+# `published`), so Photos within a map's bounding box are found using index range scans on a
+# few geohash prefixes (cells covering the box). Prefixes are queried as ranges rather than
+# `startswith` (LIKE), which can't use the index with some database collations. The Photos are
+# then clustered by a shorter geohash prefix (depending on the map's zoom level) in the
+# database, so only one marker per cluster is returned rather than every Photo.
+
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_PRECISION = 9  # Characters stored per Photo (cells of roughly 5m x 5m)
+MAX_CLUSTER_PRECISION = 8
+MAX_COVERING_CELLS = 16  # Maximum geohash prefixes used to query a bounding box
+
+GPS_IFD = 0x8825
+GPS_LATITUDE_REF, GPS_LATITUDE, GPS_LONGITUDE_REF, GPS_LONGITUDE = 1, 2, 3, 4
+
+
+def encode_geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    geohash, bits, char, even = [], 0, 0, True  # Bits alternate between longitude and latitude
+    while len(geohash) < precision:
+        value, value_range = (longitude, lng_range) if even else (latitude, lat_range)
+        mid = (value_range[0] + value_range[1]) / 2
+        if value >= mid:
+            char = char << 1 | 1
+            value_range[0] = mid
+        else:
+            char = char << 1
+            value_range[1] = mid
+
+        even = not even
+        bits += 1
+        if bits == 5:
+            geohash.append(GEOHASH_ALPHABET[char])
+            bits, char = 0, 0
+    return ''.join(geohash)
+
+
+def get_geohash(latitude, longitude):
+    """Return the geohash stored for a Photo's coordinates ('' if either is missing)."""
+    if latitude is None or longitude is None:
+        return ''
+    return encode_geohash(latitude, longitude)
+
+
+def get_cell_size(precision):
+    """Return the (latitude, longitude) size in degrees of geohash cells of a precision."""
+    lng_bits = math.ceil(precision * 5 / 2)
+    lat_bits = precision * 5 // 2
+    return 180 / 2 ** lat_bits, 360 / 2 ** lng_bits
+
+
+def get_cluster_precision(zoom):
+    """Return the geohash precision used to cluster markers at a (web map) zoom level.
+
+    Map tiles are 256px wide and cover 360 / 2^zoom degrees of longitude, so this aims for
+    clusters roughly a quarter of a tile wide.
+    """
+    return max(1, min(MAX_CLUSTER_PRECISION, 2 * (zoom + 2) // 5))
+
+
+def get_covering_prefixes(south, west, north, east, max_precision):
+    """Return the geohash prefixes of the cells covering a bounding box.
+
+    The longest prefixes (up to `max_precision`) that need at most `MAX_COVERING_CELLS` cells
+    are used, or an empty list if even single character prefixes need more (i.e. don't filter).
+    """
+    for precision in range(max_precision, 0, -1):
+        cell_height, cell_width = get_cell_size(precision)
+        rows = math.floor(north / cell_height) - math.floor(south / cell_height) + 1
+        columns = math.floor(east / cell_width) - math.floor(west / cell_width) + 1
+        if rows * columns <= MAX_COVERING_CELLS:
+            break
+    else:
+        return []
+
+    prefixes = set()
+    for row in range(rows):
+        lat = min((math.floor(south / cell_height) + row + 0.5) * cell_height, 90)
+        for column in range(columns):
+            lng = min((math.floor(west / cell_width) + column + 0.5) * cell_width, 180)
+            prefixes.add(encode_geohash(lat, lng, precision))
+    return sorted(prefixes)
+
+
+def _get_rational_degrees(values):
+    degrees, minutes, seconds = (float(value) for value in values)
+    return degrees + minutes / 60 + seconds / 3600
+
+
+def read_gps_coordinates(file):
+    """Return the (latitude, longitude) of an image file's EXIF GPS data, or None."""
+    try:
+        with Image.open(file) as image:
+            gps = image.getexif().get_ifd(GPS_IFD)
+    except (OSError, SyntaxError, ValueError):
+        return None
+    finally:
+        file.seek(0)
+
+    try:
+        latitude = _get_rational_degrees(gps[GPS_LATITUDE])
+        longitude = _get_rational_degrees(gps[GPS_LONGITUDE])
+    except (KeyError, TypeError, ValueError, ZeroDivisionError):
+        return None
+
+    if gps.get(GPS_LATITUDE_REF) == 'S':
+        latitude = -latitude
+    if gps.get(GPS_LONGITUDE_REF) == 'W':
+        longitude = -longitude
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return None
+    return latitude, longitude
+
+
+def get_map_markers(photos, south, west, north, east, zoom):
+    """Return clustered markers (dicts) for the geotagged Photos within a bounding box.
+
+    A bounding box which crosses the antimeridian has a `west` value greater than `east`.
+    """
+    if west > east:
+        return get_map_markers(photos, south, west, north, 180, zoom) + \
+               get_map_markers(photos, south, -180, north, east, zoom)
+
+    precision = get_cluster_precision(zoom)
+    photos = photos.filter(latitude__range=(south, north), longitude__range=(west, east))
+    prefix_filter = Q()
+    for prefix in get_covering_prefixes(south, west, north, east, precision):
+        # '{' follows 'z', the last geohash character, in ASCII
+        prefix_filter |= Q(geohash__gte=prefix, geohash__lt=prefix + '{')
+
+    clusters = photos.filter(prefix_filter) \
+                     .annotate(cell=Substr('geohash', 1, precision)) \
+                     .values('cell') \
+                     .annotate(count=Count('pk'), latitude=Avg('latitude'),
+                               longitude=Avg('longitude'), slug=Min('slug'), title=Min('title')) \
+                     .order_by('cell')
+
+    markers = []
+    for cluster in clusters:
+        marker = {'geohash': cluster['cell'], 'count': cluster['count'],
+                  'latitude': round(cluster['latitude'], 6),
+                  'longitude': round(cluster['longitude'], 6)}
+        if cluster['count'] == 1:
+            # Min() of a single Photo's values are its values
+            marker.update(slug=cluster['slug'], title=cluster['title'])
+        markers.append(marker)
+    return markers
@@ -0,0 +1,69 @@
+import hashlib
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # E.g. Windows, where locks only apply within the process
+    fcntl = None
+
+
+# Cross-process advisory file locks (via `flock()`), e.g. so concurrent requests handled by
+# different worker processes don't generate the same image file
+# https://docs.python.org/3/library/fcntl.html#fcntl.flock
+
+LOCK_STRIPES = 256  # Lock files shared by keys with the same hash (limiting their number)
+
+_thread_locks = {}  # Path: threading.Lock (used if `fcntl` is unavailable)
+_thread_locks_lock = threading.Lock()
+
+
+class LockTimeout(Exception):
+    pass
+
+
+@contextmanager
+def file_lock(path, timeout=None, poll_interval=0.05):
+    """Hold an exclusive lock on the (lock) file at `path`, creating it if necessary.
+
+    Raise `LockTimeout` if the lock can't be acquired within `timeout` seconds (if not None).
+    The lock file isn't deleted afterwards (deleting it could allow two processes to hold
+    locks on different files with the same path).
+    """
+    if fcntl is None:
+        with _thread_locks_lock:
+            lock = _thread_locks.setdefault(str(path), threading.Lock())
+        if not lock.acquire(timeout=-1 if timeout is None else timeout):
+            raise LockTimeout("Timed out waiting for the lock on {}".format(path))
+        try:
+            yield
+        finally:
+            lock.release()
+        return
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | (0 if deadline is None else fcntl.LOCK_NB))
+                break
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    raise LockTimeout("Timed out waiting for the lock on {}".format(path))
+                time.sleep(poll_interval)
+        try:
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
+
+
+def get_lock_path(lock_dir, key):
+    """Return the path of the (striped) lock file for a key, e.g. a file name."""
+    stripe = int(hashlib.sha256(key.encode()).hexdigest()[:8], 16) % LOCK_STRIPES
+    return os.path.join(lock_dir, '{}.lock'.format(stripe))
@@ -0,0 +1,238 @@
+import datetime
+import json
+import logging
+import platform
+import statistics
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from photos.models import Collection, Photo
+
+
+class Command(BaseCommand):
+    """Measure the latency and throughput of the public URLs (e.g. after `manage.py seed_gallery`).
+
+    Requests are made via the Django test client (in-process) by default, or to a running server
+    if `--base-url` is provided. Results are saved as JSON so they can be compared across commits.
+    """
+    help = "Benchmark the public gallery URLs and report throughput and p50/p95/p99 latencies."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50,
+                            help="The number of measured requests per URL (default: 50).")
+        parser.add_argument('--warmup', type=int, default=5,
+                            help="The number of unmeasured requests per URL (default: 5).")
+        parser.add_argument('--base-url', default=None,
+                            help="Benchmark a running server, e.g. 'http://127.0.0.1:8000'.")
+        parser.add_argument('--host', default=None,
+                            help="The Host header used with the test client "
+                                 "(default: the first non-wildcard `ALLOWED_HOSTS` value).")
+        parser.add_argument('--output', default=None,
+                            help="The JSON results file path "
+                                 "(default: benchmark_results/<timestamp>-<commit>.json).")
+        parser.add_argument('--compare', default=None,
+                            help="A previous JSON results file to compare the results with.")
+        parser.add_argument('--concurrency', type=int, default=1,
+                            help="The number of threads making requests simultaneously, each "
+                                 "with its own database connection (default: 1).")
+
+    def handle(self, *args, **options):
+        urls = self.get_urls()
+        fetch = self.get_fetcher(options['base_url'], options['host'])
+        # Don't log a warning for each (expected) 404 response
+        logging.getLogger('django.request').setLevel(logging.ERROR)
+
+        results = {}
+        for view_name, url in urls:
+            # Don't throttle requests (made via the test client)
+            with override_settings(THROTTLES={}):
+                for _ in range(options['warmup']):
+                    fetch(url)
+
+                start = time.perf_counter()
+                timings, statuses = self.run_requests(fetch, url, options['requests'],
+                                                      options['concurrency'])
+                elapsed = time.perf_counter() - start
+
+            result = dict(url=url, statuses=statuses,
+                          throughput=round(len(timings) / elapsed, 2),
+                          **summarise_timings(timings))
+            results[view_name] = result
+            self.stdout.write("{:<20} {:>8.1f} req/s  p50 {:>7.2f}ms  p95 {:>7.2f}ms  p99 {:>7.2f}ms  "
+                              "{}".format(view_name, result['throughput'], result['p50'],
+                                          result['p95'], result['p99'], url))
+
+        output = self.save_results(results, options)
+        self.stdout.write(self.style.SUCCESS("Results saved to {}.".format(output)))
+
+        if options['compare']:
+            self.compare_results(results, options['compare'])
+
+    def run_requests(self, fetch, url, num, concurrency):
+        """Request a URL `num` times (split between `concurrency` threads).
+
+        Returns a tuple of the timings (milliseconds) and a dict of status code counts.
+        """
+        def worker(num_requests):
+            worker_timings, worker_statuses = [], []
+            try:
+                for _ in range(num_requests):
+                    request_start = time.perf_counter()
+                    worker_statuses.append(str(fetch(url)))
+                    worker_timings.append((time.perf_counter() - request_start) * 1000)
+            finally:
+                if concurrency > 1:
+                    # Each thread has its own database connections
+                    connections.close_all()
+            return worker_timings, worker_statuses
+
+        if concurrency > 1:
+            splits = [num // concurrency + (i < num % concurrency) for i in range(concurrency)]
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                worker_results = list(executor.map(worker, splits))
+        else:
+            worker_results = [worker(num)]
+
+        timings, statuses = [], {}
+        for worker_timings, worker_statuses in worker_results:
+            timings.extend(worker_timings)
+            for status in worker_statuses:
+                statuses[status] = statuses.get(status, 0) + 1
+        return timings, statuses
+
+    def get_urls(self):
+        """Return a list of (name, URL) tuples covering each public view."""
+        urls = [
+            ('homepage', reverse('homepage')),
+            ('homepage_page_2', reverse('homepage') + '?page=2'),
+            ('homepage_sort_new', reverse('homepage') + '?sort=new'),
+            ('contact', reverse('contact')),
+            ('sitemap', reverse('django.contrib.sitemaps.views.sitemap')),
+            ('robots', '/robots.txt'),
+            ('not_found', '/benchmark-404-test'),
+        ]
+
+        collection = Collection.objects.filter(published=True) \
+                                       .order_by('-published_photo_count').first()
+        if collection is not None:
+            urls.append(('collection', collection.get_absolute_url()))
+            urls.append(('collection_page_2', collection.get_absolute_url() + '?page=2'))
+
+        photo = Photo.objects.filter(published=True).order_by('-date_taken').first()
+        if photo is not None:
+            urls.append(('photo_detail', photo.get_absolute_url()))
+            query = photo.location.split()[0]
+            urls.append(('search', reverse('search') + '?query=' + query))
+
+        return urls
+
+    def get_fetcher(self, base_url, host):
+        """Return a function which requests a URL and returns the response status code."""
+        if base_url is not None:
+            def fetch(url):
+                try:
+                    with urllib.request.urlopen(base_url.rstrip('/') + url) as response:
+                        response.read()
+                        return response.status
+                except urllib.error.HTTPError as e:
+                    return e.code
+
+            return fetch
+
+        if host is None:
+            hosts = [h for h in settings.ALLOWED_HOSTS if not h.startswith(('.', '*'))]
+            host = hosts[0] if hosts else 'localhost'
+
+        clients = threading.local()
+
+        def fetch(url):
+            # Use a client per thread and HTTPS (to avoid `SECURE_SSL_REDIRECT` redirects)
+            if not hasattr(clients, 'client'):
+                clients.client = Client(HTTP_HOST=host)
+            return clients.client.get(url, secure=True).status_code
+
+        return fetch
+
+    def save_results(self, results, options):
+        commit = get_git_commit()
+        timestamp = datetime.datetime.now(datetime.timezone.utc)
+        output = options['output']
+        if output is None:
+            filename = "{}-{}.json".format(timestamp.strftime('%Y%m%dT%H%M%S'), commit or 'unknown')
+            output = settings.BASE_DIR / 'benchmark_results' / filename
+
+        output = Path(output)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        data = {
+            'commit': commit,
+            'timestamp': timestamp.isoformat(),
+            'python': platform.python_version(),
+            'database': connection.vendor,
+            'photos': Photo.objects.count(),
+            'base_url': options['base_url'],
+            'database_options': connection.settings_dict.get('OPTIONS', {}),
+            'conn_max_age': connection.settings_dict.get('CONN_MAX_AGE'),
+            'requests': options['requests'],
+            'concurrency': options['concurrency'],
+            'results': results,
+        }
+        output.write_text(json.dumps(data, indent=2))
+        return output
+
+    def compare_results(self, results, path):
+        try:
+            previous = json.loads(Path(path).read_text())
+        except (OSError, ValueError) as e:
+            raise CommandError("Unable to read results file '{}': {}".format(path, e))
+
+        self.stdout.write("\nComparison with {} (commit {}):".format(path, previous.get('commit')))
+        for view_name, result in results.items():
+            old = previous['results'].get(view_name)
+            if old is None:
+                continue
+
+            self.stdout.write("{:<20} p50 {:>+7.1f}%  p95 {:>+7.1f}%  p99 {:>+7.1f}%".format(
+                view_name, *[percent_change(old[p], result[p]) for p in ('p50', 'p95', 'p99')]))
+
+
+def summarise_timings(timings):
+    """Return a dict of summary statistics (in milliseconds) for a list of timings."""
+    if len(timings) < 2:
+        p50 = p95 = p99 = timings[0] if timings else 0
+    else:
+        # 99 cut points, i.e. percentiles 1-99
+        cuts = statistics.quantiles(timings, n=100, method='inclusive')
+        p50, p95, p99 = cuts[49], cuts[94], cuts[98]
+
+    return {
+        'mean': round(statistics.fmean(timings), 3) if timings else 0,
+        'p50': round(p50, 3),
+        'p95': round(p95, 3),
+        'p99': round(p99, 3),
+        'max': round(max(timings), 3) if timings else 0,
+    }
+
+
+def percent_change(old, new):
+    return (new - old) / old * 100 if old else 0
+
+
+def get_git_commit():
+    """Return the current (short) git commit hash, if available."""
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, cwd=settings.BASE_DIR, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
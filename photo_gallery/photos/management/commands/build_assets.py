@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from photo_gallery.assets import build_assets, render_assets
+
+
+class Command(BaseCommand):
+    """Build the purged stylesheet and inlined critical CSS from the vendored front-end assets.
+    https://docs.djangoproject.com/en/5.2/howto/custom-management-commands/
+    """
+    help = "Purge unused CSS from the vendored stylesheets and write the critical CSS template."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help="Exit with an error if the built files are out of date "
+                                 "(without writing them).")
+
+    def handle(self, *args, **options):
+        static_dir = settings.BASE_DIR / 'global_static'
+        templates_dir = settings.BASE_DIR / 'templates'
+        if options['check']:
+            outdated = [path for path, content in render_assets(static_dir, templates_dir).items()
+                        if not path.exists() or path.read_text(encoding='utf-8') != content]
+            if outdated:
+                raise CommandError("Out of date (run `python manage.py build_assets`): {}".format(
+                    ', '.join(str(path.relative_to(settings.BASE_DIR)) for path in outdated)))
+            self.stdout.write("Assets are up to date.")
+            return
+
+        for path, size in build_assets(static_dir, templates_dir).items():
+            self.stdout.write("Wrote {} ({:.1f} KB).".format(
+                path.relative_to(settings.BASE_DIR), size / 1024))
@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from photos import similarity
+from photos.models import Photo
+
+
+class Command(BaseCommand):
+    """Compute missing Photo feature vectors and rebuild the similar photos index.
+    https://docs.djangoproject.com/en/5.2/howto/custom-management-commands/
+    """
+    help = "Compute missing Photo feature vectors and write the similar photos index file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recompute', action='store_true',
+                            help="Recompute the feature vectors of all Photos.")
+        parser.add_argument('--batch-size', type=int, default=2000,
+                            help="Number of vectors to read from the database at a time.")
+
+    def handle(self, *args, **options):
+        if similarity.np is None:
+            raise CommandError("NumPy is required (install the optional `similarity` "
+                               "dependencies).")
+
+        photos = Photo.objects.all() if options['recompute'] else \
+            Photo.objects.filter(features__isnull=True)
+        computed = 0
+        for photo in photos.only('pk', 'slug', 'title', 'large_image').iterator():
+            similarity.update_features(photo)
+            computed += 1
+        self.stdout.write("Computed {} feature vectors.".format(computed))
+
+        count = similarity.build_index(settings.SIMILARITY_INDEX_PATH, options['batch_size'])
+        self.stdout.write("Wrote {} vectors to {}.".format(count, settings.SIMILARITY_INDEX_PATH))
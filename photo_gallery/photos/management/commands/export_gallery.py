@@ -0,0 +1,35 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from photos.archive import export_gallery
+
+
+class Command(BaseCommand):
+    """Export the gallery as a single archive file (see `photos/archive.py`).
+
+    E.g. `manage.py export_gallery gallery.tar.gz`, then `manage.py import_gallery gallery.tar.gz`
+    in another environment.
+    """
+    help = "Export all Collections, Countries, Photos (with images), and navigation links " \
+           "to a gzipped tar archive."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="The archive file path ('-' for stdout).")
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="The number of objects fetched per query (default: 1000).")
+
+    def handle(self, *args, **options):
+        if options['path'] == '-':
+            counts = export_gallery(sys.stdout.buffer, options['batch_size'])
+            output = self.stderr
+        else:
+            with open(options['path'], 'wb') as f:
+                counts = export_gallery(f, options['batch_size'])
+            output = self.stdout
+
+        output.write(self.style.SUCCESS("Exported {}.".format(format_counts(counts))))
+
+
+def format_counts(counts):
+    return ", ".join("{} {}".format(num, name.replace('_', ' ')) for name, num in counts.items())
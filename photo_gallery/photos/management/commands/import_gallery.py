@@ -0,0 +1,40 @@
+import sys
+import tarfile
+
+from django.core.management.base import BaseCommand, CommandError
+
+from photos.archive import ArchiveError, GalleryImporter
+from .export_gallery import format_counts
+
+
+class Command(BaseCommand):
+    """Import a gallery archive created by `manage.py export_gallery` (see `photos/archive.py`).
+
+    Existing objects are updated (matched by Country name, Collection slug, Photo slug, and
+    NavSection order), and the photo counters are recalculated afterwards.
+    """
+    help = "Import Collections, Countries, Photos (with images), and navigation links " \
+           "from an archive created by `export_gallery`."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="The archive file path ('-' for stdin).")
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="The number of objects created/updated per query "
+                                 "(default: 1000).")
+
+    def handle(self, *args, **options):
+        importer = GalleryImporter(options['batch_size'])
+        try:
+            if options['path'] == '-':
+                counts = importer.run(sys.stdin.buffer)
+            else:
+                with open(options['path'], 'rb') as f:
+                    counts = importer.run(f)
+        except (ArchiveError, OSError, tarfile.TarError) as e:
+            raise CommandError("Unable to import the archive: {}".format(e))
+
+        new_images = counts.pop('images', 0)
+        self.stdout.write(self.style.SUCCESS("Imported {} ({} new image files saved).".format(
+            format_counts(counts), new_images)))
+        self.stdout.write("Run `manage.py build_similarity_index` to add the imported Photos to "
+                          "the similar photos index.")
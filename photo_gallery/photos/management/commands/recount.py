@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from photos.counters import find_drifted, recount, recount_months
+from photos.models import Collection, Country
+from photos.shuffle import create_shuffle_ranks
+
+
+class Command(BaseCommand):
+    """Recalculate the denormalised Collection, Country, and monthly photo counters (and create
+    any missing Photo shuffle ranks).
+    https://docs.djangoproject.com/en/5.2/howto/custom-management-commands/
+    """
+    help = "Recalculate the photo counters of all Collections, Countries, and months (repairing " \
+           "any drift), and create any missing Photo shuffle ranks."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Report objects with incorrect counters without updating them.")
+
+    def handle(self, *args, **options):
+        for model in (Collection, Country):
+            name = model._meta.verbose_name_plural
+            with transaction.atomic():
+                drifted = list(find_drifted(model).values_list('pk', flat=True))
+                if drifted and not options['dry_run']:
+                    recount(model, drifted)
+
+            self.stdout.write("{} {} with incorrect counters{}.".format(
+                len(drifted), name, "" if options['dry_run'] else " repaired"))
+
+        drifted = recount_months(dry_run=options['dry_run'])
+        self.stdout.write("{} months with incorrect counters{}.".format(
+            len(drifted), "" if options['dry_run'] else " repaired"))
+
+        missing = create_shuffle_ranks(dry_run=options['dry_run'])
+        self.stdout.write("{} photos with missing shuffle ranks{}.".format(
+            missing, "" if options['dry_run'] else " repaired"))
@@ -0,0 +1,188 @@
+import datetime
+import random
+import re
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from PIL import Image, ImageDraw
+
+from nav.models import NavLink, NavSection
+from photos.cachefiles import get_stored_url
+from photos.collection_slugs import invalidate_slugs
+from photos.counters import recount, recount_months
+from photos.models import Collection, Country, Photo, PhotoFeatures
+from photos.search import invalidate_results
+from photos.shuffle import create_shuffle_ranks
+from photos.similarity import get_packed_vector
+
+
+class Command(BaseCommand):
+    """Generate a synthetic catalogue (e.g. for load testing with `manage.py benchmark_views`).
+
+    A small pool of synthetic images is generated (with renditions and feature vectors) and
+    shared between all of the Photos, which are then inserted in batches via `bulk_create()`
+    (which doesn't send signals, so the derived objects are created by the command).
+    https://docs.djangoproject.com/en/5.2/ref/models/querysets/#bulk-create
+    """
+    help = "Generate synthetic Photos, Collections, Countries, and navigation links. " \
+           "Don't run this against a production database!"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--photos', type=int, default=1000,
+                            help="The number of Photos to create (default: 1000).")
+        parser.add_argument('--collections', type=int, default=20,
+                            help="The number of Collections to create (default: 20).")
+        parser.add_argument('--countries', type=int, default=30,
+                            help="The number of Countries to create (default: 30).")
+        parser.add_argument('--images', type=int, default=10,
+                            help="The number of distinct synthetic images (default: 10).")
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="The number of Photos per INSERT query (default: 1000).")
+        parser.add_argument('--seed', type=int, default=None,
+                            help="A random seed, for reproducible catalogues.")
+        parser.add_argument('--prefix', default='seed',
+                            help="The slug/name prefix of created objects (default: 'seed').")
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.prefix = options['prefix']
+
+        image_pool = [self.create_image(i) for i in range(max(options['images'], 1))]
+        self.stdout.write("Generated {} synthetic images.".format(len(image_pool)))
+
+        with transaction.atomic():
+            collections = self.create_objects(Collection, options['collections'], lambda i: {
+                'name': "{} collection {}".format(self.prefix.capitalize(), i),
+                'slug': "{}-collection-{}".format(self.prefix, i),
+                'description': "A synthetic collection.",
+            }, unique_field='slug')
+            countries = self.create_objects(Country, options['countries'], lambda i: {
+                'name': "{} country {}".format(self.prefix.capitalize(), i),
+            }, unique_field='name')
+            self.create_nav(collections)
+
+            self.next_index = self.get_next_photo_index()
+            created = 0
+            while created < options['photos']:
+                batch_size = min(options['batch_size'], options['photos'] - created)
+                self.create_photo_batch(batch_size, image_pool, collections, countries)
+                created += batch_size
+                self.stdout.write("Created {} of {} Photos.".format(created, options['photos']))
+
+            recount(Collection)
+            recount(Country)
+            recount_months()
+            create_shuffle_ranks()
+            invalidate_results()
+            invalidate_slugs()
+
+        self.stdout.write(self.style.SUCCESS("Seeded {} Photos, {} Collections, and {} Countries."
+                                             "".format(created, len(collections), len(countries))))
+        self.stdout.write("Run `manage.py build_similarity_index` to add the Photos to the "
+                          "similar photos index.")
+
+    def create_image(self, index):
+        """Generate, save, and pre-generate the renditions of a synthetic image.
+
+        Returns a dict of the image (storage) name, the thumbnail URL, and the (packed) feature
+        vector.
+        """
+        width, height = 2000, self.random.choice([1125, 1333, 1500, 2500])
+        colours = [tuple(self.random.randrange(256) for _ in range(3)) for _ in range(2)]
+        img = Image.new('RGB', (width, height), colours[0])
+        draw = ImageDraw.Draw(img)
+        for _ in range(12):
+            x, y = self.random.randrange(width), self.random.randrange(height)
+            size = self.random.randrange(100, 800)
+            colour = tuple(self.random.randrange(256) for _ in range(3))
+            draw.ellipse([x, y, x + size, y + size], fill=colour, outline=colours[1], width=8)
+
+        content = BytesIO()
+        img.save(content, format='JPEG', quality=80)
+
+        # Photos share the image file, so its renditions only need to be generated once
+        field = Photo._meta.get_field('large_image')
+        photo = Photo()
+        name = field.generate_filename(photo, "{}-{}.jpg".format(self.prefix, index))
+        photo.large_image.name = field.storage.save(name, ContentFile(content.getvalue()))
+        photo.small_image.generate()
+        photo.thumbnail.generate()
+        return {'large_image': photo.large_image.name,
+                'thumbnail_url': get_stored_url(photo.thumbnail),
+                'vector': get_packed_vector(photo)}
+
+    def create_objects(self, model, num, get_values, unique_field):
+        """Create (or reuse) `num` objects using `get_values(index)`, returning a list of objects."""
+        objs = [model(**get_values(i + 1)) for i in range(num)]
+        model.objects.bulk_create(objs, ignore_conflicts=True)
+        unique_values = [getattr(obj, unique_field) for obj in objs]
+        return list(model.objects.filter(**{unique_field + '__in': unique_values}))
+
+    def create_nav(self, collections):
+        """Create a dropdown NavSection linking to Collections (if a section order is free)."""
+        used_orders = set(NavSection.objects.values_list('section_order', flat=True))
+        free_orders = [order for order, _ in NavSection.ORDER_CHOICES if order not in used_orders]
+        if not free_orders or not collections:
+            return
+
+        section = NavSection.objects.create(section_order=free_orders[0],
+                                            dropdown_label=self.prefix.capitalize())
+        NavLink.objects.bulk_create([
+            NavLink(link_text=col.name, link_url=col.get_absolute_url(), vertical_order=i + 1,
+                    nav_section=section)
+            for i, col in enumerate(collections[:len(NavLink.ORDER_CHOICES) - 1])
+        ])
+
+    def get_next_photo_index(self):
+        """Return the index following the highest existing seeded Photo slug index (so slugs
+        don't collide if Photos have been deleted)."""
+        pattern = re.compile(r'{}-photo-(\d+)$'.format(re.escape(self.prefix)))
+        slugs = Photo.objects.filter(slug__startswith=self.prefix + '-photo-') \
+                             .values_list('slug', flat=True)
+        return max((int(match[1]) for match in map(pattern.match, slugs.iterator()) if match),
+                   default=0) + 1
+
+    def create_photo_batch(self, num, image_pool, collections, countries):
+        """Insert `num` Photos, their Collection memberships, and their feature vectors (using 3
+        queries if supported)."""
+        start = self.next_index
+        self.next_index += num
+        photos, images = [], []
+        for i in range(start, start + num):
+            image = self.random.choice(image_pool)
+            images.append(image)
+            photos.append(Photo(
+                large_image=image['large_image'],
+                thumbnail_url=image['thumbnail_url'],
+                title="{} photo {}".format(self.prefix.capitalize(), i),
+                slug="{}-photo-{}".format(self.prefix, i),
+                description="A synthetic photo.",
+                location="Location {}".format(self.random.randrange(100)),
+                country=self.random.choice(countries) if countries else None,
+                date_taken=datetime.date(2000, 1, 1) + datetime.timedelta(
+                    days=self.random.randrange(9000)),
+                featured=self.random.random() < 0.05,
+                published=self.random.random() < 0.9,
+            ))
+
+        Photo.objects.bulk_create(photos)
+        if not connection.features.can_return_rows_from_bulk_insert:
+            pks = dict(Photo.objects.filter(slug__in=[p.slug for p in photos])
+                                    .values_list('slug', 'pk'))
+            for photo in photos:
+                photo.pk = pks[photo.slug]
+
+        Membership = Photo.collections.through
+        memberships = [
+            Membership(photo_id=photo.pk, collection_id=col.pk)
+            for photo in photos
+            for col in self.random.sample(collections, min(len(collections),
+                                                           self.random.randrange(3)))
+        ]
+        Membership.objects.bulk_create(memberships)
+        PhotoFeatures.objects.bulk_create([
+            PhotoFeatures(photo_id=photo.pk, vector=image['vector'])
+            for photo, image in zip(photos, images) if image['vector'] is not None
+        ])
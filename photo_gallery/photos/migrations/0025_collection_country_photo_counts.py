@@ -0,0 +1,49 @@
+# Generated by Django 5.2.13 on 2026-10-19 15:31
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def populate_photo_counts(apps, schema_editor):
+    # Calculate the initial counter values (subsequently maintained via signals)
+    for model_name in ['Collection', 'Country']:
+        model = apps.get_model('photos', model_name)
+        objs = model.objects.annotate(num_total=Count('photo'),
+                                      num_published=Count('photo', filter=Q(photo__published=True)))
+
+        for obj in objs:
+            obj.photo_count = obj.num_total
+            obj.published_photo_count = obj.num_published
+
+        model.objects.bulk_update(objs, ['photo_count', 'published_photo_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photos', '0024_photo_last_modified'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='collection',
+            name='photo_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='collection',
+            name='published_photo_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='country',
+            name='photo_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='country',
+            name='published_photo_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_photo_counts, reverse_code=migrations.RunPython.noop),
+    ]
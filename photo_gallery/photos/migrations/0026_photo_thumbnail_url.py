@@ -0,0 +1,18 @@
+# Generated by Django 5.2.13 on 2026-10-19 15:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photos', '0025_collection_country_photo_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='photo',
+            name='thumbnail_url',
+            field=models.CharField(blank=True, editable=False, max_length=500),
+        ),
+    ]
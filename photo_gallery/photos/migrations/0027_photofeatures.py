@@ -0,0 +1,25 @@
+# Generated by Django 5.2.13 on 2026-10-19 16:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photos', '0026_photo_thumbnail_url'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PhotoFeatures',
+            fields=[
+                ('photo', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='features', serialize=False, to='photos.photo')),
+                ('vector', models.BinaryField()),
+                ('updated', models.DateTimeField(auto_now=True, db_index=True)),
+            ],
+            options={
+                'verbose_name_plural': 'photo features',
+            },
+        ),
+    ]
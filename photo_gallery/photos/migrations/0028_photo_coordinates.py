@@ -0,0 +1,33 @@
+# Generated by Django 5.2.13 on 2026-10-19 16:25
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photos', '0027_photofeatures'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='photo',
+            name='geohash',
+            field=models.CharField(blank=True, editable=False, max_length=12),
+        ),
+        migrations.AddField(
+            model_name='photo',
+            name='latitude',
+            field=models.FloatField(blank=True, help_text="Leave blank to use the image's GPS data (if any).", null=True, validators=[django.core.validators.MinValueValidator(-90), django.core.validators.MaxValueValidator(90)]),
+        ),
+        migrations.AddField(
+            model_name='photo',
+            name='longitude',
+            field=models.FloatField(blank=True, help_text="Leave blank to use the image's GPS data (if any).", null=True, validators=[django.core.validators.MinValueValidator(-180), django.core.validators.MaxValueValidator(180)]),
+        ),
+        migrations.AddIndex(
+            model_name='photo',
+            index=models.Index(fields=['published', 'geohash'], name='photo_published_geohash_idx'),
+        ),
+    ]
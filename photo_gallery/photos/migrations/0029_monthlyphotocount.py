@@ -0,0 +1,53 @@
+# Generated by Django 5.2.13 on 2026-10-19 16:28
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import ExtractMonth, ExtractYear
+
+
+def populate_monthly_photo_counts(apps, schema_editor):
+    # Calculate the initial counts (subsequently maintained via signals)
+    Photo = apps.get_model('photos', 'Photo')
+    MonthlyPhotoCount = apps.get_model('photos', 'MonthlyPhotoCount')
+    rows = Photo.objects.filter(published=True) \
+                        .annotate(year=ExtractYear('date_taken'),
+                                  month=ExtractMonth('date_taken')) \
+                        .values('year', 'month') \
+                        .annotate(num=Count('pk')) \
+                        .order_by()
+
+    MonthlyPhotoCount.objects.bulk_create([
+        MonthlyPhotoCount(year=row['year'], month=row['month'], published_photo_count=row['num'])
+        for row in rows
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photos', '0028_photo_coordinates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyPhotoCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField()),
+                ('month', models.PositiveSmallIntegerField()),
+                ('published_photo_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-year', '-month'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='photo',
+            index=models.Index(fields=['published', 'date_taken'], name='photo_published_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='monthlyphotocount',
+            constraint=models.UniqueConstraint(fields=('year', 'month'), name='unique_photo_count_month'),
+        ),
+        migrations.RunPython(populate_monthly_photo_counts, reverse_code=migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.13 on 2026-10-19 16:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photos', '0029_monthlyphotocount'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchQuery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('query', models.CharField(max_length=100, unique=True)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('last_searched', models.DateTimeField(null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'search queries',
+                'indexes': [models.Index(fields=['-count'], name='searchquery_count_idx')],
+            },
+        ),
+    ]
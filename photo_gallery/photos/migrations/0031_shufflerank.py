@@ -0,0 +1,46 @@
+# Generated by Django 5.2.13 on 2026-10-19 16:41
+
+import hashlib
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_shuffle_ranks(apps, schema_editor):
+    # Create the initial ranks (as in `shuffle.py`; subsequently created via signals)
+    Photo = apps.get_model('photos', 'Photo')
+    ShuffleRank = apps.get_model('photos', 'ShuffleRank')
+    slots = 7
+
+    def get_rank(slot, photo_pk):
+        digest = hashlib.sha256('{}:{}'.format(slot, photo_pk).encode()).digest()
+        return int.from_bytes(digest[:4], 'big') >> 1
+
+    ShuffleRank.objects.bulk_create([
+        ShuffleRank(photo_id=pk, slot=slot, rank=get_rank(slot, pk))
+        for pk in Photo.objects.values_list('pk', flat=True) for slot in range(slots)
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photos', '0030_searchquery'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShuffleRank',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slot', models.PositiveSmallIntegerField()),
+                ('rank', models.PositiveIntegerField()),
+                ('photo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shuffle_ranks', to='photos.photo')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['slot', 'rank'], name='shufflerank_slot_rank_idx')],
+                'constraints': [models.UniqueConstraint(fields=('photo', 'slot'), name='unique_shuffle_rank_slot')],
+            },
+        ),
+        migrations.RunPython(populate_shuffle_ranks, reverse_code=migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.13 on 2026-10-19 16:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photos', '0031_shufflerank'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='collection',
+            name='last_modified',
+            field=models.DateTimeField(auto_now=True, null=True),
+        ),
+    ]
@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.core.exceptions import ValidationError
-from django.core.validators import MinLengthValidator, validate_slug
+from django.core.validators import (MaxValueValidator, MinLengthValidator, MinValueValidator,
+                                    validate_slug)
 from django.db import models
 from django.urls import reverse
 from django.utils.html import mark_safe
@@ -29,6 +30,12 @@ class Collection(models.Model):
 
     published = models.BooleanField(default=True)
 
+    # Maintained via signals (see `signals.py`); repair any drift using `manage.py recount`
+    photo_count = models.PositiveIntegerField(default=0, editable=False)
+    published_photo_count = models.PositiveIntegerField(default=0, editable=False)
+
+    last_modified = models.DateTimeField(auto_now=True, null=True)
+
     def __str__(self):
         return self.name
 
@@ -42,6 +49,10 @@ class Collection(models.Model):
 class Country(models.Model):
     name = models.CharField(max_length=255, unique=True, validators=[MinLengthValidator(2)])
 
+    # Maintained via signals (see `signals.py`); repair any drift using `manage.py recount`
+    photo_count = models.PositiveIntegerField(default=0, editable=False)
+    published_photo_count = models.PositiveIntegerField(default=0, editable=False)
+
     def __str__(self):
         return self.name
 
@@ -72,9 +83,13 @@ class Photo(models.Model):
                                processors=[ResizeToFit(width=150)],
                                format='JPEG')
 
+    # Stored on save (see `signals.py`) so the admin Photo list doesn't resolve each thumbnail
+    thumbnail_url = models.CharField(max_length=500, blank=True, editable=False)
+
     @admin.display(description='Thumbnail')
     def thumbnail_img_tag(self):
-        return mark_safe('<img src="{}" />'.format(self.thumbnail.url))
+        url = self.thumbnail_url or self.thumbnail.url
+        return mark_safe('<img src="{}" loading="lazy" />'.format(url))
 
     title = models.CharField(max_length=255)
 
@@ -94,6 +109,16 @@ class Photo(models.Model):
     # Country is optional
     country = models.ForeignKey(Country, on_delete=models.SET_NULL, null=True, blank=True)
 
+    # Coordinates are optional; filled from the image's EXIF GPS data on upload if left blank
+    coords_guidelines = "Leave blank to use the image's GPS data (if any)."
+    latitude = models.FloatField(null=True, blank=True, help_text=coords_guidelines,
+                                 validators=[MinValueValidator(-90), MaxValueValidator(90)])
+    longitude = models.FloatField(null=True, blank=True, help_text=coords_guidelines,
+                                  validators=[MinValueValidator(-180), MaxValueValidator(180)])
+
+    # Set on save (see `signals.py`); used to query and cluster map markers (see `geo.py`)
+    geohash = models.CharField(max_length=12, blank=True, editable=False)
+
     date_taken = models.DateField()
 
     # Collections are optional
@@ -111,3 +136,75 @@ class Photo(models.Model):
 
     def get_absolute_url(self):
         return reverse("photo_detail", kwargs={"slug": self.slug})
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['published', 'geohash'], name='photo_published_geohash_idx'),
+            models.Index(fields=['published', 'date_taken'], name='photo_published_date_idx'),
+        ]
+
+
+class MonthlyPhotoCount(models.Model):
+    """The number of published Photos taken in a month, used for the date archive navigation.
+
+    Maintained via signals (see `signals.py`); repair any drift using `manage.py recount`.
+    """
+    year = models.PositiveSmallIntegerField()
+    month = models.PositiveSmallIntegerField()
+    published_photo_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return "{}-{:02}".format(self.year, self.month)
+
+    class Meta:
+        ordering = ['-year', '-month']
+        constraints = [
+            models.UniqueConstraint(fields=['year', 'month'], name='unique_photo_count_month'),
+        ]
+
+
+class PhotoFeatures(models.Model):
+    """A Photo's image feature vector, used to find visually similar Photos (see `similarity.py`).
+
+    Stored separately from Photo so that Photo queries don't load the vectors.
+    """
+    photo = models.OneToOneField(Photo, on_delete=models.CASCADE, primary_key=True,
+                                 related_name='features')
+    vector = models.BinaryField()  # Little-endian float32 values
+    updated = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __str__(self):
+        return "Features of {}".format(self.photo_id)
+
+    class Meta:
+        verbose_name_plural = "photo features"
+
+
+class SearchQuery(models.Model):
+    """A normalised search query and the number of times it's been searched (see `search.py`)."""
+    query = models.CharField(max_length=100, unique=True)
+    count = models.PositiveIntegerField(default=0)
+    last_searched = models.DateTimeField(null=True)
+
+    def __str__(self):
+        return self.query
+
+    class Meta:
+        indexes = [models.Index(fields=['-count'], name='searchquery_count_idx')]
+        verbose_name_plural = "search queries"
+
+
+class ShuffleRank(models.Model):
+    """A Photo's pseudo-random rank in one of the seeded shuffles (see `shuffle.py`)."""
+    photo = models.ForeignKey(Photo, on_delete=models.CASCADE, related_name='shuffle_ranks')
+    slot = models.PositiveSmallIntegerField()
+    rank = models.PositiveIntegerField()
+
+    def __str__(self):
+        return "{} in shuffle {}".format(self.photo_id, self.slot)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['photo', 'slot'], name='unique_shuffle_rank_slot'),
+        ]
+        indexes = [models.Index(fields=['slot', 'rank'], name='shufflerank_slot_rank_idx')]
@@ -0,0 +1,153 @@
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from imagekit import ImageSpec
+from imagekit.processors import ResizeToFit
+
+from photo_gallery import metrics
+from photo_gallery.instrumentation import timed
+from .locks import file_lock, get_lock_path, LockTimeout
+
+
+# On-demand image renditions (`/img/<slug>/<width>.<extension>`) of a Photo's `large_image`,
+# for layouts which don't suit the fixed ImageSpecFields (e.g. Open Graph images or print)
+#
+# Widths and formats are restricted to the `IMAGE_RENDITION_WIDTHS` and `IMAGE_RENDITION_FORMATS`
+# settings, so the number of renditions per photo is bounded. Renditions are generated on the
+# first request (while holding a file lock, so concurrent requests for the same rendition wait
+# rather than generating it again) and stored in `IMAGE_CACHE_DIR`. When the cache exceeds
+# `IMAGE_CACHE_MAX_BYTES`, the least recently used renditions are deleted (checked at most once
+# per `IMAGE_CACHE_EVICTION_INTERVAL` seconds, since every cached file is listed).
+
+CONTENT_TYPES = {'JPEG': 'image/jpeg', 'WEBP': 'image/webp', 'PNG': 'image/png'}
+EVICTION_TARGET = 0.9  # Fraction of the quota to evict down to (so eviction isn't constant)
+EVICTION_CACHE_KEY = 'image_cache_eviction'
+
+
+class Rendition(ImageSpec):
+    def __init__(self, source, width, format):
+        self.processors = [ResizeToFit(width=width, upscale=False)]
+        self.format = format
+        self.options = {'quality': getattr(settings, 'IMAGE_RENDITION_QUALITY', 80)}
+        super().__init__(source)
+
+
+def get_format(width, extension):
+    """Return the image format (e.g. 'JPEG'), or None if the width/extension isn't allowed."""
+    if width not in getattr(settings, 'IMAGE_RENDITION_WIDTHS', []):
+        return None
+    return getattr(settings, 'IMAGE_RENDITION_FORMATS', {}).get(extension)
+
+
+def get_cache_path(source_name, width, extension):
+    # Keyed by the source file name, so replacing a Photo's image creates new renditions
+    key = hashlib.sha256('{}:{}:{}'.format(source_name, width, extension).encode()).hexdigest()
+    return Path(settings.IMAGE_CACHE_DIR) / key[:2] / '{}.{}'.format(key, extension)
+
+
+def open_rendition(source, width, extension):
+    """Return an open (binary) file of a cached rendition of the `source` image file, generating
+    it if needed.
+
+    The file is opened rather than checked for, so a rendition evicted by another request in the
+    meantime is generated again (and an open file can still be read after it's evicted).
+    Raise `LockTimeout` if another request is generating it and doesn't finish in time.
+    """
+    path = get_cache_path(source.name, width, extension)
+    f = open_cached(path)
+    if f is not None:
+        metrics.IMAGE_CACHE_REQUESTS.inc(result='hit')
+        return f
+
+    lock_path = get_lock_path(Path(settings.IMAGE_CACHE_DIR) / 'locks', path.name)
+    with file_lock(lock_path, timeout=getattr(settings, 'IMAGE_RENDITION_LOCK_TIMEOUT', 30)):
+        f = open_cached(path)
+        if f is not None:  # Generated by another request while waiting for the lock
+            metrics.IMAGE_CACHE_REQUESTS.inc(result='hit_after_wait')
+            return f
+
+        metrics.IMAGE_CACHE_REQUESTS.inc(result='miss')
+        with timed('rendition_generation'):
+            content = Rendition(source, width, get_format(width, extension)).generate()
+            write_atomically(path, content.read())
+        metrics.RENDITION_GENERATIONS.inc()
+        f = open(path, 'rb')
+
+    maybe_evict()
+    return f
+
+
+def open_cached(path):
+    """Return the open cached file at `path` (marked as recently used), or None if missing."""
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        return None
+    try:
+        os.utime(path)  # Mark as recently used (access times aren't reliably updated)
+    except FileNotFoundError:
+        pass  # Evicted after opening; the open file can still be read
+    return f
+
+
+def write_atomically(path, data):
+    """Write to a temporary file and then rename it, so partial files are never served."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def maybe_evict():
+    """Evict renditions if the cache hasn't been checked in the last eviction interval."""
+    interval = getattr(settings, 'IMAGE_CACHE_EVICTION_INTERVAL', 60)
+    if cache.add(EVICTION_CACHE_KEY, 1, interval):
+        return evict(settings.IMAGE_CACHE_DIR, getattr(settings, 'IMAGE_CACHE_MAX_BYTES', None))
+    return 0
+
+
+def evict(cache_dir, max_bytes):
+    """Delete the least recently used renditions if the cache size exceeds `max_bytes`.
+
+    Return the number of deleted files. Skipped if another process is already evicting.
+    """
+    if max_bytes is None:
+        return 0
+
+    cache_dir = Path(cache_dir)
+    try:
+        with file_lock(cache_dir / 'locks' / 'eviction.lock', timeout=0):
+            files = []
+            for path in cache_dir.glob('??/*'):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                if path.suffix != '.tmp':
+                    files.append((stat.st_mtime, stat.st_size, path))
+
+            total = sum(size for _, size, _ in files)
+            if total <= max_bytes:
+                return 0
+
+            deleted = 0
+            for _, size, path in sorted(files):
+                if total <= max_bytes * EVICTION_TARGET:
+                    break
+                path.unlink(missing_ok=True)
+                total -= size
+                deleted += 1
+    except LockTimeout:
+        return 0
+
+    metrics.IMAGE_CACHE_EVICTIONS.inc(deleted)
+    return deleted
@@ -0,0 +1,182 @@
+import hashlib
+import logging
+import threading
+import time
+import unicodedata
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.db.models import F, Q
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from photo_gallery.instrumentation import record_cache_lookup, timed
+from .models import Photo, SearchQuery
+
+
+# Photo search: query normalisation, a log of query frequencies, and cached popular results
+#
+# Queries are normalised (Unicode NFKC, lowercase, and collapsed whitespace), so "Paris",
+# "paris " and "PARIS" are the same query. Queries are matched using lowercased fields (rather
+# than `icontains`, since SQLite's `LIKE` only ignores the case of ASCII characters), so e.g.
+# "zürich" matches "ZÜRICH" on every database (see `signals.register_sqlite_lower()`), and the
+# cached results of a normalised query match those of every variant. Each process counts
+# queries in memory and adds the counts to the SearchQuery table every
+# `SEARCH_LOG_FLUSH_INTERVAL` seconds, rather than writing to the database for every search.
+#
+# The ordered pks of the published Photos matching each of the `SEARCH_CACHE_QUERIES` most
+# frequent queries are cached, so popular searches don't scan the Photo table. Cached results
+# are keyed by a version which changes whenever Photos change (once the transaction commits),
+# after which the popular queries' results are recomputed in a background thread. The results
+# of other queries aren't cached. Use a shared cache with multiple processes (otherwise other
+# processes' results are only updated after `SEARCH_CACHE_TIMEOUT`).
+
+logger = logging.getLogger(__name__)
+
+MAX_QUERY_LENGTH = SearchQuery._meta.get_field('query').max_length  # Longer queries aren't logged
+VERSION_KEY = 'search_results_version'
+POPULAR_QUERIES_KEY = 'search_popular_queries'
+POPULAR_QUERIES_TIMEOUT = 10 * 60  # Seconds
+REFRESH_DELAY = 1  # Seconds to wait before refreshing (so consecutive changes are combined)
+
+_log = {'counts': {}, 'last_flush': time.monotonic()}  # Unflushed query counts
+_log_lock = threading.Lock()
+_refresh = {'pending': False}
+_refresh_lock = threading.Lock()
+_MISSING = object()
+
+
+def normalize_query(query):
+    return ' '.join(unicodedata.normalize('NFKC', query).lower().split())
+
+
+def search_photos(query):
+    """Return a queryset of the published Photos whose primary content includes the query
+    (ignoring case).
+    https://docs.djangoproject.com/en/5.2/topics/db/queries/#complex-lookups-with-q-objects
+    """
+    query = query.lower()
+    lookup = Q(title_lower__contains=query) | \
+             Q(description_lower__contains=query) | \
+             Q(location_lower__contains=query)
+
+    return Photo.objects.alias(title_lower=Lower('title'), description_lower=Lower('description'),
+                               location_lower=Lower('location')).filter(lookup, published=True)
+
+
+def record_query(query):
+    """Count a (normalised) query, adding the counts to the database periodically."""
+    if not query or len(query) > MAX_QUERY_LENGTH:
+        return
+
+    with _log_lock:
+        _log['counts'][query] = _log['counts'].get(query, 0) + 1
+        flush_interval = getattr(settings, 'SEARCH_LOG_FLUSH_INTERVAL', 10)
+        if time.monotonic() - _log['last_flush'] < flush_interval:
+            return
+        counts, _log['counts'] = _log['counts'], {}
+        _log['last_flush'] = time.monotonic()
+
+    flush_query_counts(counts)
+
+
+def flush_query_counts(counts):
+    """Add query counts (a dict of query: count) to the SearchQuery table."""
+    now = timezone.now()
+    with transaction.atomic():
+        SearchQuery.objects.bulk_create([SearchQuery(query=query) for query in counts],
+                                        ignore_conflicts=True)
+        for query, count in counts.items():
+            SearchQuery.objects.filter(query=query).update(count=F('count') + count,
+                                                           last_searched=now)
+
+
+def get_popular_queries():
+    """Return the set of the `SEARCH_CACHE_QUERIES` most frequently searched queries."""
+    def get_queries():
+        queries = SearchQuery.objects.order_by('-count').values_list('query', flat=True)
+        return set(queries[:getattr(settings, 'SEARCH_CACHE_QUERIES', 100)])
+
+    return cache.get_or_set(POPULAR_QUERIES_KEY, get_queries, POPULAR_QUERIES_TIMEOUT)
+
+
+def get_version():
+    return cache.get_or_set(VERSION_KEY, time.time_ns, None)
+
+
+def _get_results_key(version, query):
+    return 'search_results:{}:{}'.format(version, hashlib.sha256(query.encode()).hexdigest())
+
+
+def _cache_results(version, query):
+    """Compute and cache the results of a query, returning the pks (or None if too many)."""
+    max_results = getattr(settings, 'SEARCH_CACHE_MAX_RESULTS', 1000)
+    pks = search_photos(query).order_by('-featured', '-date_taken', 'pk') \
+                              .values_list('pk', flat=True)
+    pks = list(pks[:max_results + 1])
+    if len(pks) > max_results:
+        pks = None  # Cached as None, so the query isn't repeated
+
+    cache.set(_get_results_key(version, query), pks,
+              getattr(settings, 'SEARCH_CACHE_TIMEOUT', 24 * 60 * 60))
+    return pks
+
+
+def get_result_pks(query):
+    """Return the ordered pks of the Photos matching a popular (normalised) query.
+
+    Return None if the query isn't popular or has too many results to cache.
+    """
+    if query not in get_popular_queries():
+        return None
+
+    # Get the version first, so results computed from changed Photos aren't cached under it
+    version = get_version()
+    pks = cache.get(_get_results_key(version, query), _MISSING)
+    record_cache_lookup(pks is not _MISSING)
+    if pks is not _MISSING:
+        return pks
+
+    with timed('search_results'):
+        return _cache_results(version, query)
+
+
+def refresh_popular_results():
+    """Recompute and cache the results of the popular queries; return the number of queries."""
+    cache.delete(POPULAR_QUERIES_KEY)
+    version = get_version()
+    queries = get_popular_queries()
+    for query in queries:
+        _cache_results(version, query)
+    return len(queries)
+
+
+def invalidate_results():
+    """Change the results version once the transaction commits (refreshing the results)."""
+    transaction.on_commit(_invalidate_and_refresh)
+
+
+def _invalidate_and_refresh():
+    cache.set(VERSION_KEY, time.time_ns(), None)
+    if not getattr(settings, 'SEARCH_CACHE_BACKGROUND_REFRESH', True):
+        return
+
+    with _refresh_lock:
+        if _refresh['pending']:
+            return
+        _refresh['pending'] = True
+    threading.Thread(target=_refresh_in_background, daemon=True).start()
+
+
+def _refresh_in_background():
+    time.sleep(REFRESH_DELAY)
+    with _refresh_lock:
+        _refresh['pending'] = False
+
+    try:
+        refresh_popular_results()
+    except Exception:
+        logger.exception("Failed to refresh the popular search results")
+    finally:
+        connections.close_all()  # Close this thread's database connections
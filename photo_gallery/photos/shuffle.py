@@ -0,0 +1,64 @@
+import hashlib
+
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import Photo, ShuffleRank
+
+
+# Seeded shuffle ordering (`?sort=random`), using precomputed ranks
+#
+# Each Photo has a stored pseudo-random rank for each of `SLOTS` shuffles (derived from a hash of
+# the slot and the Photo's pk), indexed by (slot, rank). Ordering by a slot's ranks therefore
+# uses the index (unlike `ORDER BY RANDOM()`, which sorts every Photo on every request) and is
+# the same on every page. The slot changes daily, so returning visitors see a different order;
+# pagination links include the slot (`seed`) so paging isn't affected by the date changing.
+#
+# Ranks are created when a Photo is created (including by `loaddata`, see `signals.py`) and after
+# the bulk inserts of `seed_gallery` and archive imports. Photos without ranks aren't listed (an
+# outer join couldn't use the index), so create any missing ranks (e.g. after other bulk inserts
+# or increasing `SLOTS`) using `manage.py recount`.
+
+SLOTS = 7
+RANK_BITS = 31  # Fits a PositiveIntegerField on every database backend
+
+
+def get_rank(slot, photo_pk):
+    digest = hashlib.sha256('{}:{}'.format(slot, photo_pk).encode()).digest()
+    return int.from_bytes(digest[:4], 'big') >> (32 - RANK_BITS)
+
+
+def get_current_slot():
+    """Return today's shuffle slot."""
+    return timezone.localdate().toordinal() % SLOTS
+
+
+def parse_slot(value):
+    """Return the shuffle slot from a `seed` query string value, or None if invalid."""
+    if value is None or not value.isdigit() or int(value) >= SLOTS:
+        return None
+    return int(value)
+
+
+def shuffle_photos(qs, slot):
+    """Order a Photo queryset by its shuffle ranks in the slot (with pk as the tie-breaker)."""
+    return qs.filter(shuffle_ranks__slot=slot).order_by('shuffle_ranks__rank', 'pk')
+
+
+def create_shuffle_ranks(photo_pks=None, dry_run=False):
+    """Create the missing shuffle ranks of Photos (all Photos by default).
+
+    Returns the number of Photos which had missing ranks (which aren't created if `dry_run`).
+    """
+    photos = Photo.objects.all() if photo_pks is None else Photo.objects.filter(pk__in=photo_pks)
+    missing = list(photos.annotate(num_ranks=Count('shuffle_ranks'))
+                         .filter(num_ranks__lt=SLOTS)
+                         .values_list('pk', flat=True))
+    if dry_run:
+        return len(missing)
+
+    ShuffleRank.objects.bulk_create([
+        ShuffleRank(photo_id=pk, slot=slot, rank=get_rank(slot, pk))
+        for pk in missing for slot in range(SLOTS)
+    ], ignore_conflicts=True, batch_size=1000)
+    return len(missing)
@@ -0,0 +1,252 @@
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver, Signal
+
+from .cachefiles import get_stored_url
+from .collection_slugs import invalidate_slugs
+from .counters import adjust_counts, adjust_month_count, recount, recount_months
+from .geo import get_geohash, read_gps_coordinates
+from .models import Collection, Country, Photo, PhotoFeatures
+from .search import invalidate_results
+from .shuffle import create_shuffle_ranks
+from .similarity import update_features
+
+
+# Keep the denormalised Collection, Country, and monthly photo counters, Photo thumbnail URLs,
+# geohashes, feature vectors, shuffle ranks, published Collection slugs, and cached search
+# results up to date
+# https://docs.djangoproject.com/en/5.2/topics/signals/
+# https://docs.djangoproject.com/en/5.2/ref/signals/#m2m-changed
+
+# Sent once after Photos are changed in bulk (see `bulk.py`), since `QuerySet.update()` and
+# through model inserts/deletes don't send `post_save` or `m2m_changed` signals
+# Arguments: `photo_pks` (list), `fields` (set of changed field names), and `collection_pks`
+# (list of Collections which Photos were added to or removed from, if applicable)
+photos_bulk_changed = Signal()
+
+
+@receiver(connection_created)
+def register_sqlite_lower(sender, connection, **kwargs):
+    """Replace SQLite's `LOWER()`, which only lowercases ASCII characters, with Python's (as
+    used by other databases), so that `Lower()` comparisons (e.g. in `search.py`) match."""
+    if connection.vendor == 'sqlite':
+        connection.connection.create_function(
+            'LOWER', 1, lambda value: None if value is None else str(value).lower(),
+            deterministic=True)
+
+
+@receiver(pre_save, sender=Photo)
+def store_previous_photo_state(sender, instance, raw=False, **kwargs):
+    """Record the `published`, `country`, `date_taken`, and `large_image` DB values (if any)."""
+    instance._previous_state = None
+    if raw or instance.pk is None:
+        return
+
+    instance._previous_state = Photo.objects.filter(pk=instance.pk) \
+                                            .values('published', 'country_id', 'date_taken',
+                                                    'large_image') \
+                                            .first()
+
+
+@receiver(pre_save, sender=Photo)
+def set_photo_coordinates(sender, instance, raw=False, **kwargs):
+    """Fill blank coordinates from a newly uploaded image's EXIF GPS data and set the geohash.
+
+    This runs before the image field's `pre_save()` processes (and commits) the upload, which
+    removes its EXIF data.
+    """
+    if raw:
+        return
+
+    image = instance.large_image
+    if (instance.latitude is None or instance.longitude is None) and image \
+            and not image._committed:
+        coordinates = read_gps_coordinates(image.file)
+        if coordinates:
+            instance.latitude, instance.longitude = coordinates
+
+    instance.geohash = get_geohash(instance.latitude, instance.longitude)
+
+
+@receiver(post_save, sender=Photo)
+def update_counts_on_save(sender, instance, created, raw=False, **kwargs):
+    """Update counters if a Photo was created or its `published`, `country`, or `date_taken`
+    value changed.
+    """
+    if raw:
+        return
+
+    published = int(instance.published)
+    previous = getattr(instance, '_previous_state', None)
+    # The value assigned may be a string (e.g. '2022-01-01')
+    date_taken = Photo._meta.get_field('date_taken').to_python(instance.date_taken)
+    with transaction.atomic():
+        if created or previous is None:
+            adjust_counts(Country, [instance.country_id], total=1, published=published)
+            adjust_month_count(date_taken, published)
+            return
+
+        was_published = int(previous['published'])
+        previous_date = previous['date_taken']
+        if (previous_date.year, previous_date.month) != (date_taken.year, date_taken.month):
+            adjust_month_count(previous_date, -was_published)
+            adjust_month_count(date_taken, published)
+        else:
+            adjust_month_count(date_taken, published - was_published)
+
+        if previous['country_id'] != instance.country_id:
+            adjust_counts(Country, [previous['country_id']], total=-1, published=-was_published)
+            adjust_counts(Country, [instance.country_id], total=1, published=published)
+        else:
+            adjust_counts(Country, [instance.country_id], published=published - was_published)
+
+        if published != was_published:
+            collection_pks = instance.collections.values_list('pk', flat=True)
+            adjust_counts(Collection, collection_pks, published=published - was_published)
+
+
+@receiver(post_save, sender=Photo)
+def store_thumbnail_url(sender, instance, raw=False, **kwargs):
+    """Store the thumbnail URL if the Photo is new or the image has changed.
+
+    Resolving the URL generates the thumbnail (if it doesn't already exist). If it isn't ready,
+    the URL is left empty, so it's resolved when displayed (and stored on the next save).
+    """
+    if raw:
+        return
+
+    previous = getattr(instance, '_previous_state', None)
+    if instance.thumbnail_url and previous and previous['large_image'] == instance.large_image.name:
+        return
+
+    instance.thumbnail_url = get_stored_url(instance.thumbnail)
+    Photo.objects.filter(pk=instance.pk).update(thumbnail_url=instance.thumbnail_url)
+
+
+@receiver(post_save, sender=Photo)
+def update_features_on_save(sender, instance, created, raw=False, **kwargs):
+    """Compute the Photo's feature vector (for similar photos) if the image is new or changed."""
+    if raw:
+        return
+
+    previous = getattr(instance, '_previous_state', None)
+    if not created and previous and previous['large_image'] == instance.large_image.name \
+            and PhotoFeatures.objects.filter(photo=instance).exists():
+        return
+
+    update_features(instance)
+
+
+@receiver(post_save, sender=Photo)
+def create_shuffle_ranks_on_save(sender, instance, created, raw=False, **kwargs):
+    """Create the shuffle ranks of a new Photo (deleted along with the Photo).
+
+    Also created for raw saves (e.g. `loaddata`), since Photos without ranks aren't listed by
+    the shuffle ordering (any ranks included in the fixture are kept).
+    """
+    if created:
+        create_shuffle_ranks([instance.pk])
+
+
+@receiver(post_save, sender=Photo)
+@receiver(post_delete, sender=Photo)
+def invalidate_search_results(sender, raw=False, **kwargs):
+    """Replace the cached search results once the Photo change is committed."""
+    if not raw:
+        invalidate_results()
+
+
+@receiver(post_save, sender=Collection)
+@receiver(post_delete, sender=Collection)
+def invalidate_collection_slugs(sender, **kwargs):
+    """Reload the sets of published Collection slugs (see `collection_slugs.py`)."""
+    invalidate_slugs()
+
+
+@receiver(pre_delete, sender=Photo)
+def store_deleted_photo_collections(sender, instance, **kwargs):
+    """Record the Photo's collections before the memberships are deleted (without m2m signals)."""
+    instance._deleted_collection_pks = list(instance.collections.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Photo)
+def update_counts_on_delete(sender, instance, **kwargs):
+    published = int(instance.published)
+    with transaction.atomic():
+        adjust_counts(Country, [instance.country_id], total=-1, published=-published)
+        adjust_month_count(instance.date_taken, -published)
+        adjust_counts(Collection, getattr(instance, '_deleted_collection_pks', []),
+                      total=-1, published=-published)
+
+
+@receiver(m2m_changed, sender=Photo.collections.through)
+def update_counts_on_collections_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """Update Collection counters when Photos are added to or removed from Collections.
+
+    `instance` is a Photo (with Collection `pk_set`) unless `reverse` is True, in which case
+    `instance` is a Collection (with Photo `pk_set`).
+    """
+    if action == 'pre_clear':
+        # `pk_set` is None for clear actions, so record the related objects beforehand
+        if reverse:
+            instance._cleared_photo_pks = list(instance.photo_set.values_list('pk', flat=True))
+        else:
+            instance._cleared_collection_pks = list(
+                instance.collections.values_list('pk', flat=True))
+        return
+
+    if action == 'pre_remove':
+        # `pk_set` includes objects which aren't related (unlike for `post_add`), so record the
+        # related objects which will actually be removed
+        if reverse:
+            related = instance.photo_set.filter(pk__in=pk_set)
+        else:
+            related = instance.collections.filter(pk__in=pk_set)
+        instance._removed_pks = list(related.values_list('pk', flat=True))
+        return
+
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if action == 'post_remove':
+        pk_set = instance._removed_pks
+
+    sign = 1 if action == 'post_add' else -1
+    with transaction.atomic():
+        if reverse:
+            photo_pks = pk_set if action != 'post_clear' else instance._cleared_photo_pks
+            published = Photo.objects.filter(pk__in=photo_pks, published=True).count()
+            adjust_counts(Collection, [instance.pk], total=sign * len(photo_pks),
+                          published=sign * published)
+        else:
+            collection_pks = pk_set if action != 'post_clear' else instance._cleared_collection_pks
+            adjust_counts(Collection, collection_pks, total=sign,
+                          published=sign * int(instance.published))
+
+
+@receiver(photos_bulk_changed)
+def update_counts_on_bulk_change(sender, photo_pks, fields, collection_pks=(), **kwargs):
+    """Recount the Collections, Countries, and months affected by a bulk change."""
+    if not fields & {'published', 'collections'}:
+        return
+
+    memberships = Photo.collections.through.objects.filter(photo_id__in=photo_pks)
+    collection_pks = set(collection_pks)
+    collection_pks.update(memberships.values_list('collection_id', flat=True))
+    recount(Collection, collection_pks)
+
+    if 'published' in fields:
+        country_pks = Photo.objects.filter(pk__in=photo_pks, country__isnull=False) \
+                                   .values_list('country_id', flat=True)
+        recount(Country, set(country_pks))
+
+        dates = Photo.objects.filter(pk__in=photo_pks).values_list('date_taken', flat=True)
+        recount_months({(date.year, date.month) for date in dates})
+
+
+@receiver(photos_bulk_changed)
+def invalidate_search_results_on_bulk_change(sender, fields, **kwargs):
+    # Search results don't depend on Collection memberships
+    if fields - {'collections'}:
+        invalidate_results()
@@ -0,0 +1,212 @@
+import datetime
+import logging
+import math
+import os
+import struct
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from PIL import Image
+
+from .models import PhotoFeatures
+
+try:
+    import numpy as np
+except ImportError:  # Optional dependency (`pip install .[similarity]`)
+    np = None
+
+
+# Visually similar photos, based on a feature vector computed from each Photo's thumbnail
+#
+# Each vector combines an HSV colour histogram (the Hellinger/square root form, so the dot
+# product of two histograms measures their overlap) and a tiny 8x8 greyscale "layout" embedding.
+# Vectors are stored in the database (PhotoFeatures), computed when a Photo's image is saved.
+#
+# For fast queries, `python manage.py build_similarity_index` writes the vectors of published
+# Photos to a NumPy file (`SIMILARITY_INDEX_PATH`), which each process memory-maps (so the OS
+# shares the pages between processes) and queries using batched cosine similarity (a matrix
+# product, since the vectors are normalised). Vectors saved since the index was built are read
+# from the database and searched alongside it, so the index only needs to be rebuilt
+# periodically (e.g. daily via cron). At most `SIMILARITY_MAX_UNINDEXED` (the most recently
+# updated) vectors are read per query, so without an index (or with a stale one) only recent
+# Photos are searched, rather than every vector being loaded on every request. Queries return no
+# results if NumPy isn't installed.
+
+logger = logging.getLogger(__name__)
+
+HUE_BINS, SATURATION_BINS, VALUE_BINS = 8, 3, 3
+LAYOUT_SIZE = 8  # Width and height of the greyscale layout embedding
+COLOR_WEIGHT = 0.75  # Relative weight of colour (vs. layout) similarity
+VECTOR_SIZE = HUE_BINS * SATURATION_BINS * VALUE_BINS + LAYOUT_SIZE ** 2
+VECTOR_FORMAT = '<{}f'.format(VECTOR_SIZE)  # Little-endian float32 values
+SEARCH_CHUNK_ROWS = 32768  # Index rows scored per matrix product (bounding memory use)
+
+_loaded_index = {'path': None, 'mtime': None, 'index': None}
+
+
+def compute_vector(image):
+    """Return the normalised feature vector (list of floats) of a PIL image."""
+    image = image.convert('RGB')
+    hue, saturation, value = (band.tobytes() for band in image.convert('HSV').split())
+    counts = [0] * (HUE_BINS * SATURATION_BINS * VALUE_BINS)
+    for h, s, v in zip(hue, saturation, value):
+        counts[((h * HUE_BINS >> 8) * SATURATION_BINS + (s * SATURATION_BINS >> 8)) * VALUE_BINS
+               + (v * VALUE_BINS >> 8)] += 1
+    color = [math.sqrt(count / len(hue)) for count in counts]  # Unit length
+
+    layout = list(image.convert('L').resize((LAYOUT_SIZE, LAYOUT_SIZE),
+                                            Image.Resampling.BOX).tobytes())
+    mean = sum(layout) / len(layout)
+    layout = [x - mean for x in layout]
+    layout_norm = math.sqrt(sum(x * x for x in layout)) or 1  # E.g. a uniform image
+
+    vector = [math.sqrt(COLOR_WEIGHT) * x for x in color] + \
+             [math.sqrt(1 - COLOR_WEIGHT) * x / layout_norm for x in layout]
+    norm = math.sqrt(sum(x * x for x in vector))
+    return [x / norm for x in vector]
+
+
+def pack_vector(vector):
+    return struct.pack(VECTOR_FORMAT, *vector)
+
+
+def get_packed_vector(photo):
+    """Return the packed feature vector of a Photo's thumbnail, or None (logging any failure)."""
+    try:
+        photo.thumbnail.generate()
+        with photo.thumbnail.storage.open(photo.thumbnail.name) as f, Image.open(f) as image:
+            return pack_vector(compute_vector(image))
+    except (OSError, ValueError) as exc:
+        logger.warning("Failed to compute the feature vector of %s: %s", photo, exc)
+        return None
+
+
+def update_features(photo):
+    """Compute and store the feature vector of a Photo's thumbnail (logging any failure)."""
+    vector = get_packed_vector(photo)
+    if vector is not None:
+        PhotoFeatures.objects.update_or_create(photo=photo, defaults={'vector': vector})
+
+
+class SimilarityIndex:
+    def __init__(self, ids, vectors, built_at=None):
+        self.ids = ids  # Array of Photo pks
+        self.vectors = vectors  # Array of shape (len(ids), VECTOR_SIZE)
+        self.built_at = built_at  # Datetime (vectors updated after this aren't included)
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Create an in-memory index from (Photo pk, packed vector) rows."""
+        ids = np.array([pk for pk, _ in rows], dtype=np.int64)
+        vectors = np.frombuffer(b''.join(bytes(vector) for _, vector in rows), dtype='<f4')
+        return cls(ids, vectors.reshape(len(rows), VECTOR_SIZE))
+
+    @classmethod
+    def load(cls, path):
+        """Memory-map an index file written by `build_index()`."""
+        array = np.load(path, mmap_mode='r')
+        built_at = datetime.datetime.fromtimestamp(os.stat(path).st_mtime, tz=datetime.UTC)
+        return cls(array['id'], array['vector'], built_at)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def search(self, queries, k, exclude_ids=()):
+        """Return the top `k` (pk, score) pairs for each query vector, most similar first."""
+        queries = np.asarray(queries, dtype=np.float32)
+        exclude_ids = np.fromiter(exclude_ids, dtype=np.int64)
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_ids = np.empty((len(queries), 0), dtype=np.int64)
+        for start in range(0, len(self), SEARCH_CHUNK_ROWS):
+            ids = np.asarray(self.ids[start:start + SEARCH_CHUNK_ROWS])
+            scores = queries @ np.asarray(self.vectors[start:start + SEARCH_CHUNK_ROWS]).T
+            if len(exclude_ids):
+                scores[:, np.isin(ids, exclude_ids)] = -np.inf
+
+            # Keep the top k of the previous best and this chunk
+            best_scores = np.concatenate([best_scores, scores], axis=1)
+            best_ids = np.concatenate([best_ids, np.broadcast_to(ids, scores.shape)], axis=1)
+            if best_scores.shape[1] > k:
+                top = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+                best_scores = np.take_along_axis(best_scores, top, axis=1)
+                best_ids = np.take_along_axis(best_ids, top, axis=1)
+
+        results = []
+        for ids, scores in zip(best_ids, best_scores):
+            order = np.argsort(-scores, kind='stable')
+            results.append([(int(ids[i]), float(scores[i])) for i in order
+                            if scores[i] != -np.inf])
+        return results
+
+
+def build_index(path, batch_size=2000):
+    """Write the vectors of all published Photos to a NumPy file; return the number of rows."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.stem + '.tmp.npy')
+    dtype = np.dtype([('id', '<i8'), ('vector', '<f4', (VECTOR_SIZE,))])
+    start = time.time()
+    with transaction.atomic():  # A consistent snapshot (so the count matches the rows)
+        features = PhotoFeatures.objects.filter(photo__published=True).order_by('photo_id')
+        array = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=dtype,
+                                          shape=(features.count(),))
+        rows = features.values_list('photo_id', 'vector').iterator(chunk_size=batch_size)
+        for i, (pk, vector) in enumerate(rows):
+            array[i] = (pk, np.frombuffer(vector, dtype='<f4'))
+
+    array.flush()
+    count = len(array)
+    del array
+    # The modification time records when the snapshot was taken (see `get_index()`)
+    os.utime(tmp_path, (start, start))
+    os.replace(tmp_path, path)
+    return count
+
+
+def get_index():
+    """Return the memory-mapped index (reloaded if the file has changed), or None if missing."""
+    path = Path(settings.SIMILARITY_INDEX_PATH)
+    try:
+        mtime = os.stat(path).st_mtime
+    except FileNotFoundError:
+        return None
+
+    if _loaded_index['path'] != path or _loaded_index['mtime'] != mtime:
+        _loaded_index.update(path=path, mtime=mtime, index=SimilarityIndex.load(path))
+    return _loaded_index['index']
+
+
+def get_similar_photo_pks(photo_pk, k):
+    """Return the pks of (up to) the `k` Photos most similar to a Photo, most similar first.
+
+    The results may include unpublished or deleted Photos (so request more than required).
+    """
+    if np is None:
+        return []
+
+    vector = PhotoFeatures.objects.filter(photo_id=photo_pk) \
+                                  .values_list('vector', flat=True).first()
+    if vector is None:
+        return []
+
+    query = np.frombuffer(vector, dtype='<f4')[np.newaxis]
+    index = get_index()
+    recent = PhotoFeatures.objects.order_by('-updated')
+    if index is not None:
+        # Vectors updated since the index's snapshot (with some leeway for timestamp precision)
+        recent = recent.filter(updated__gte=index.built_at - datetime.timedelta(seconds=5))
+    limit = getattr(settings, 'SIMILARITY_MAX_UNINDEXED', 1000)
+    recent = list(recent.values_list('photo_id', 'vector')[:limit])
+
+    results = []
+    recent_pks = {pk for pk, _ in recent}
+    if index is not None:
+        results += index.search(query, k, exclude_ids=recent_pks | {photo_pk})[0]
+    if recent:
+        results += SimilarityIndex.from_rows(recent).search(query, k, exclude_ids={photo_pk})[0]
+
+    results.sort(key=lambda result: result[1], reverse=True)
+    return [pk for pk, _ in results[:k]]
+
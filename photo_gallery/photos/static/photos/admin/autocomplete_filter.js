@@ -0,0 +1,18 @@
+'use strict';
+{
+    // Apply an `AutocompleteListFilter` selection by updating the changelist query string
+    const $ = django.jQuery;
+
+    $(function() {
+        $('.autocomplete-list-filter select').on('change', function() {
+            const params = new URLSearchParams(window.location.search);
+            params.delete('p');
+            if (this.value) {
+                params.set(this.name, this.value);
+            } else {
+                params.delete(this.name);
+            }
+            window.location.search = params.toString();
+        });
+    });
+}
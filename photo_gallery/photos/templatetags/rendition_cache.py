@@ -0,0 +1,48 @@
+from django import template
+from django.core.cache import caches, InvalidCacheBackendError
+from django.core.cache.utils import make_template_fragment_key
+from django.templatetags.cache import CacheNode
+
+from photos.cachefiles import get_source_fallback_count
+
+register = template.Library()
+
+
+# A `{% cache %}` tag for fragments containing renditions (e.g. `photo.small_image.url`)
+# https://docs.djangoproject.com/en/5.2/topics/cache/#template-fragment-caching
+#
+# If a rendition wasn't ready (so its source image's URL was used, see `cachefiles.py`), the
+# fragment isn't cached, so the rendition is used on the next request rather than for the
+# cache timeout. Usage: `{% rendition_cache timeout fragment_name [vary_on ...] %}`.
+
+
+class RenditionCacheNode(CacheNode):
+    def render(self, context):
+        expire_time = self.expire_time_var.resolve(context)
+        try:
+            fragment_cache = caches['template_fragments']
+        except InvalidCacheBackendError:
+            fragment_cache = caches['default']
+
+        vary_on = [var.resolve(context) for var in self.vary_on]
+        cache_key = make_template_fragment_key(self.fragment_name, vary_on)
+        value = fragment_cache.get(cache_key)
+        if value is None:
+            fallbacks = get_source_fallback_count()
+            value = self.nodelist.render(context)
+            if get_source_fallback_count() == fallbacks:
+                fragment_cache.set(cache_key, value,
+                                   None if expire_time is None else int(expire_time))
+        return value
+
+
+@register.tag('rendition_cache')
+def do_rendition_cache(parser, token):
+    nodelist = parser.parse(('endrendition_cache',))
+    parser.delete_first_token()
+    tokens = token.split_contents()
+    if len(tokens) < 3:
+        raise template.TemplateSyntaxError(
+            "'{}' tag requires at least 2 arguments.".format(tokens[0]))
+    return RenditionCacheNode(nodelist, parser.compile_filter(tokens[1]), tokens[2],
+                              [parser.compile_filter(t) for t in tokens[3:]], None)
@@ -1,15 +1,40 @@
 import datetime
+import json
+import os
 import shutil
-
+import tarfile
+import tempfile
+import threading
+import time
+from io import BytesIO, StringIO
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core import serializers
 from django.core.exceptions import ValidationError
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
 from django.test import override_settings, RequestFactory, SimpleTestCase, tag, TestCase
 from django.urls import reverse
+from django.utils import timezone
 from pathlib import Path
+from PIL import Image
 
+from photo_gallery import metrics
 from photo_gallery.settings import BASE_DIR
-from .admin import PhotoAdmin
-from .models import Collection, Photo, validate_lowercase
+from .admin import EstimatedCountPaginator, PhotoAdmin
+from .bulk import bulk_update_photos
+from .management.commands.benchmark_views import Command as BenchmarkCommand
+from nav.models import NavLink, NavSection
+from . import collection_slugs, geo, renditions, search, shuffle, similarity
+from .locks import file_lock, get_lock_path, LockTimeout
+from .models import (Collection, Country, MonthlyPhotoCount, Photo, PhotoFeatures, SearchQuery,
+                     ShuffleRank, validate_lowercase)
 
 
 # Deleted at the end of full test runs via TestMediaCleanup()
@@ -32,13 +57,14 @@ def create_uploaded_file_object(image_path):
 
 def create_photo(slug, title="Photo", description="Description", location="Location",
                  date_taken=datetime.date(2022, 1, 1), featured=False, published=True,
-                 collections=None):
+                 collections=None, latitude=None, longitude=None):
 
     large_img_path = Path(__file__).resolve().parent / 'test_images/2500x1500.jpg'
     mock_large_upload = create_uploaded_file_object(large_img_path)
 
     photo = Photo.objects.create(slug=slug, title=title, description=description, location=location,
                                  date_taken=date_taken, featured=featured, published=published,
+                                 latitude=latitude, longitude=longitude,
                                  large_image=mock_large_upload)
 
     if collections is not None:
@@ -93,15 +119,223 @@ class PhotoAdminTests(TestCase):
         photo_admin = MockPhotoAdmin()
         fields = photo_admin.get_fields(self.request)
         self.assertEqual(fields, ['large_image', 'title', 'slug', 'description', 'location',
-                                  'country', 'date_taken', 'collections', 'featured', 'published'])
+                                  'country', 'latitude', 'longitude', 'date_taken',
+                                  'collections', 'featured', 'published'])
 
     def test_get_fields_change(self):
         """Test that `thumbnail_img_tag` is included in change view `fields`"""
         photo_admin = MockPhotoAdmin()
         fields = photo_admin.get_fields(self.request, obj=create_photo(slug="test"))
         self.assertEqual(fields, ['large_image', 'thumbnail_img_tag', 'title', 'slug',
-                                  'description', 'location', 'country', 'date_taken',
-                                  'collections', 'featured', 'published'])
+                                  'description', 'location', 'country', 'latitude',
+                                  'longitude', 'date_taken', 'collections', 'featured',
+                                  'published'])
+
+
+@tag('photos', 'admin')
+@override_settings(MEDIA_ROOT=TEST_MEDIA_DIR, SECURE_SSL_REDIRECT=False)
+class PhotoAdminChangelistTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        """Set up data for all tests in this class."""
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_stored_thumbnail_url(self):
+        """Test that the thumbnail URL is stored when a Photo is created."""
+        photo = create_photo(slug="test")
+        photo.refresh_from_db()
+        self.assertEqual(photo.thumbnail_url, photo.thumbnail.url)
+
+    def test_changelist_lazy_thumbnails(self):
+        """Test that the changelist includes lazily loaded thumbnails using the stored URL."""
+        photo = create_photo(slug="test")
+        response = self.client.get(reverse("admin:photos_photo_changelist"))
+        self.assertContains(response, '<img src="{}" loading="lazy" />'.format(photo.thumbnail_url))
+
+    def test_autocomplete_filter_selected_only(self):
+        """Test that the collections filter only renders the selected Collection option."""
+        col1 = Collection.objects.create(name="Selected Col", slug="col-1")
+        Collection.objects.create(name="Other Col", slug="col-2")
+        response = self.client.get(reverse("admin:photos_photo_changelist"),
+                                   {"collections__id__exact": col1.pk})
+        self.assertContains(response, "Selected Col")
+        self.assertNotContains(response, "Other Col")
+        self.assertContains(response, 'data-field-name="collections"')
+
+    def test_estimated_count(self):
+        """Test that the paginator uses the estimated count for an unfiltered queryset."""
+        create_photo(slug="deleted").delete()
+        create_photo(slug="test")
+        paginator = EstimatedCountPaginator(Photo.objects.order_by('pk'), 10)
+        paginator.estimate_threshold = 0
+        # SQLite's estimate (the largest rowid) includes deleted rows
+        self.assertEqual(paginator.count, 2)
+
+    def test_exact_filtered_count(self):
+        """Test that the paginator uses an exact count for a filtered queryset."""
+        create_photo(slug="deleted").delete()
+        create_photo(slug="test")
+        paginator = EstimatedCountPaginator(Photo.objects.filter(published=True).order_by('pk'), 10)
+        paginator.estimate_threshold = 0
+        self.assertEqual(paginator.count, 1)
+
+
+@tag('photos', 'admin', 'actions')
+@override_settings(MEDIA_ROOT=TEST_MEDIA_DIR, SECURE_SSL_REDIRECT=False)
+class PhotoAdminActionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        """Set up data for all tests in this class."""
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def post_action(self, action, photos, **data):
+        data.update({'action': action, '_selected_action': [p.pk for p in photos]})
+        return self.client.post(reverse("admin:photos_photo_changelist"), data, follow=True)
+
+    def test_unpublish_action(self):
+        """Test that the unpublish action updates Photos, `last_modified`, and counters."""
+        col = Collection.objects.create(name="Col", slug="col")
+        photos = [create_photo(slug="p1", collections=[col]), create_photo(slug="p2")]
+        previous_modified = Photo.objects.get(slug="p1").last_modified
+        self.post_action('unpublish', photos)
+        self.assertFalse(Photo.objects.filter(published=True).exists())
+        self.assertGreater(Photo.objects.get(slug="p1").last_modified, previous_modified)
+        col.refresh_from_db()
+        self.assertEqual((col.photo_count, col.published_photo_count), (1, 0))
+
+    def test_feature_action(self):
+        """Test that the feature action updates the selected Photos only."""
+        photos = [create_photo(slug="p1"), create_photo(slug="p2")]
+        create_photo(slug="p3")
+        self.post_action('feature', photos)
+        self.assertQuerySetEqual(Photo.objects.filter(featured=True).order_by('slug'), photos)
+
+    def test_add_to_collection_action(self):
+        """Test that the add to collection action adds Photos and updates counters."""
+        col = Collection.objects.create(name="Col", slug="col")
+        existing = create_photo(slug="p1", collections=[col])
+        new = create_photo(slug="p2", published=False)
+        self.post_action('add_to_collection', [existing, new], collection=col.pk)
+        self.assertQuerySetEqual(col.photo_set.order_by('slug'), [existing, new])
+        col.refresh_from_db()
+        self.assertEqual((col.photo_count, col.published_photo_count), (2, 1))
+
+    def test_remove_from_collection_action(self):
+        """Test that the remove from collection action removes Photos and updates counters."""
+        col = Collection.objects.create(name="Col", slug="col")
+        removed = create_photo(slug="p1", collections=[col])
+        kept = create_photo(slug="p2", collections=[col])
+        self.post_action('remove_from_collection', [removed], collection=col.pk)
+        self.assertQuerySetEqual(col.photo_set.all(), [kept])
+        col.refresh_from_db()
+        self.assertEqual((col.photo_count, col.published_photo_count), (1, 1))
+
+    def test_collection_action_requires_collection(self):
+        """Test that a collection action without a selected Collection doesn't change Photos."""
+        col = Collection.objects.create(name="Col", slug="col")
+        photo = create_photo(slug="p1")
+        response = self.post_action('add_to_collection', [photo], collection='')
+        self.assertFalse(col.photo_set.exists())
+        self.assertContains(response, "Select a collection to apply this action.")
+
+
+@tag('photos', 'models', 'counters')
+@override_settings(MEDIA_ROOT=TEST_MEDIA_DIR, SECURE_SSL_REDIRECT=False)
+class PhotoCounterTests(TestCase):
+    def assertCounts(self, obj, total, published):
+        obj.refresh_from_db()
+        self.assertEqual((obj.photo_count, obj.published_photo_count), (total, published))
+
+    def test_collection_add_counts(self):
+        """Test that adding Photos to a Collection increments its counters."""
+        col = Collection.objects.create(name="Col", slug="col")
+        create_photo(slug="published", published=True, collections=[col])
+        create_photo(slug="unpublished", published=False, collections=[col])
+        self.assertCounts(col, 2, 1)
+
+    def test_collection_reverse_add_and_clear_counts(self):
+        """Test that adding and clearing Photos via `Collection.photo_set` updates its counters."""
+        col = Collection.objects.create(name="Col", slug="col")
+        col.photo_set.add(create_photo(slug="p1"), create_photo(slug="p2", published=False))
+        self.assertCounts(col, 2, 1)
+        col.photo_set.clear()
+        self.assertCounts(col, 0, 0)
+
+    def test_collection_remove_counts(self):
+        """Test that removing a Photo from a Collection decrements its counters."""
+        col1 = Collection.objects.create(name="Col 1", slug="col-1")
+        col2 = Collection.objects.create(name="Col 2", slug="col-2")
+        photo = create_photo(slug="photo", collections=[col1, col2])
+        photo.collections.set([col2])
+        self.assertCounts(col1, 0, 0)
+        self.assertCounts(col2, 1, 1)
+
+    def test_collection_remove_non_member_counts(self):
+        """Test that removing a Photo from a Collection it isn't in doesn't change the counters."""
+        col = Collection.objects.create(name="Col", slug="col")
+        create_photo(slug="member", collections=[col])
+        non_member = create_photo(slug="non-member")
+        non_member.collections.remove(col)
+        col.photo_set.remove(non_member)
+        self.assertCounts(col, 1, 1)
+
+    def test_unpublish_counts(self):
+        """Test that unpublishing a Photo decrements the published counters only."""
+        col = Collection.objects.create(name="Col", slug="col")
+        country = Country.objects.create(name="Country")
+        photo = create_photo(slug="photo", collections=[col])
+        photo.country = country
+        photo.save()
+        photo.published = False
+        photo.save()
+        self.assertCounts(col, 1, 0)
+        self.assertCounts(country, 1, 0)
+
+    def test_country_change_counts(self):
+        """Test that changing a Photo's Country moves the count between Countries."""
+        country1 = Country.objects.create(name="Country 1")
+        country2 = Country.objects.create(name="Country 2")
+        photo = create_photo(slug="photo")
+        photo.country = country1
+        photo.save()
+        photo.country = country2
+        photo.save()
+        self.assertCounts(country1, 0, 0)
+        self.assertCounts(country2, 1, 1)
+
+    def test_delete_counts(self):
+        """Test that deleting a Photo decrements its Collection and Country counters."""
+        col = Collection.objects.create(name="Col", slug="col")
+        country = Country.objects.create(name="Country")
+        photo = create_photo(slug="photo", collections=[col])
+        photo.country = country
+        photo.save()
+        photo.delete()
+        self.assertCounts(col, 0, 0)
+        self.assertCounts(country, 0, 0)
+
+    def test_recount_command(self):
+        """Test that `manage.py recount` repairs counters that have drifted."""
+        col = Collection.objects.create(name="Col", slug="col")
+        create_photo(slug="photo", collections=[col])
+        Collection.objects.update(photo_count=5, published_photo_count=0)
+        out = StringIO()
+        call_command('recount', stdout=out)
+        self.assertCounts(col, 1, 1)
+        self.assertIn("1 collections with incorrect counters repaired", out.getvalue())
+
+    def test_recount_command_dry_run(self):
+        """Test that `manage.py recount --dry-run` doesn't update drifted counters."""
+        col = Collection.objects.create(name="Col", slug="col")
+        Collection.objects.update(photo_count=5)
+        call_command('recount', '--dry-run', stdout=StringIO())
+        self.assertCounts(col, 5, 0)
 
 
 @tag('photos', 'views', 'photo_detail')
@@ -168,6 +402,319 @@ class PhotoDetailViewTests(TestCase):
         self.assertNotContains(response, "Collections:")
 
 
+@tag('photos', 'views', 'renditions')
+@override_settings(MEDIA_ROOT=TEST_MEDIA_DIR, SECURE_SSL_REDIRECT=False,
+                   IMAGE_RENDITION_WIDTHS=[320, 800],
+                   IMAGE_RENDITION_FORMATS={'jpg': 'JPEG', 'webp': 'WEBP'})
+class ResizedImageViewTests(TestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.cache_dir = Path(tmp_dir.name)
+        settings_override = self.settings(IMAGE_CACHE_DIR=self.cache_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def get_image(self, slug, width, extension, **headers):
+        url = reverse('resized_image', kwargs={'slug': slug, 'width': width,
+                                               'extension': extension})
+        return self.client.get(url, headers=headers)
+
+    def test_resized_image(self):
+        """Test that an allowed width and format returns a resized, cacheable image."""
+        create_photo(slug="resized")
+        response = self.get_image("resized", 320, 'webp')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=3600')
+        self.assertNotIn('immutable', response['Cache-Control'])
+        self.assertTrue(response.has_header('ETag'))
+        with Image.open(BytesIO(b''.join(response.streaming_content))) as image:
+            self.assertEqual((image.format, image.width), ('WEBP', 320))
+
+    def test_rendition_cached(self):
+        """Test that a rendition is only generated by the first request."""
+        create_photo(slug="cached")
+        with patch('photos.renditions.Rendition.generate') as generate:
+            generate.return_value = BytesIO(b'image')
+            self.get_image("cached", 800, 'jpg')
+            response = self.get_image("cached", 800, 'jpg')
+
+        self.assertEqual(generate.call_count, 1)
+        self.assertEqual(b''.join(response.streaming_content), b'image')
+
+    def test_rendition_not_modified(self):
+        """Test that a request with the rendition's ETag returns a 304 without opening it."""
+        create_photo(slug="not-modified")
+        etag = self.get_image("not-modified", 320, 'jpg')['ETag']
+        with patch('photos.views.open_rendition') as open_rendition:
+            response = self.get_image("not-modified", 320, 'jpg', if_none_match=etag)
+
+        self.assertEqual(response.status_code, 304)
+        open_rendition.assert_not_called()
+
+    def test_rendition_evicted_after_lookup(self):
+        """Test that a rendition evicted by another request while being served is still served."""
+        photo = create_photo(slug="evicted")
+        path = renditions.get_cache_path(photo.large_image.name, 320, 'jpg')
+        self.get_image("evicted", 320, 'jpg')
+        with patch('photos.renditions.os.utime', side_effect=lambda p: os.unlink(p)):
+            response = self.get_image("evicted", 320, 'jpg')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(path.exists())
+        with Image.open(BytesIO(b''.join(response.streaming_content))) as image:
+            self.assertEqual(image.width, 320)
+
+    def test_rendition_evicted_before_lookup(self):
+        """Test that a rendition evicted by another request is generated again."""
+        photo = create_photo(slug="regenerated")
+        path = renditions.get_cache_path(photo.large_image.name, 320, 'jpg')
+        self.get_image("regenerated", 320, 'jpg')
+        path.unlink()
+        response = self.get_image("regenerated", 320, 'jpg')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(path.exists())
+
+    def test_eviction_throttled(self):
+        """Test that the cache size is only checked once per eviction interval."""
+        create_photo(slug="throttled")
+        with patch('photos.renditions.evict', return_value=0) as evict:
+            self.get_image("throttled", 320, 'jpg')
+            self.get_image("throttled", 800, 'jpg')
+        self.assertEqual(evict.call_count, 1)
+
+    def test_unsupported_width_or_format(self):
+        """Test that widths and formats which aren't allowed return a 404 status code."""
+        create_photo(slug="unsupported")
+        self.assertEqual(self.get_image("unsupported", 321, 'jpg').status_code, 404)
+        self.assertEqual(self.get_image("unsupported", 320, 'gif').status_code, 404)
+
+    def test_unpublished_photo(self):
+        """Test that an unpublished Photo's image returns a 404 status code."""
+        create_photo(slug="unpublished", published=False)
+        self.assertEqual(self.get_image("unpublished", 320, 'jpg').status_code, 404)
+
+    def test_generation_lock_timeout(self):
+        """Test that a 503 is returned if another request is still generating the rendition."""
+        photo = create_photo(slug="locked")
+        path = renditions.get_cache_path(photo.large_image.name, 320, 'jpg')
+        with override_settings(IMAGE_RENDITION_LOCK_TIMEOUT=0.1):
+            # Locks are held per open file (so this conflicts with the request's lock)
+            with file_lock(get_lock_path(self.cache_dir / 'locks', path.name)):
+                response = self.get_image("locked", 320, 'jpg')
+
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(path.exists())
+
+    def test_lru_eviction(self):
+        """Test that the least recently used renditions are deleted when over the quota."""
+        paths = []
+        for i in range(4):
+            path = self.cache_dir / 'ab' / '{}.jpg'.format(i)
+            path.parent.mkdir(exist_ok=True)
+            path.write_bytes(b'x' * 100)
+            os.utime(path, (1000 + i, 1000 + i))
+            paths.append(path)
+        os.utime(paths[0], (2000, 2000))  # Recently used
+
+        self.assertEqual(renditions.evict(self.cache_dir, max_bytes=300), 2)
+        self.assertEqual([path.exists() for path in paths], [True, False, False, True])
+        self.assertEqual(renditions.evict(self.cache_dir, max_bytes=300), 0)
+
+
+@tag('photos', 'renditions')
+@override_settings(MEDIA_ROOT=TEST_MEDIA_DIR, SECURE_SSL_REDIRECT=False)
+class RenditionLockTests(TestCase):
+    def get_contention_count(self, result):
+        values = metrics.collect().get('gallery_rendition_lock_contention_total', {})
+        return values.get(json.dumps({'result': result}), 0)
+
+    def get_lock_path(self, cache_file):
+        return get_lock_path(settings.RENDITION_LOCK_DIR, cache_file.name)
+
+    @override_settings(METRICS_DIR=None)
+    def test_lock_timeout(self):
+        """Test that a rendition isn't generated while another worker holds its lock, and that
+        the source image's URL is used instead."""
+        photo = create_photo(slug="lock-timeout")
+        timeouts = self.get_contention_count('timeout')
+        with override_settings(RENDITION_LOCK_TIMEOUT=0.1):
+            with file_lock(self.get_lock_path(photo.small_image)):
+                url = photo.small_image.url
+
+        self.assertEqual(url, photo.large_image.url)
+        self.assertFalse(photo.small_image.storage.exists(photo.small_image.name))
+        self.assertNotEqual(photo.small_image.url, photo.large_image.url)
+        self.assertEqual(self.get_contention_count('timeout'), timeouts + 1)
+
+    @override_settings(METRICS_DIR=None)
+    def test_wait_for_other_worker(self):
+        """Test that a worker which waited for the lock uses the other worker's rendition."""
+        photo = create_photo(slug="lock-wait")
+        cache_file = photo.small_image
+        waited = self.get_contention_count('waited')
+        with file_lock(self.get_lock_path(cache_file)):
+            thread = threading.Thread(target=cache_file.cachefile_backend.generate_now,
+                                      args=(cache_file,))
+            thread.start()
+            time.sleep(0.1)
+            # Generate the rendition as the other worker (which holds the lock)
+            cache_file.cachefile_backend.generate_locked(cache_file)
+
+        thread.join()
+        self.assertEqual(self.get_contention_count('waited'), waited + 1)
+
+
+@tag('photos', 'similarity')
+@override_settings(MEDIA_ROOT=TEST_MEDIA_DIR, SECURE_SSL_REDIRECT=False)
+class SimilarPhotosTests(TestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        settings_override = self.settings(
+            SIMILARITY_INDEX_PATH=Path(tmp_dir.name) / 'similarity.npy')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_compute_vector(self):
+        """Test that vectors are normalised and similar colours have more similar vectors."""
+        red, dark_red, blue = (similarity.compute_vector(Image.new('RGB', (60, 40), color))
+                               for color in ((220, 20, 20), (200, 30, 30), (20, 20, 220)))
+        self.assertEqual(len(red), similarity.VECTOR_SIZE)
+        self.assertAlmostEqual(sum(x * x for x in red), 1, places=5)
+        dot = lambda a, b: sum(x * y for x, y in zip(a, b))  # noqa: E731
+        self.assertGreater(dot(red, dark_red), dot(red, blue))
+
+    def test_features_computed_on_save(self):
+        """Test that a Photo's feature vector is stored when it's created."""
+        photo = create_photo(slug="features")
+        vector = PhotoFeatures.objects.get(photo=photo).vector
+        self.assertEqual(len(vector), similarity.VECTOR_SIZE * 4)
+
+    @skipUnless(similarity.np, "NumPy isn't installed")
+    def test_search_chunks(self):
+        """Test that searching in chunks returns the same results as scoring every vector."""
+        rng = similarity.np.random.default_rng(0)
+        vectors = rng.random((50, similarity.VECTOR_SIZE), dtype=similarity.np.float32)
+        vectors /= similarity.np.linalg.norm(vectors, axis=1, keepdims=True)
+        index = similarity.SimilarityIndex(similarity.np.arange(1, 51), vectors)
+        expected = index.search(vectors[:3], 5, exclude_ids={1})
+        with patch('photos.similarity.SEARCH_CHUNK_ROWS', 7):
+            results = index.search(vectors[:3], 5, exclude_ids={1})
+        self.assertEqual([[pk for pk, _ in result] for result in results],
+                         [[pk for pk, _ in result] for result in expected])
+        self.assertEqual(len(expected[0]), 5)
+        self.assertNotIn(1, [pk for pk, _ in expected[0]])
+        self.assertEqual(expected[1][0][0], 2)  # Most similar to itself
+
+    @skipUnless(similarity.np, "NumPy isn't installed")
+    def test_similar_photos_in_detail_view(self):
+        """Test that similar published Photos (from the index or newer) are displayed."""
+        create_photo(slug="similar-1")
+        create_photo(slug="similar-unpublished", published=False)
+        call_command('build_similarity_index', stdout=StringIO())
+        PhotoFeatures.objects.update(updated=timezone.now() - datetime.timedelta(minutes=1))
+        create_photo(slug="similar-2")  # Saved after the index was built
+
+        response = self.client.get(reverse("photo_detail", kwargs={"slug": "similar-1"}))
+        self.assertEqual([photo.slug for photo in response.context['similar_photos']],
+                         ["similar-2"])
+        self.assertContains(response, "Similar photos")
+
+    @skipUnless(similarity.np, "NumPy isn't installed")
+    @override_settings(SIMILARITY_MAX_UNINDEXED=2)
+    def test_similar_photos_without_index(self):
+        """Test that only the most recently updated vectors are loaded if there's no index."""
+        for i in range(4):
+            create_photo(slug="unindexed-{}".format(i))
+        with patch.object(similarity.SimilarityIndex, 'from_rows',
+                          wraps=similarity.SimilarityIndex.from_rows) as from_rows:
+            response = self.client.get(reverse("photo_detail", kwargs={"slug": "unindexed-0"}))
+
+        rows = from_rows.call_args.args[0]
+        self.assertEqual(len(rows), 2)
+        self.assertEqual([photo.slug for photo in response.context['similar_photos']],
+                         ["unindexed-3", "unindexed-2"])
+
+    def test_no_similar_photos(self):
+        """Test that the similar photos section isn't displayed without similar Photos."""
+        create_photo(slug="only-photo")
+        response = self.client.get(reverse("photo_detail", kwargs={"slug": "only-photo"}))
+        self.assertEqual(response.context['similar_photos'], [])
+        self.assertNotContains(response, "Similar photos")
+
+
+@tag('photos', 'geo')
+@override_settings(MEDIA_ROOT=TEST_MEDIA_DIR, SECURE_SSL_REDIRECT=False)
+class PhotoMapTests(TestCase):
+    def get_markers(self, bbox, zoom):
+        response = self.client.get(reverse("photo_map_markers"), {'bbox': bbox, 'zoom': zoom})
+        self.assertEqual(response.status_code, 200)
+        return response.json()['markers']
+
+    def test_encode_geohash(self):
+        """Test that coordinates are encoded as standard geohashes."""
+        self.assertEqual(geo.encode_geohash(57.64911, 10.40744, 11), "u4pruydqqvj")
+        self.assertEqual(geo.encode_geohash(-33.8688, 151.2093, 5), "r3gx2")
+
+    def test_coordinates_from_exif(self):
+        """Test that blank coordinates are filled from an uploaded image's GPS data."""
+        exif = Image.Exif()
+        exif.get_ifd(geo.GPS_IFD).update({1: 'N', 2: (51.0, 30.0, 0.0),
+                                          3: 'W', 4: (0.0, 7.0, 30.0)})
+        buffer = BytesIO()
+        Image.new('RGB', (100, 80)).save(buffer, 'JPEG', exif=exif)
+        upload = SimpleUploadedFile('gps.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+        photo = Photo.objects.create(slug="exif-gps", title="Title", description="Description",
+                                     location="London", date_taken=datetime.date(2022, 1, 1),
+                                     large_image=upload)
+        self.assertAlmostEqual(photo.latitude, 51.5)
+        self.assertAlmostEqual(photo.longitude, -0.125)
+        self.assertEqual(Photo.objects.get(pk=photo.pk).geohash, geo.encode_geohash(51.5, -0.125))
+
+    def test_geohash_updated_on_save(self):
+        """Test that the geohash follows a Photo's coordinates (and is blank without them)."""
+        photo = create_photo(slug="no-coordinates")
+        self.assertEqual(photo.geohash, "")
+        photo.latitude, photo.longitude = 48.8566, 2.3522
+        photo.save()
+        self.assertTrue(Photo.objects.get(pk=photo.pk).geohash.startswith("u09t"))
+
+    def test_clustered_markers(self):
+        """Test that nearby published Photos are clustered at low zoom levels only."""
+        create_photo(slug="paris-1", latitude=48.8566, longitude=2.3522)
+        create_photo(slug="paris-2", latitude=48.8606, longitude=2.3376)
+        create_photo(slug="paris-unpublished", latitude=48.85, longitude=2.35, published=False)
+        create_photo(slug="sydney", latitude=-33.8688, longitude=151.2093)
+        create_photo(slug="no-coordinates")
+
+        markers = self.get_markers("-180,-90,180,90", 3)
+        self.assertEqual(sorted(marker['count'] for marker in markers), [1, 2])
+        sydney = next(marker for marker in markers if marker['count'] == 1)
+        self.assertEqual(sydney['url'], reverse("photo_detail", kwargs={"slug": "sydney"}))
+
+        markers = self.get_markers("2.2,48.8,2.5,48.9", 16)
+        self.assertEqual(sorted(marker['slug'] for marker in markers), ["paris-1", "paris-2"])
+
+    def test_antimeridian_bbox(self):
+        """Test that a bounding box crossing the antimeridian includes both sides."""
+        create_photo(slug="fiji", latitude=-17.7, longitude=178.0)
+        create_photo(slug="samoa", latitude=-13.8, longitude=-172.1)
+        markers = self.get_markers("170,-25,-170,-5", 12)
+        self.assertEqual(sorted(marker['slug'] for marker in markers), ["fiji", "samoa"])
+
+    def test_invalid_parameters(self):
+        """Test that a missing or invalid bounding box or zoom level returns a 400 response."""
+        for params in ({}, {'bbox': "1,2,3"}, {'bbox': "0,10,5,0", 'zoom': 3},
+                       {'bbox': "0,0,5,5", 'zoom': "x"}):
+            response = self.client.get(reverse("photo_map_markers"), params)
+            self.assertEqual(response.status_code, 400)
+
+
 @tag('photos', 'views', 'photo_list')
 @override_settings(MEDIA_ROOT=TEST_MEDIA_DIR, SECURE_SSL_REDIRECT=False)
 class PhotoListViewTests(TestCase):
@@ -236,6 +783,59 @@ class PhotoListViewTests(TestCase):
         expected_qs = [p_unfeatured_old, p_featured_mid, p_unfeatured_new]
         self.assertQuerySetEqual(response.context['photo_list'], expected_qs)
 
+    def test_random_ordering(self):
+        """Test that `random` ordering follows the day's stored shuffle ranks across pages."""
+        create_published_photos(9)
+        slot = shuffle.get_current_slot()
+        expected = sorted(Photo.objects.all(), key=lambda p: (shuffle.get_rank(slot, p.pk), p.pk))
+
+        response = self.client.get(reverse("homepage"), {"sort": "random"})
+        self.assertQuerySetEqual(response.context['photo_list'], expected[:6])
+        self.assertContains(response, "page=2&sort=random&seed={}".format(slot))
+        response = self.client.get(reverse("homepage"), {"sort": "random", "page": 2,
+                                                          "seed": slot})
+        self.assertQuerySetEqual(response.context['photo_list'], expected[6:])
+
+    def test_random_ordering_loaded_photos(self):
+        """Test that Photos loaded from a fixture (raw saves) have shuffle ranks, so they're
+        included in `random` ordering."""
+        create_published_photos(2)
+        photo = Photo(pk=1000, slug="loaded", title="Loaded", description="Description",
+                      location="Location", date_taken=datetime.date(2022, 1, 1),
+                      large_image=Photo.objects.first().large_image.name)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            fixture = Path(tmp_dir) / 'photos.json'
+            fixture.write_text(serializers.serialize('json', [photo]))
+            call_command('loaddata', fixture, verbosity=0)
+
+        self.assertEqual(ShuffleRank.objects.filter(photo_id=1000).count(), shuffle.SLOTS)
+        response = self.client.get(reverse("homepage"), {"sort": "random"})
+        self.assertIn(Photo.objects.get(pk=1000), response.context['photo_list'])
+
+    def test_random_ordering_seed(self):
+        """Test that the `seed` query string selects the shuffle (ignoring invalid values)."""
+        create_published_photos(6)
+        orders = {}
+        for seed in ["0", "1", str(shuffle.get_current_slot()), str(shuffle.SLOTS), "x"]:
+            response = self.client.get(reverse("homepage"), {"sort": "random", "seed": seed})
+            orders[seed] = list(response.context['photo_list'])
+            self.assertEqual(len(orders[seed]), 6)
+
+        self.assertNotEqual(orders["0"], orders["1"])
+        self.assertEqual(orders["x"], orders[str(shuffle.get_current_slot())])
+        self.assertEqual(orders[str(shuffle.SLOTS)], orders["x"])
+
+    def test_shuffle_ranks_created(self):
+        """Test that new Photos have a rank in each shuffle and `recount` creates missing ranks."""
+        photo = create_photo(slug="photo")
+        self.assertEqual(photo.shuffle_ranks.count(), shuffle.SLOTS)
+
+        ShuffleRank.objects.filter(slot=0).delete()
+        out = StringIO()
+        call_command('recount', stdout=out)
+        self.assertEqual(photo.shuffle_ranks.count(), shuffle.SLOTS)
+        self.assertIn("1 photos with missing shuffle ranks repaired", out.getvalue())
+
     def test_paginated_200_status(self):
         """Test that a paginated URL with at least 1 associated Photo returns a 200 status code."""
         # `paginate_by = 6` (6 photos per page)
@@ -251,9 +851,73 @@ class PhotoListViewTests(TestCase):
         self.assertEqual(response.status_code, 404)
 
 
+@tag('photos', 'views', 'photo_list', 'cache')
+@override_settings(MEDIA_ROOT=TEST_MEDIA_DIR, SECURE_SSL_REDIRECT=False)
+class PhotoCardCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_cards_cached_until_modified(self):
+        """Test that photo cards are cached until the Photo is saved (updating `last_modified`)."""
+        photo = create_photo(slug="cached-card", title="Original title")
+        self.assertContains(self.client.get(reverse("homepage")), "Original title")
+
+        # Queryset updates (unlike `save()` and bulk changes) don't update `last_modified`
+        Photo.objects.filter(pk=photo.pk).update(title="Stale title")
+        self.assertContains(self.client.get(reverse("homepage")), "Original title")
+
+        photo.refresh_from_db()
+        photo.title = "New title"
+        photo.save()
+        response = self.client.get(reverse("homepage"))
+        self.assertContains(response, "New title")
+        self.assertNotContains(response, "Original title")
+
+    def test_card_not_cached_with_source_image(self):
+        """Test that a card using the source image (as its small image wasn't ready) isn't cached
+        or stored as the thumbnail URL."""
+        with patch('photos.cachefiles.file_lock', side_effect=LockTimeout):
+            with self.assertLogs('photos.similarity', 'WARNING'):  # The thumbnail isn't ready
+                photo = create_photo(slug="not-ready")
+            response = self.client.get(reverse("homepage"))
+        self.assertEqual(Photo.objects.get(pk=photo.pk).thumbnail_url, '')
+        self.assertContains(response, photo.large_image.url)
+
+        response = self.client.get(reverse("homepage"))
+        self.assertContains(response, photo.small_image.url)
+        self.assertNotContains(response, photo.large_image.url)
+
+    def test_cached_cards_shared_between_pages(self):
+        """Test that cached cards are reused by other listing pages (without rendering them)."""
+        col = Collection.objects.create(name="Col", slug="col")
+        create_photo(slug="shared-1", collections=[col])
+        create_photo(slug="shared-2")
+        self.client.get(reverse("homepage"))
+
+        with patch.object(Photo, 'get_absolute_url') as get_absolute_url:
+            response = self.client.get(reverse("collection", kwargs={"collection_slug": "col"}))
+        get_absolute_url.assert_not_called()
+        self.assertContains(response, reverse("photo_detail", kwargs={"slug": "shared-1"}))
+        self.assertNotContains(response, reverse("photo_detail", kwargs={"slug": "shared-2"}))
+
+    def test_list_changes_with_published_photos(self):
+        """Test that the cached photo list changes when a listed Photo is unpublished."""
+        create_photo(slug="listed")
+        photo = create_photo(slug="unlisted")
+        self.assertContains(self.client.get(reverse("homepage")), "/photos/unlisted")
+        photo.published = False
+        photo.save()
+        self.assertNotContains(self.client.get(reverse("homepage")), "/photos/unlisted")
+
+
 @tag('photos', 'views', 'collection')
 @override_settings(MEDIA_ROOT=TEST_MEDIA_DIR, SECURE_SSL_REDIRECT=False)
 class CollectionViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
     def test_published_collection_status(self):
         """Test that a published Collection returns a 200 status code."""
         col = Collection.objects.create(name="Published Col", slug="test-col", published=True)
@@ -272,6 +936,30 @@ class CollectionViewTests(TestCase):
         response = self.client.get(reverse("collection", kwargs={"collection_slug": "404-slug"}))
         self.assertEqual(response.status_code, 404)
 
+    def test_unknown_slug_without_queries(self):
+        """Test that unknown slugs are rejected (with a cached 404 page) without any queries."""
+        Collection.objects.create(name="Col", slug="col", published=True)
+        self.client.get("/wp-admin")
+        with self.assertNumQueries(0):
+            response = self.client.get("/wp-login")
+        self.assertEqual(response.status_code, 404)
+
+    def test_published_slugs_reloaded(self):
+        """Test that the published slugs are reloaded when a Collection changes."""
+        col = Collection.objects.create(name="Col", slug="col", published=True)
+        self.assertEqual(collection_slugs.get_published_slugs(), {"col"})
+
+        col.published = False
+        col.save()
+        self.assertEqual(collection_slugs.get_published_slugs(), set())
+        self.assertEqual(self.client.get(col.get_absolute_url()).status_code, 404)
+
+        col.published = True
+        col.save()
+        self.assertEqual(self.client.get(col.get_absolute_url()).status_code, 200)
+        col.delete()
+        self.assertEqual(collection_slugs.get_published_slugs(), set())
+
     def test_qs_unpublished_filtering(self):
         """Test that only `published` Photos are included in the collection queryset."""
         col = Collection.objects.create(name="Test Col", slug="test-col", published=True)
@@ -333,9 +1021,85 @@ class CollectionViewTests(TestCase):
         self.assertContains(response, "no photos were found")
 
 
-@tag('photos', 'views', 'search')
+@tag('photos', 'views', 'archive')
 @override_settings(MEDIA_ROOT=TEST_MEDIA_DIR, SECURE_SSL_REDIRECT=False)
+class ArchiveViewTests(TestCase):
+    def assertMonthCounts(self, expected):
+        counts = MonthlyPhotoCount.objects.filter(published_photo_count__gt=0) \
+                                          .values_list('year', 'month', 'published_photo_count')
+        self.assertEqual(list(counts), expected)
+
+    def test_month_counts(self):
+        """Test that monthly counts follow Photo creation, date changes, publishing, and deletes."""
+        photo = create_photo(slug="p1", date_taken=datetime.date(2022, 3, 5))
+        create_photo(slug="p2", date_taken=datetime.date(2022, 3, 20))
+        create_photo(slug="unpublished", date_taken=datetime.date(2022, 3, 1), published=False)
+        self.assertMonthCounts([(2022, 3, 2)])
+
+        photo.date_taken = datetime.date(2023, 1, 1)
+        photo.save()
+        self.assertMonthCounts([(2023, 1, 1), (2022, 3, 1)])
+
+        bulk_update_photos([photo.pk], published=False)
+        self.assertMonthCounts([(2022, 3, 1)])
+
+        Photo.objects.get(slug="p2").delete()
+        self.assertMonthCounts([])
+
+    def test_recount_months(self):
+        """Test that `manage.py recount` repairs monthly counts that have drifted."""
+        create_photo(slug="p1", date_taken=datetime.date(2022, 3, 5))
+        MonthlyPhotoCount.objects.update(published_photo_count=7)
+        MonthlyPhotoCount.objects.create(year=2020, month=1, published_photo_count=1)
+        out = StringIO()
+        call_command('recount', stdout=out)
+        self.assertMonthCounts([(2022, 3, 1)])
+        self.assertIn("2 months with incorrect counters repaired", out.getvalue())
+
+    def test_year_and_month_archives(self):
+        """Test that year and month archives list the published Photos taken in the period."""
+        march = create_photo(slug="march", date_taken=datetime.date(2022, 3, 5))
+        may = create_photo(slug="may", date_taken=datetime.date(2022, 5, 31))
+        create_photo(slug="other-year", date_taken=datetime.date(2021, 5, 1))
+        create_photo(slug="unpublished", date_taken=datetime.date(2022, 5, 1), published=False)
+
+        response = self.client.get(reverse("archive_year", kwargs={"year": 2022}))
+        self.assertQuerySetEqual(response.context['photo_list'], [may, march])
+        self.assertEqual(response.context['archive_count'], 2)
+        self.assertEqual([year['year'] for year in response.context['archive_years']],
+                         [2022, 2021])
+
+        response = self.client.get(reverse("archive_month", kwargs={"year": 2022, "month": 5}))
+        self.assertQuerySetEqual(response.context['photo_list'], [may])
+        self.assertContains(response, "Photos from May 2022")
+
+    def test_archive_navigation_uses_counts(self):
+        """Test that the archive navigation is rendered from the monthly counts."""
+        create_photo(slug="march", date_taken=datetime.date(2022, 3, 5))
+        MonthlyPhotoCount.objects.create(year=2019, month=8, published_photo_count=3)
+        response = self.client.get(reverse("archive_year", kwargs={"year": 2022}))
+        self.assertContains(response, reverse("archive_year", kwargs={"year": 2019}))
+
+    def test_empty_or_invalid_periods(self):
+        """Test that periods without published Photos, or invalid months, return a 404."""
+        create_photo(slug="march", date_taken=datetime.date(2022, 3, 5))
+        create_photo(slug="unpublished", date_taken=datetime.date(2022, 4, 5), published=False)
+        for kwargs in ({"year": 2020}, {"year": 2022, "month": 4}, {"year": 2022, "month": 13}):
+            url = reverse("archive_month" if "month" in kwargs else "archive_year", kwargs=kwargs)
+            self.assertEqual(self.client.get(url).status_code, 404)
+
+
+@tag('photos', 'views', 'search')
+@override_settings(MEDIA_ROOT=TEST_MEDIA_DIR, SECURE_SSL_REDIRECT=False,
+                   SEARCH_LOG_FLUSH_INTERVAL=0, SEARCH_CACHE_BACKGROUND_REFRESH=False)
 class SearchViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def search(self, query):
+        return self.client.get(reverse("search"), {'query': query}).context['photo_list']
+
     def test_qs_search_query_filtering(self):
         """Test that only Photos that match a search criteria are included in the queryset."""
         match1 = create_photo(slug="p1", title="TestSearch", description="desc", location="loc",
@@ -367,6 +1131,209 @@ class SearchViewTests(TestCase):
         response = self.client.get(reverse("search") + "?query=testsearch")
         self.assertContains(response, "no photos were found")
 
+    def test_query_normalization(self):
+        """Test that queries differing only in case and whitespace are logged as one query."""
+        photo = create_photo(slug="paris", location="Paris, France")
+        for query in ("Paris", " paris ", "PARIS", "  FRANCE"):
+            self.assertQuerySetEqual(self.search(query), [photo])
+        queries = SearchQuery.objects.order_by('-count').values_list('query', 'count')
+        self.assertEqual(list(queries), [("paris", 3), ("france", 1)])
+
+    def test_non_ascii_case(self):
+        """Test that queries match regardless of the case of non-ASCII characters."""
+        photo = create_photo(slug="zurich", title="ÉTÉ À ZÜRICH", location="Zürich")
+        for query in ("Zürich", "ZÜRICH", "été", "Été à zürich"):
+            self.assertQuerySetEqual(self.search(query), [photo])
+
+    def test_unpublished_excluded(self):
+        """Test that unpublished Photos aren't included in search results."""
+        create_photo(slug="unpublished", title="Hidden", published=False)
+        self.assertQuerySetEqual(self.search("hidden"), [])
+
+    def test_popular_query_results_cached(self):
+        """Test that popular query results are cached until Photos change."""
+        search.flush_query_counts({"paris": 5})
+        first = create_photo(slug="paris-1", title="Paris")
+        self.assertQuerySetEqual(self.search("paris"), [first])
+
+        with patch('photos.search.search_photos') as search_photos:
+            self.assertQuerySetEqual(self.search("Paris"), [first])
+        search_photos.assert_not_called()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second = create_photo(slug="paris-2", title="Paris", featured=True)
+        self.assertQuerySetEqual(self.search("paris"), [second, first])
+
+    def test_refresh_popular_results(self):
+        """Test that refreshing computes the results of the most frequent queries only."""
+        search.flush_query_counts({"paris": 5, "rome": 3, "oslo": 1})
+        with self.settings(SEARCH_CACHE_QUERIES=2):
+            self.assertEqual(search.refresh_popular_results(), 2)
+            with patch('photos.search.search_photos') as search_photos:
+                self.assertEqual(search.get_result_pks("rome"), [])
+                self.assertIsNone(search.get_result_pks("oslo"))
+        search_photos.assert_not_called()
+
+
+@tag('photos', 'commands')
+@override_settings(MEDIA_ROOT=TEST_MEDIA_DIR, SECURE_SSL_REDIRECT=False)
+class BenchmarkCommandTests(TestCase):
+    def test_seed_gallery(self):
+        """Test that `manage.py seed_gallery` creates objects with counters, renditions, and
+        feature vectors."""
+        out = StringIO()
+        call_command('seed_gallery', photos=5, collections=2, countries=2, images=1,
+                     batch_size=2, seed=1, stdout=out)
+        self.assertEqual(Photo.objects.count(), 5)
+        self.assertEqual(Collection.objects.count(), 2)
+        self.assertEqual(NavSection.objects.count(), 1)
+
+        photo = Photo.objects.first()
+        self.assertTrue(photo.thumbnail.storage.exists(photo.thumbnail.name))
+        self.assertEqual(photo.thumbnail_url, photo.thumbnail.url)
+        self.assertEqual(sum(Country.objects.values_list('photo_count', flat=True)), 5)
+        self.assertEqual(ShuffleRank.objects.count(), 5 * shuffle.SLOTS)
+        self.assertEqual(PhotoFeatures.objects.count(), 5)
+        self.assertIn("build_similarity_index", out.getvalue())
+
+    def test_seed_gallery_repeated(self):
+        """Test that `manage.py seed_gallery` can add Photos to an existing seeded catalogue
+        (numbering them after the existing Photos, even if some have been deleted)."""
+        call_command('seed_gallery', photos=2, collections=1, countries=1, images=1,
+                     stdout=StringIO())
+        Photo.objects.get(slug='seed-photo-1').delete()
+        call_command('seed_gallery', photos=2, collections=1, countries=1, images=1,
+                     stdout=StringIO())
+        self.assertEqual(sorted(Photo.objects.values_list('slug', flat=True)),
+                         ['seed-photo-2', 'seed-photo-3', 'seed-photo-4'])
+        self.assertEqual(Collection.objects.count(), 1)
+
+    def test_benchmark_views(self):
+        """Test that `manage.py benchmark_views` saves the results for each view as JSON."""
+        col = Collection.objects.create(name="Col", slug="col")
+        create_photo(slug="photo", collections=[col])
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output = Path(tmp_dir) / 'results.json'
+            call_command('benchmark_views', requests=2, warmup=0, output=output,
+                         stdout=StringIO())
+            data = json.loads(output.read_text())
+
+        results = data['results']
+        self.assertEqual(results['homepage']['statuses'], {'200': 2})
+        self.assertEqual(results['not_found']['statuses'], {'404': 2})
+        self.assertIn('photo_detail', results)
+        self.assertLessEqual(results['search']['p50'], results['search']['p99'])
+
+    def test_benchmark_views_concurrency(self):
+        """Test that benchmark requests are split between `--concurrency` threads."""
+        thread_ids = set()
+
+        def fetch(url):
+            thread_ids.add(threading.get_ident())
+            return 200
+
+        timings, statuses = BenchmarkCommand().run_requests(fetch, '/', num=5, concurrency=2)
+        self.assertEqual(len(timings), 5)
+        self.assertEqual(statuses, {'200': 5})
+        self.assertLessEqual(len(thread_ids), 2)
+
+
+@tag('photos', 'commands', 'archive')
+@override_settings(MEDIA_ROOT=TEST_MEDIA_DIR, SECURE_SSL_REDIRECT=False)
+class GalleryArchiveTests(TestCase):
+    def setUp(self):
+        self.country = Country.objects.create(name="Country")
+        self.col = Collection.objects.create(name="Col", slug="col", description="Desc")
+        section = NavSection.objects.create(section_order=1, dropdown_label="Menu")
+        NavLink.objects.create(link_text="Col", link_url="/col", vertical_order=1,
+                               nav_section=section)
+        self.photo = create_photo(slug="photo-1", collections=[self.col])
+        self.photo.country = self.country
+        self.photo.save()
+        create_photo(slug="photo-2", published=False)
+
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        self.path = Path(tmp_dir) / 'gallery.tar.gz'
+        call_command('export_gallery', self.path, batch_size=1, stdout=StringIO())
+
+    def import_gallery(self):
+        stdout = StringIO()
+        call_command('import_gallery', self.path, batch_size=1, stdout=stdout)
+        return stdout.getvalue()
+
+    def test_export_contents(self):
+        """Test that the archive contains a manifest, JSONL data, and the image files."""
+        with tarfile.open(self.path) as tar:
+            names = tar.getnames()
+            photos = [json.loads(line) for line in tar.extractfile('data/photos.jsonl')]
+
+        self.assertEqual(names[0], 'manifest.json')
+        self.assertEqual(names[-1], 'data/photos.jsonl')
+        self.assertIn('images/' + self.photo.large_image.name, names)
+        self.assertEqual([p['slug'] for p in photos], ['photo-1', 'photo-2'])
+        self.assertEqual(photos[0]['collections'], ['col'])
+        self.assertEqual(photos[0]['country'], "Country")
+
+    def test_import_into_empty_database(self):
+        """Test that all objects (and counters) are recreated from the archive."""
+        image_names = list(Photo.objects.values_list('large_image', flat=True))
+        Photo.objects.all().delete()
+        Collection.objects.all().delete()
+        Country.objects.all().delete()
+        NavSection.objects.all().delete()
+        for name in image_names:
+            Photo._meta.get_field('large_image').storage.delete(name)
+
+        output = self.import_gallery()
+        self.assertIn("(2 new image files saved)", output)
+        photo = Photo.objects.get(slug='photo-1')
+        self.assertEqual(list(photo.collections.all()), [Collection.objects.get(slug='col')])
+        self.assertEqual(photo.country.name, "Country")
+        self.assertTrue(photo.large_image.storage.exists(photo.large_image.name))
+        self.assertEqual(photo.thumbnail_url, photo.thumbnail.url)
+        self.assertEqual(Photo.objects.get(slug='photo-2').published, False)
+        self.assertEqual(NavLink.objects.get().nav_section.dropdown_label, "Menu")
+        col = Collection.objects.get()
+        self.assertEqual((col.photo_count, col.published_photo_count), (1, 1))
+        self.assertEqual(photo.shuffle_ranks.count(), shuffle.SLOTS)
+        self.assertEqual(PhotoFeatures.objects.count(), 2)
+        self.assertIn("build_similarity_index", output)
+
+    def test_reimport_skips_matching_images(self):
+        """Test that re-importing updates objects without saving duplicate images."""
+        Photo.objects.filter(slug='photo-1').update(title="Changed")
+        with patch('photos.archive.get_packed_vector') as get_packed_vector:
+            output = self.import_gallery()
+        get_packed_vector.assert_not_called()  # The feature vectors are unchanged
+        self.assertIn("(0 new image files saved)", output)
+        self.assertEqual(Photo.objects.count(), 2)
+        self.assertEqual(NavLink.objects.count(), 1)
+        photo = Photo.objects.get(slug='photo-1')
+        self.assertEqual(photo.title, "Photo")
+        self.assertEqual(photo.large_image.name, self.photo.large_image.name)
+
+    def test_import_without_conflict_updates(self):
+        """Test that importing works on databases which don't support `INSERT ... ON CONFLICT`
+        updates (e.g. MySQL)."""
+        Photo.objects.filter(slug='photo-2').delete()
+        Photo.objects.filter(slug='photo-1').update(title="Changed")
+        Collection.objects.update(name="Changed")
+        with patch.object(connection.features, 'supports_update_conflicts_with_target', False):
+            self.import_gallery()
+
+        self.assertEqual(sorted(Photo.objects.values_list('slug', 'title')),
+                         [('photo-1', "Photo"), ('photo-2', "Photo")])
+        self.assertEqual(Collection.objects.get().name, "Col")
+        self.assertEqual(NavSection.objects.get().dropdown_label, "Menu")
+        self.assertIsNotNone(Photo.objects.get(slug='photo-1').last_modified)
+
+    def test_invalid_archive(self):
+        """Test that a CommandError is raised for a file which isn't a gallery archive."""
+        self.path.write_bytes(b"Not an archive")
+        with self.assertRaises(CommandError):
+            self.import_gallery()
+
 
 @tag('photos', 'validators')
 class ValidatorTests(TestCase):
@@ -1,8 +1,22 @@
-from django.db.models import Q
-from django.http import Http404
+import datetime
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404, redirect
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.decorators import method_decorator
 from django.views.generic import DetailView, ListView
-from .models import Collection, Photo
+
+from photo_gallery.throttling import throttle
+from . import search, shuffle
+from .collection_slugs import is_published_slug
+from .counters import get_month_range
+from .geo import get_map_markers
+from .locks import LockTimeout
+from .models import Collection, MonthlyPhotoCount, Photo
+from .renditions import CONTENT_TYPES, get_cache_path, get_format, open_rendition
+from .similarity import get_similar_photo_pks
 
 
 # https://docs.djangoproject.com/en/5.2/ref/models/querysets/
@@ -32,9 +46,18 @@ class PhotoListView(ListView):
             # Order by ascending date (oldest earlier)
             return qs.order_by('date_taken')
 
+        elif sort == "random":
+            # Order by today's (or the paginated `seed`) shuffle ranks
+            return shuffle.shuffle_photos(qs, self.get_shuffle_slot())
+
         # Order by featured (featured at start) then by descending date (most recent earlier)
         return qs.order_by('-featured', '-date_taken')
 
+    def get_shuffle_slot(self):
+        """Return the `seed` query string's shuffle slot (if valid), otherwise today's slot."""
+        slot = shuffle.parse_slot(self.request.GET.get('seed'))
+        return shuffle.get_current_slot() if slot is None else slot
+
     def get_queryset(self):
         filtered_qs = self.get_filtered_photos()
         return self.get_sorted_photos(filtered_qs)
@@ -42,41 +65,119 @@ class PhotoListView(ListView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['sorting'] = self.request.GET.get('sort', 'default')
+        if context['sorting'] == 'random':
+            context['shuffle_seed'] = self.get_shuffle_slot()
+
+        # Cache keys of the rendered photo list and cards (see `photo_list.html`), which change
+        # if any listed Photo is changed (updating `last_modified`)
+        # https://docs.djangoproject.com/en/5.2/topics/cache/#template-fragment-caching
+        context['fragment_cache_timeout'] = getattr(settings, 'FRAGMENT_CACHE_TIMEOUT', 60 * 60)
+        context['photo_list_version'] = ','.join(
+            '{}:{}'.format(photo.pk, photo.last_modified.isoformat() if photo.last_modified else '')
+            for photo in context['photo_list'])
         return context
 
 
 class CollectionView(PhotoListView):
     template_name = "photos/collection.html"
 
+    def get_collection(self):
+        """Return the published Collection, or raise Http404.
+
+        Unknown slugs (including any other single-segment paths, which this URL pattern also
+        matches) are rejected using the in-memory set of published slugs, without a query.
+        """
+        if not hasattr(self, '_collection'):
+            slug = self.kwargs['collection_slug']
+            if not is_published_slug(slug):
+                raise Http404()
+            self._collection = get_object_or_404(Collection, slug=slug, published=True)
+        return self._collection
+
     def get_filtered_photos(self):
         """Return a filtered queryset of Photos that are in the collection."""
-        collection = get_object_or_404(Collection, slug=self.kwargs['collection_slug'])
-        if not collection.published:
+        return Photo.objects.filter(published=True, collections__in=[self.get_collection()])
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['collection'] = self.get_collection()
+        return context
+
+
+class ArchiveView(PhotoListView):
+    """List the published Photos taken in a year (`/archive/<year>`) or month (`.../<month>`).
+
+    The archive navigation and counts are read from the precomputed MonthlyPhotoCount rows, so
+    they don't require querying the Photos.
+    """
+    template_name = "photos/archive.html"
+
+    def get_month_counts(self):
+        """Return the (year, month, count) of months with published Photos, most recent first."""
+        if not hasattr(self, '_month_counts'):
+            self._month_counts = list(
+                MonthlyPhotoCount.objects.filter(published_photo_count__gt=0)
+                                         .values_list('year', 'month', 'published_photo_count'))
+        return self._month_counts
+
+    def get_archive_count(self):
+        """Return the number of published Photos taken in the year or month."""
+        year, month = self.kwargs['year'], self.kwargs.get('month')
+        return sum(count for y, m, count in self.get_month_counts()
+                   if y == year and month in (None, m))
+
+    def get_archive_years(self):
+        """Return a list of years (most recent first), each with its months' Photo counts."""
+        years = []
+        for year, month, count in self.get_month_counts():
+            if not years or years[-1]['year'] != year:
+                years.append({'year': year, 'count': 0, 'months': []})
+            years[-1]['count'] += count
+            years[-1]['months'].append({'date': datetime.date(year, month, 1), 'count': count})
+        return years
+
+    def get_filtered_photos(self):
+        """Return a filtered queryset of published Photos taken in the year or month."""
+        # Return a 404 for periods without published Photos (including invalid months)
+        if not self.get_archive_count():
             raise Http404()
 
-        return Photo.objects.filter(published=True, collections__in=[collection])
+        year, month = self.kwargs['year'], self.kwargs.get('month')
+        if month is None:
+            start, end = datetime.date(year, 1, 1), datetime.date(year + 1, 1, 1)
+        else:
+            start, end = get_month_range(year, month)
+        return Photo.objects.filter(published=True, date_taken__gte=start, date_taken__lt=end)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['collection'] = get_object_or_404(Collection, slug=self.kwargs['collection_slug'])
+        year, month = self.kwargs['year'], self.kwargs.get('month')
+        context['archive_year'] = year
+        context['archive_month'] = datetime.date(year, month, 1) if month else None
+        context['archive_count'] = self.get_archive_count()
+        context['archive_years'] = self.get_archive_years()
         return context
 
 
+@method_decorator(throttle('search'), name='dispatch')
 class SearchView(PhotoListView):
     template_name = "photos/search.html"
 
     def get_filtered_photos(self):
-        """Return a filtered queryset of Photos whose primary content includes the search query."""
-        query = self.request.GET.get('query', None)
-        if query is not None:
-            # https://docs.djangoproject.com/en/5.2/topics/db/queries/#complex-lookups-with-q-objects
-            lookup = Q(title__icontains=query) | \
-                     Q(description__icontains=query) | \
-                     Q(location__icontains=query)
+        """Return a filtered queryset of Photos whose primary content includes the search query.
 
-            return Photo.objects.filter(lookup)
+        The results of popular queries are read from the cache (see `search.py`).
+        """
+        query = search.normalize_query(self.request.GET.get('query', ''))
+        if not query:
+            return Photo.objects.filter(published=True)
 
-        return Photo.objects.filter(published=True)
+        search.record_query(query)
+        pks = search.get_result_pks(query)
+        if pks is not None:
+            return Photo.objects.filter(pk__in=pks, published=True)
+
+        return search.search_photos(query)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -95,3 +196,68 @@ class PhotoDetailView(DetailView):
     model = Photo
     # Return a 404 if the photo isn't published
     queryset = Photo.objects.filter(published=True)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        count = getattr(settings, 'SIMILAR_PHOTOS_COUNT', 4)
+        # Request extra results in case any are unpublished
+        pks = get_similar_photo_pks(self.object.pk, count * 2)
+        photos = Photo.objects.filter(pk__in=pks, published=True).in_bulk() if pks else {}
+        context['similar_photos'] = [photos[pk] for pk in pks if pk in photos][:count]
+        return context
+
+
+def resized_image(request, slug, width, extension):
+    """Return a rendition of a published Photo's image with an allowed width and format."""
+    image_format = get_format(width, extension)
+    if image_format is None:
+        raise Http404("Unsupported image width or format.")
+
+    photo = get_object_or_404(Photo.objects.only('large_image'), slug=slug, published=True)
+    # The URL isn't versioned (the Photo's image can be replaced), so it's cached briefly and then
+    # revalidated using an ETag of the rendition's cache key (which changes with the image)
+    etag = '"{}"'.format(get_cache_path(photo.large_image.name, width, extension).stem)
+    cache_control = 'public, max-age={}'.format(
+        getattr(settings, 'IMAGE_RENDITION_MAX_AGE', 60 * 60))
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        response.headers['Cache-Control'] = cache_control
+        return response
+
+    try:
+        f = open_rendition(photo.large_image, width, extension)
+    except LockTimeout:
+        response = HttpResponse("The image is being generated; please retry.", status=503)
+        response.headers['Retry-After'] = '5'
+        return response
+
+    response = FileResponse(f, content_type=CONTENT_TYPES[image_format])
+    response.headers['ETag'] = etag
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+
+def photo_map_markers(request):
+    """Return clustered map markers (JSON) for the published Photos within a bounding box.
+
+    Query string: `bbox` (west,south,east,north in degrees) and `zoom` (web map zoom level).
+    """
+    try:
+        west, south, east, north = (float(value) for value in request.GET['bbox'].split(','))
+        zoom = int(request.GET.get('zoom', 0))
+    except (KeyError, ValueError):
+        return JsonResponse({'error': "Provide `bbox` (west,south,east,north) and `zoom`."},
+                            status=400)
+
+    if not (-90 <= south <= north <= 90 and -180 <= west <= 180 and -180 <= east <= 180) \
+            or not 0 <= zoom <= 22:
+        return JsonResponse({'error': "Invalid `bbox` or `zoom`."}, status=400)
+
+    markers = get_map_markers(Photo.objects.filter(published=True), south, west, north, east, zoom)
+    for marker in markers:
+        if 'slug' in marker:
+            marker['url'] = reverse('photo_detail', kwargs={'slug': marker['slug']})
+
+    response = JsonResponse({'markers': markers})
+    response.headers['Cache-Control'] = 'public, max-age=300'
+    return response
@@ -0,0 +1,51 @@
+from django.contrib import admin
+from django.http import FileResponse
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html
+from .models import RequestProfile
+
+
+class RequestProfileAdmin(admin.ModelAdmin):
+    fields = ['created', 'method', 'path', 'user', 'status_code', 'duration_ms', 'format',
+              'download_link', 'summary']
+    readonly_fields = fields
+
+    list_display = ('path', 'method', 'status_code', 'duration_ms', 'format', 'user', 'created',
+                    'download_link')
+    list_filter = ['format', 'method']
+    list_select_related = ['user']
+    search_fields = ['path']
+    search_help_text = "Search request paths."
+
+    def has_add_permission(self, request):
+        # Profiles are created via ProfilerMiddleware
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.display(description='Profile file')
+    def download_link(self, obj):
+        url = reverse('admin:profiling_requestprofile_download', args=[obj.pk])
+        return format_html('<a href="{}">Download</a>', url)
+
+    def get_urls(self):
+        """Add a (permission-checked) URL to download profile files.
+        https://docs.djangoproject.com/en/5.2/ref/contrib/admin/#django.contrib.admin.ModelAdmin.get_urls
+        """
+        download_url = path('<int:pk>/download/', self.admin_site.admin_view(self.download_view),
+                            name='profiling_requestprofile_download')
+        return [download_url] + super().get_urls()
+
+    def download_view(self, request, pk):
+        profile = get_object_or_404(RequestProfile, pk=pk)
+        if not self.has_view_permission(request, profile):
+            return self.admin_site.login(request)
+
+        filename = profile.profile_file.name.rsplit('/', 1)[-1]
+        return FileResponse(profile.profile_file.open('rb'), as_attachment=True,
+                            filename=filename)
+
+
+admin.site.register(RequestProfile, RequestProfileAdmin)
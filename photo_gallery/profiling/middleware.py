@@ -0,0 +1,95 @@
+import datetime
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.utils import timezone
+
+from .models import RequestProfile
+from .profilers import DeterministicProfiler, SamplingProfiler
+
+
+PROFILERS = {
+    RequestProfile.PSTATS: DeterministicProfiler,
+    RequestProfile.SPEEDSCOPE: SamplingProfiler,
+}
+
+RATE_LIMIT_CACHE_KEY = 'profiler_rate_limit'
+
+# `X-Profile` header or `_profile` query string values
+FORMAT_ALIASES = {
+    '1': RequestProfile.PSTATS,
+    'pstats': RequestProfile.PSTATS,
+    'cprofile': RequestProfile.PSTATS,
+    'speedscope': RequestProfile.SPEEDSCOPE,
+    'sampling': RequestProfile.SPEEDSCOPE,
+}
+
+
+class ProfilerMiddleware:
+    """Profile a staff user's request if requested via an `X-Profile` header or `_profile` query.
+
+    E.g. `?_profile=1` (cProfile) or `?_profile=sampling` (sampling profiler). The profile is
+    saved as a `RequestProfile`, which can be viewed and downloaded via the admin site.
+    At most one request is profiled per `PROFILER_MIN_INTERVAL` seconds (across all processes).
+    Must be placed after `AuthenticationMiddleware` in `MIDDLEWARE`.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        profile_format = self.get_requested_format(request)
+        if profile_format is None:
+            return self.get_response(request)
+
+        if self.is_rate_limited():
+            response = self.get_response(request)
+            response.headers['X-Profile'] = 'rate-limited'
+            return response
+
+        profiler = PROFILERS[profile_format]()
+        start = time.perf_counter()
+        profiler.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.stop()
+        duration_ms = (time.perf_counter() - start) * 1000
+
+        profile = self.save_profile(request, response, profiler, profile_format, duration_ms)
+        response.headers['X-Profile'] = str(profile.pk)
+        return response
+
+    def get_requested_format(self, request):
+        """Return the requested profile format if the request should be profiled (else None)."""
+        value = request.headers.get('X-Profile') or request.GET.get('_profile')
+        if not value or not getattr(request, 'user', None) or not request.user.is_staff:
+            return None
+
+        return FORMAT_ALIASES.get(value.lower())
+
+    def is_rate_limited(self):
+        """Return True unless this request takes the interval's profiling slot.
+
+        `cache.add()` only succeeds for one caller (atomically, with a shared cache), so
+        concurrent requests can't all be profiled. The latest profile is also checked, in case
+        the cache isn't shared by all processes.
+        """
+        seconds = getattr(settings, 'PROFILER_MIN_INTERVAL', 60)
+        interval = datetime.timedelta(seconds=seconds)
+        if RequestProfile.objects.filter(created__gt=timezone.now() - interval).exists():
+            return True
+        return not cache.add(RATE_LIMIT_CACHE_KEY, 1, seconds)
+
+    def save_profile(self, request, response, profiler, profile_format, duration_ms):
+        profile = RequestProfile(method=request.method, path=request.get_full_path()[:2000],
+                                 user=request.user, status_code=response.status_code,
+                                 duration_ms=duration_ms, format=profile_format,
+                                 summary=profiler.get_summary())
+
+        filename = "{}.{}".format(timezone.now().strftime('%Y%m%dT%H%M%S'),
+                                  profiler.file_extension)
+        profile.profile_file.save(filename, ContentFile(profiler.get_data()), save=False)
+        profile.save()
+        return profile
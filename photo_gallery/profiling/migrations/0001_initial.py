@@ -0,0 +1,36 @@
+# Generated by Django 5.2.13 on 2026-10-19 15:42
+
+import django.db.models.deletion
+import profiling.models
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('method', models.CharField(max_length=10)),
+                ('path', models.CharField(max_length=2000)),
+                ('status_code', models.PositiveSmallIntegerField()),
+                ('duration_ms', models.FloatField(verbose_name='duration (ms)')),
+                ('format', models.CharField(choices=[('pstats', 'cProfile (pstats)'), ('speedscope', 'Sampling (speedscope JSON)')], max_length=10)),
+                ('profile_file', models.FileField(storage=profiling.models.get_profile_storage, upload_to='%Y/%m/')),
+                ('summary', models.TextField(blank=True)),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created'],
+            },
+        ),
+    ]
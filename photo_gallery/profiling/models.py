@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import models
+
+
+def get_profile_storage():
+    # Stored outside of `MEDIA_ROOT` so profiles aren't publicly accessible
+    # https://docs.djangoproject.com/en/5.2/topics/files/#using-a-callable
+    return FileSystemStorage(location=settings.PROFILES_ROOT)
+
+
+class RequestProfile(models.Model):
+    PSTATS = 'pstats'
+    SPEEDSCOPE = 'speedscope'
+    FORMAT_CHOICES = [
+        (PSTATS, 'cProfile (pstats)'),
+        (SPEEDSCOPE, 'Sampling (speedscope JSON)'),
+    ]
+
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=2000)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True)
+    status_code = models.PositiveSmallIntegerField()
+    duration_ms = models.FloatField("duration (ms)")
+    format = models.CharField(max_length=10, choices=FORMAT_CHOICES)
+    profile_file = models.FileField(upload_to='%Y/%m/', storage=get_profile_storage)
+
+    # The most time-consuming functions, for viewing via the admin site
+    summary = models.TextField(blank=True)
+
+    def __str__(self):
+        return "{} {} ({})".format(self.method, self.path, self.created)
+
+    class Meta:
+        # Recent profiles first
+        ordering = ['-created']
@@ -0,0 +1,126 @@
+import cProfile
+import io
+import json
+import marshal
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+
+
+# Profilers used by ProfilerMiddleware, which return profile data as bytes plus a text summary
+# https://docs.python.org/3/library/profile.html
+# https://github.com/jlfwong/speedscope/wiki/Importing-from-custom-sources
+
+SUMMARY_LINES = 40
+
+
+class DeterministicProfiler:
+    """Record every function call via cProfile (higher overhead, but exact call counts)."""
+    file_extension = 'prof'
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+
+    def get_data(self):
+        """Return the profile in the (marshalled) pstats format, e.g. for `snakeviz`."""
+        self.profile.create_stats()
+        return marshal.dumps(self.profile.stats)
+
+    def get_summary(self):
+        stream = io.StringIO()
+        stats = pstats.Stats(self.profile, stream=stream)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(SUMMARY_LINES)
+        return stream.getvalue()
+
+
+class SamplingProfiler:
+    """Periodically sample the request thread's call stack from a background thread.
+
+    Overhead is roughly constant (depending on `interval`) rather than per function call.
+    """
+    file_extension = 'speedscope.json'
+
+    def __init__(self, interval=0.001, name='request'):
+        self.interval = interval
+        self.name = name
+        self.samples = []  # (timestamp, [(function name, file, line), ...] outermost first)
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._thread_id = None
+
+    def start(self):
+        self._thread_id = threading.get_ident()
+        self._start_time = time.perf_counter()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        self._thread.join()
+        self._end_time = time.perf_counter()
+
+    def _sample(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_qualname, code.co_filename, code.co_firstlineno))
+                frame = frame.f_back
+            self.samples.append((time.perf_counter(), stack[::-1]))
+
+    def get_data(self):
+        """Return the profile in the speedscope "sampled" JSON format."""
+        frames, frame_indexes = [], {}
+        samples, weights = [], []
+        previous_time = self._start_time
+        for timestamp, stack in self.samples:
+            sample = []
+            for frame in stack:
+                if frame not in frame_indexes:
+                    frame_indexes[frame] = len(frames)
+                    frames.append({'name': frame[0], 'file': frame[1], 'line': frame[2]})
+                sample.append(frame_indexes[frame])
+
+            samples.append(sample)
+            weights.append((timestamp - previous_time) * 1000)
+            previous_time = timestamp
+
+        data = {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'shared': {'frames': frames},
+            'profiles': [{
+                'type': 'sampled',
+                'name': self.name,
+                'unit': 'milliseconds',
+                'startValue': 0,
+                'endValue': sum(weights),
+                'samples': samples,
+                'weights': weights,
+            }],
+            'name': self.name,
+            'exporter': 'photo_gallery',
+        }
+        return json.dumps(data).encode()
+
+    def get_summary(self):
+        """Return the functions which appear in the most samples (i.e. inclusive time)."""
+        counts = Counter()
+        for _, stack in self.samples:
+            counts.update(set(stack))
+
+        lines = ["{} samples ({:.1f}ms interval)\n".format(len(self.samples),
+                                                          self.interval * 1000)]
+        for (name, filename, line), count in counts.most_common(SUMMARY_LINES):
+            lines.append("{:>6} {:>5.1f}%  {} ({}:{})".format(
+                count, count / len(self.samples) * 100, name, filename, line))
+
+        return '\n'.join(lines)
@@ -0,0 +1,105 @@
+import json
+import marshal
+import shutil
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import override_settings, tag, TestCase
+from django.urls import reverse
+
+from .middleware import ProfilerMiddleware
+from .models import RequestProfile
+
+
+TEST_PROFILES_DIR = tempfile.mkdtemp()
+
+
+@tag('profiler')
+@override_settings(PROFILES_ROOT=TEST_PROFILES_DIR, PROFILER_MIN_INTERVAL=60,
+                   SECURE_SSL_REDIRECT=False)
+class ProfilerMiddlewareTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff_user = User.objects.create_user('staff', password='password', is_staff=True,
+                                                  is_superuser=True)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEST_PROFILES_DIR, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_staff_query_profile(self):
+        """Test that a staff request with a `_profile` query saves a pstats profile."""
+        self.client.force_login(self.staff_user)
+        response = self.client.get(reverse('contact') + '?_profile=1')
+        self.assertEqual(response.status_code, 200)
+        profile = RequestProfile.objects.get()
+        self.assertEqual(response.headers['X-Profile'], str(profile.pk))
+        self.assertEqual(profile.format, RequestProfile.PSTATS)
+        self.assertEqual(profile.path, '/contact?_profile=1')
+        self.assertEqual(profile.user, self.staff_user)
+        self.assertIn('function calls', profile.summary)
+        with profile.profile_file.open('rb') as f:
+            self.assertIsInstance(marshal.load(f), dict)
+
+    def test_staff_header_speedscope_profile(self):
+        """Test that a staff request with an `X-Profile: speedscope` header saves a
+        speedscope profile."""
+        self.client.force_login(self.staff_user)
+        self.client.get(reverse('contact'), headers={'X-Profile': 'speedscope'})
+        profile = RequestProfile.objects.get()
+        self.assertEqual(profile.format, RequestProfile.SPEEDSCOPE)
+        with profile.profile_file.open('rb') as f:
+            data = json.load(f)
+        self.assertEqual(data['profiles'][0]['type'], 'sampled')
+        self.assertEqual(len(data['profiles'][0]['samples']),
+                         len(data['profiles'][0]['weights']))
+
+    def test_anonymous_not_profiled(self):
+        """Test that a non-staff request isn't profiled."""
+        response = self.client.get(reverse('contact') + '?_profile=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile', response.headers)
+        self.assertFalse(RequestProfile.objects.exists())
+
+    def test_unknown_format_not_profiled(self):
+        """Test that a request for an unknown profile format isn't profiled."""
+        self.client.force_login(self.staff_user)
+        self.client.get(reverse('contact') + '?_profile=unknown')
+        self.assertFalse(RequestProfile.objects.exists())
+
+    def test_rate_limited(self):
+        """Test that only one request is profiled per `PROFILER_MIN_INTERVAL`."""
+        self.client.force_login(self.staff_user)
+        self.client.get(reverse('contact') + '?_profile=1')
+        response = self.client.get(reverse('contact') + '?_profile=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['X-Profile'], 'rate-limited')
+        self.assertEqual(RequestProfile.objects.count(), 1)
+
+    def test_rate_limit_slot_taken_once(self):
+        """Test that only one of several concurrent requests (before any profile is saved) takes
+        the profiling slot."""
+        middleware = ProfilerMiddleware(lambda request: None)
+        results = [middleware.is_rate_limited() for x in range(3)]
+        self.assertEqual(results, [False, True, True])
+
+    def test_admin_download(self):
+        """Test that profiles can be downloaded via the admin site."""
+        self.client.force_login(self.staff_user)
+        self.client.get(reverse('contact') + '?_profile=1')
+        profile = RequestProfile.objects.get()
+        url = reverse('admin:profiling_requestprofile_download', args=[profile.pk])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('attachment', response.headers['Content-Disposition'])
+
+        self.client.logout()
+        response = self.client.get(url)
+        self.assertNotEqual(response.status_code, 200)
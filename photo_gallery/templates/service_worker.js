@@ -0,0 +1,167 @@
+// Gallery service worker (see photo_gallery/service_worker.py)
+// https://developer.mozilla.org/en-US/docs/Web/API/Service_Worker_API/Using_Service_Workers
+'use strict';
+{% if enabled %}
+const CONFIG = {{ config|safe }};
+
+const PAGES_CACHE = 'gallery-pages-v' + CONFIG.cacheVersion;
+const IMAGES_CACHE = 'gallery-images-v' + CONFIG.cacheVersion;
+const META_CACHE = 'gallery-meta-v' + CONFIG.cacheVersion;
+const VERSION_KEY = '/gallery-version';  // META_CACHE key of the last manifest version
+const MANIFEST_TIMEOUT = 1500;  // Milliseconds to wait for the manifest before using the cache
+
+const IMAGE_PREFIXES = CONFIG.imagePrefixes.map((prefix) => new URL(prefix, self.location).href);
+const RENDITION_PREFIXES = CONFIG.renditionPrefixes.map(
+  (prefix) => new URL(prefix, self.location).href);
+let lastManifestCheck = 0;
+
+self.addEventListener('install', () => self.skipWaiting());
+
+self.addEventListener('activate', (event) => {
+  // Delete the caches of previous worker versions
+  const current = [PAGES_CACHE, IMAGES_CACHE, META_CACHE];
+  event.waitUntil(
+    caches.keys()
+      .then((names) => Promise.all(names.filter((name) => name.startsWith('gallery-') &&
+                                                         !current.includes(name))
+                                        .map((name) => caches.delete(name))))
+      .then(() => self.clients.claim())
+  );
+});
+
+self.addEventListener('fetch', (event) => {
+  const request = event.request;
+  if (request.method !== 'GET') {
+    return;
+  }
+
+  const url = new URL(request.url);
+  if (IMAGE_PREFIXES.some((prefix) => url.href.startsWith(prefix))) {
+    event.respondWith(cacheFirst(event));
+  } else if (RENDITION_PREFIXES.some((prefix) => url.href.startsWith(prefix))) {
+    event.respondWith(revalidatedImage(event));
+  } else if (request.mode === 'navigate' && url.origin === self.location.origin &&
+             !CONFIG.excludedPaths.some((path) => isPathWithin(url.pathname, path))) {
+    event.respondWith(staleWhileRevalidate(event));
+  }
+});
+
+function isPathWithin(pathname, path) {
+  return pathname === path || pathname.startsWith(path.endsWith('/') ? path : path + '/');
+}
+
+// Images: use the cached response if available, otherwise fetch and cache it
+async function cacheFirst(event) {
+  const cache = await caches.open(IMAGES_CACHE);
+  const cached = await cache.match(event.request);
+  if (cached) {
+    return cached;
+  }
+
+  const response = await fetch(event.request);
+  if (response.ok) {
+    event.waitUntil(cache.put(event.request, response.clone())
+                      .then(() => trimCache(cache, CONFIG.maxImages)));
+  }
+  return response;
+}
+
+// Renditions (whose URLs aren't versioned): use the cached response if available, while updating
+// it via the network (which honours the response's `max-age` and ETag via the HTTP cache)
+async function revalidatedImage(event) {
+  const cache = await caches.open(IMAGES_CACHE);
+  const cached = await cache.match(event.request);
+  const network = fetch(event.request).then(async (response) => {
+    if (response.ok) {
+      await cache.put(event.request, response.clone());
+      await trimCache(cache, CONFIG.maxImages);
+    }
+    return response;
+  });
+
+  if (cached) {
+    event.waitUntil(network.catch(() => undefined));
+    return cached;
+  }
+  return network;
+}
+
+// Delete the oldest entries beyond `maxEntries` (keys are returned in insertion order)
+async function trimCache(cache, maxEntries) {
+  const keys = await cache.keys();
+  await Promise.all(keys.slice(0, Math.max(keys.length - maxEntries, 0))
+                        .map((key) => cache.delete(key)));
+}
+
+// Pages: use the cached response if available (while updating it), otherwise the network.
+// The version is checked in the background (so navigation never waits for the manifest); an
+// outdated cached page may be used once, but pages fetched meanwhile are cached after the check.
+async function staleWhileRevalidate(event) {
+  const versionChecked = checkVersion();
+  event.waitUntil(versionChecked);
+  const cache = await caches.open(PAGES_CACHE);
+  const cached = await cache.match(event.request);
+  const network = fetch(event.request).then(async (response) => {
+    if (isCacheablePage(response)) {
+      const copy = response.clone();
+      // Reopened, since the check may have deleted the cache
+      event.waitUntil(versionChecked.then(() => caches.open(PAGES_CACHE))
+                        .then((pages) => pages.put(event.request, copy)));
+    }
+    return response;
+  });
+
+  if (cached) {
+    event.waitUntil(network.catch(() => undefined));
+    return cached;
+  }
+  return network;
+}
+
+function isCacheablePage(response) {
+  // Exclude redirects, errors, and private (e.g. session-dependent) pages
+  const cacheControl = response.headers.get('Cache-Control') || '';
+  const vary = response.headers.get('Vary') || '';
+  return response.ok && response.type === 'basic' && !/no-store|private/.test(cacheControl) &&
+         !/cookie/i.test(vary);
+}
+
+// Delete the cached pages if the gallery version has changed (checked at most every
+// `manifestMaxAge` seconds while the worker is running)
+async function checkVersion() {
+  const now = Date.now();
+  if (now - lastManifestCheck < CONFIG.manifestMaxAge * 1000) {
+    return;
+  }
+  lastManifestCheck = now;
+
+  try {
+    const response = await fetch(CONFIG.manifestUrl, {
+      cache: 'no-store',
+      signal: AbortSignal.timeout(MANIFEST_TIMEOUT),
+    });
+    const version = (await response.json()).version;
+    const meta = await caches.open(META_CACHE);
+    const stored = await meta.match(VERSION_KEY);
+    if (stored && await stored.text() === version) {
+      return;
+    }
+    await caches.delete(PAGES_CACHE);
+    await meta.put(VERSION_KEY, new Response(version));
+  } catch (error) {
+    // Offline (or slow); keep using the cached pages
+  }
+}
+{% else %}
+// The service worker is disabled: delete its caches and unregister it
+self.addEventListener('install', () => self.skipWaiting());
+
+self.addEventListener('activate', (event) => {
+  event.waitUntil(
+    caches.keys()
+      .then((names) => Promise.all(names.filter((name) => name.startsWith('gallery-'))
+                                        .map((name) => caches.delete(name))))
+      .then(() => self.registration.unregister())
+  );
+});
+{% endif %}